@@ -0,0 +1,574 @@
+# ==========================================================
+#  BENCHMARK
+#  python benchmark.py compose [--cartella DIR] [--ripetizioni N]
+#  python benchmark.py codifica [--cartella DIR] [--larghezza-max PX] [--budget-kb KB]
+#  python benchmark.py registra [--fixtures DIR]        (richiede rete)
+#  python benchmark.py esegui [--ripetizioni N] [--fonte X] [--salva-baseline]
+# ==========================================================
+import argparse, glob, json, math, os, random, re, statistics, subprocess, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image, ImageDraw
+
+import immagini
+
+# Dimensioni tipiche delle catture reali (viewport 1600 px)
+DIMENSIONI_TIPICHE = {
+    "sosfanta": [(1240, 2300)],
+    "fantacalcio": [(1110, 980), (1110, 640)],
+    "gazzetta": [(1600, 1150), (940, 760)],
+}
+SFONDI = {"sosfanta": (255, 255, 255), "fantacalcio": immagini.FANTACALCIO_BG,
+          "gazzetta": immagini.GAZZETTA_ROSA}
+
+
+def _cattura_sintetica(w, h, sfondo, seme):
+    """Immagine con testo sparso, simile a un blocco formazioni."""
+    rnd = random.Random(seme)
+    img = Image.new("RGB", (w, h), sfondo)
+    d = ImageDraw.Draw(img)
+    for _ in range(w * h // 4000):
+        x, y = rnd.randrange(w - 60), rnd.randrange(h - 12)
+        if w * 0.47 < x < w * 0.53:
+            continue  # colonna centrale libera, come nelle note Gazzetta
+        d.text((x, y), "Rossi M.", fill=(20, 20, 20))
+    return img
+
+
+def _catture(cartella):
+    """Catture reali salvate con KEEP_INTERMEDI=1, altrimenti sintetiche a dimensione reale."""
+    def apri(p):
+        with Image.open(p) as img:
+            return img.convert("RGB")
+
+    catture = {}
+    if cartella:
+        raw = sorted(glob.glob(os.path.join(cartella, "raw_sosfanta_*.png")))
+        form = sorted(glob.glob(os.path.join(cartella, "tmp_fanta_form_*.png")))
+        graph = sorted(glob.glob(os.path.join(cartella, "tmp_fanta_graph_*.png")))
+        lineup = sorted(glob.glob(os.path.join(cartella, "gazzetta_*_lineup.png")))
+        notes = sorted(glob.glob(os.path.join(cartella, "gazzetta_*_notes.png")))
+        if raw:
+            catture["sosfanta"] = [(apri(p),) for p in raw]
+        if form and graph:
+            catture["fantacalcio"] = [(apri(a), apri(b)) for a, b in zip(form, graph)]
+        if lineup and notes:
+            catture["gazzetta"] = [(apri(a), apri(b)) for a, b in zip(lineup, notes)]
+
+    for fonte, dims in DIMENSIONI_TIPICHE.items():
+        if fonte not in catture:
+            catture[fonte] = [tuple(_cattura_sintetica(w, h, SFONDI[fonte], i) for i, (w, h) in enumerate(dims))]
+    return catture
+
+
+def _colonna_legacy(notes_img):
+    """Ricerca originale: 15 colonne, una riga ogni 6, somma RGB in Python puro."""
+    w, h = notes_img.width, notes_img.height
+    px = notes_img.load()
+    best_col, min_dark = w // 2, 999999
+    for offset in range(-7, 8):
+        x = w // 2 + offset
+        dark = sum(1 for y in range(0, h, 6) if sum(px[x, y]) < 690)
+        if dark < min_dark:
+            min_dark, best_col = dark, x
+    return best_col
+
+
+def _misura(fn, ripetizioni):
+    tempi = []
+    for _ in range(ripetizioni):
+        t0 = time.perf_counter()
+        fn()
+        tempi.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempi), max(tempi)
+
+
+def bench_compose(cartella=None, ripetizioni=20):
+    catture = _catture(cartella)
+    ricette = {
+        "sosfanta": immagini.componi_sosfanta,
+        "fantacalcio": immagini.componi_fantacalcio,
+        "gazzetta": immagini.componi_gazzetta,
+    }
+    print(f"NumPy: {'sì' if immagini.np is not None else 'no (fallback PIL)'} | ripetizioni: {ripetizioni}")
+    for fonte, partite in catture.items():
+        tempi = [_misura(lambda a=args: ricette[fonte](*a), ripetizioni)[0] for args in partite]
+        dims = " + ".join(f"{i.width}x{i.height}" for i in partite[0])
+        print(f"🖼️ {fonte:<12} compose {statistics.median(tempi):7.2f} ms/partita ({len(partite)} partite, {dims})")
+
+    notes = [args[1] for args in catture["gazzetta"]]
+    print("🔎 Ricerca colonna divisoria Gazzetta (mediana ms/partita):")
+    print(f"   legacy (loop Python)   {statistics.median(_misura(lambda n=n: _colonna_legacy(n), ripetizioni)[0] for n in notes):7.2f}")
+    np_originale = immagini.np
+    try:
+        if np_originale is not None:
+            print(f"   NumPy                  {statistics.median(_misura(lambda n=n: immagini.cerca_colonna_divisoria(n), ripetizioni)[0] for n in notes):7.2f}")
+        immagini.np = None
+        print(f"   PIL (point + BOX)      {statistics.median(_misura(lambda n=n: immagini.cerca_colonna_divisoria(n), ripetizioni)[0] for n in notes):7.2f}")
+    finally:
+        immagini.np = np_originale
+
+
+def bench_codifica(cartella=None, larghezza_max=None, budget_kb=None):
+    """Byte e tempo di codifica del file finale per formato, sulle stesse catture di `compose`."""
+    catture = _catture(cartella)
+    ricette = {
+        "sosfanta": immagini.componi_sosfanta,
+        "fantacalcio": immagini.componi_fantacalcio,
+        "gazzetta": immagini.componi_gazzetta,
+    }
+    budget = budget_kb * 1024 if budget_kb else None
+    print(f"Larghezza massima: {larghezza_max or '-'} | budget: {f'{budget_kb} KB' if budget_kb else '-'}")
+    for fonte, partite in catture.items():
+        finali = [ricette[fonte](*args) for args in partite]
+        riferimento = sum(len(immagini.codifica(img, "png")[0]) for img in finali)
+        for formato in immagini.FORMATI:
+            t0 = time.perf_counter()
+            byte = sum(len(immagini.codifica(img, formato, larghezza_max, budget)[0]) for img in finali)
+            ms = (time.perf_counter() - t0) * 1000 / len(finali)
+            print(f"🗜️ {fonte:<12} {formato:<7} {byte / len(finali) / 1024:8.0f} KB/partita "
+                  f"({100 * (byte - riferimento) / riferimento:+4.0f}% su PNG) {ms:7.1f} ms/partita")
+
+
+# ==========================================================
+#  DRIVE FINTO (server HTTP locale per files.list/create/update e batch permessi)
+# ==========================================================
+class FakeDrive:
+    """Server Drive v3 minimo: risponde alle chiamate usate da run.py e le conta.
+    pagina: dimensione massima delle pagine di files.list (per provare la paginazione)."""
+
+    def __init__(self, pagina=100):
+        self.pagina = pagina
+        self.file = {}          # id -> nome
+        self.chiamate = {}
+        self.byte_ricevuti = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    def avvia(self):
+        self._thread.start()
+        return self
+
+    def ferma(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def azzera(self):
+        with self._lock:
+            self.file.clear()
+            self.chiamate = {}
+            self.byte_ricevuti = 0
+
+    def _conta(self, tipo, n_byte):
+        with self._lock:
+            self.chiamate[tipo] = self.chiamate.get(tipo, 0) + 1
+            self.byte_ricevuti += n_byte
+
+    def _handler(self):
+        drive = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, dati, stato=200):
+                corpo = json.dumps(dati).encode()
+                self.send_response(stato)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def _corpo(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != "/drive/v3/files":
+                    return self._json({"error": "not found"}, 404)
+                drive._conta("list", 0)
+                q = parse_qs(url.query)
+                inizio = int(q.get("pageToken", ["0"])[0])
+                size = min(drive.pagina, int(q.get("pageSize", [drive.pagina])[0]))
+                with drive._lock:
+                    tutti = [{"id": i, "name": n} for i, n in drive.file.items()]
+                risposta = {"files": tutti[inizio:inizio + size]}
+                if inizio + size < len(tutti):
+                    risposta["nextPageToken"] = str(inizio + size)
+                self._json(risposta)
+
+            def do_POST(self):
+                corpo = self._corpo()
+                url = urlsplit(self.path)
+                if url.path == "/upload/drive/v3/files":
+                    drive._conta("create", len(corpo))
+                    m = re.search(rb'"name":\s*"([^"]+)"', corpo)
+                    nome = m.group(1).decode() if m else "senza_nome"
+                    with drive._lock:
+                        file_id = f"fake{len(drive.file) + 1}"
+                        drive.file[file_id] = nome
+                    return self._json({"id": file_id, "webViewLink": f"{drive.url}view/{file_id}"})
+                if url.path == "/batch/drive/v3":
+                    drive._conta("batch", len(corpo))
+                    return self._batch(corpo)
+                if url.path.endswith("/permissions"):
+                    drive._conta("permissions", len(corpo))
+                    return self._json({"id": "anyoneWithLink"})
+                self._json({"error": "not found"}, 404)
+
+            def do_PATCH(self):
+                corpo = self._corpo()
+                file_id = urlsplit(self.path).path.rsplit("/", 1)[-1]
+                drive._conta("update", len(corpo))
+                self._json({"id": file_id})
+
+            def _batch(self, corpo):
+                ids = re.findall(rb"Content-ID:\s*<([^>]+)>", corpo, flags=re.I)
+                confine = "batch_fake_drive"
+                parti = []
+                for cid in ids:
+                    parti.append(
+                        f"--{confine}\r\nContent-Type: application/http\r\n"
+                        f"Content-ID: <response-{cid.decode()}>\r\n\r\n"
+                        "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n"
+                        '{"id": "anyoneWithLink"}\r\n'
+                    )
+                risposta = ("".join(parti) + f"--{confine}--\r\n").encode()
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/mixed; boundary={confine}")
+                self.send_header("Content-Length", str(len(risposta)))
+                self.end_headers()
+                self.wfile.write(risposta)
+
+        return Handler
+
+
+# ==========================================================
+#  BENCHMARK END-TO-END (pagine registrate + Drive finto)
+# ==========================================================
+QUI = os.path.dirname(os.path.abspath(__file__))
+RUN_PY = os.path.join(QUI, "run.py")
+FONTI_BENCH = ["sosfanta", "fantacalcio", "gazzetta"]
+# Intervallo di campionamento della memoria dell'albero di processi di una run
+CAMPIONE_MEMORIA_S = 0.2
+
+
+def _p95(valori):
+    ordinati = sorted(valori)
+    return ordinati[max(0, math.ceil(0.95 * len(ordinati)) - 1)]
+
+
+def _esegui_run(env_extra, cartella):
+    """Lancia run.py in un processo figlio; ritorna (secondi, picco RSS MB, picco memoria MB, codice di uscita).
+    Il picco RSS (wait4) è quello del singolo processo più grande dell'albero, non una somma; il picco
+    di memoria è la PSS di tutto l'albero (run.py e processi del browser), campionata da /proc."""
+    from run import memoria_albero
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_CREDENTIALS_B64"}
+    env.update(env_extra)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, RUN_PY], cwd=cartella, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    picco, finito = 0.0, threading.Event()
+
+    def campiona():
+        nonlocal picco
+        while not finito.wait(CAMPIONE_MEMORIA_S):
+            picco = max(picco, memoria_albero(proc.pid, solo_chromium=False)[0])
+
+    campionatore = threading.Thread(target=campiona, daemon=True)
+    campionatore.start()
+    _, stato, uso = os.wait4(proc.pid, 0)
+    finito.set()
+    campionatore.join()
+    proc.returncode = os.waitstatus_to_exitcode(stato)
+    return time.perf_counter() - t0, uso.ru_maxrss / 1024, picco, proc.returncode
+
+
+def _leggi_traccia(path):
+    """Durate degli span '*.partita' e byte prodotti (attributo 'byte' degli span compose)."""
+    partite, byte = [], 0
+    try:
+        with open(path, encoding="utf-8") as f:
+            dati = json.load(f)
+    except (OSError, ValueError):
+        return partite, byte
+
+    def visita(nodo):
+        nonlocal byte
+        if nodo["nome"].endswith(".partita") and "errore" not in nodo:
+            partite.append(nodo["durata_s"])
+        byte += nodo.get("attributi", {}).get("byte", 0)
+        for figlio in nodo["figli"]:
+            visita(figlio)
+
+    for radice in dati.get("span", []):
+        visita(radice)
+    return partite, byte
+
+
+def registra(fixtures):
+    """Registra una volta le pagine vere delle tre fonti in archivi HAR (uno per fonte)."""
+    fixtures = os.path.abspath(fixtures)
+    drive = FakeDrive().avvia()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            secondi, _, _, codice = _esegui_run({"HAR_REGISTRA_DIR": fixtures, "DRIVE_API_ROOT": drive.url}, tmp)
+    finally:
+        drive.ferma()
+    print(f"📼 Registrazione completata in {secondi:.1f}s (uscita {codice}) → {fixtures}")
+    for p in sorted(glob.glob(os.path.join(fixtures, "*.har.zip"))):
+        print(f"   {os.path.basename(p)}: {os.path.getsize(p) // 1024} KB")
+
+
+def esegui(fixtures, ripetizioni, obiettivi):
+    """Esegue ogni obiettivo (una fonte o 'tutte') N volte in replay e ne raccoglie le metriche."""
+    fixtures = os.path.abspath(fixtures)
+    mancanti = [f for f in FONTI_BENCH if not os.path.exists(os.path.join(fixtures, f"{f}.har.zip"))]
+    if mancanti:
+        sys.exit(f"🛑 Mancano le registrazioni per: {', '.join(mancanti)} (esegui prima 'registra')")
+
+    drive = FakeDrive(pagina=10).avvia()
+    risultati = {}
+    try:
+        for obiettivo in obiettivi:
+            campioni = []
+            for _ in range(ripetizioni):
+                drive.azzera()
+                with tempfile.TemporaryDirectory() as tmp:
+                    env = {
+                        "HAR_REPLAY_DIR": fixtures, "DRIVE_API_ROOT": drive.url,
+                        "FONTI": "" if obiettivo == "tutte" else obiettivo,
+                        "TRACCIA": "1", "TRACCIA_PATH": os.path.join(tmp, "traccia.json"),
+                        "MANIFEST_PATH": os.path.join(tmp, "manifest.json"),
+                    }
+                    secondi, rss, memoria, codice = _esegui_run(env, tmp)
+                    partite, byte = _leggi_traccia(env["TRACCIA_PATH"])
+                campioni.append({"secondi": secondi, "rss_mb": rss, "memoria_mb": memoria, "codice": codice, "partite": partite,
+                                 "byte": byte, "chiamate_drive": sum(drive.chiamate.values()),
+                                 "byte_drive": drive.byte_ricevuti})
+
+            tempi = [c["secondi"] for c in campioni]
+            per_partita = [statistics.mean(c["partite"]) for c in campioni if c["partite"]]
+            risultati[obiettivo] = {
+                "mediana_s": round(statistics.median(tempi), 3),
+                "p95_s": round(_p95(tempi), 3),
+                "per_partita_s": round(statistics.median(per_partita), 3) if per_partita else None,
+                "partite": max(len(c["partite"]) for c in campioni),
+                "byte_immagini": int(statistics.median(c["byte"] for c in campioni)),
+                "byte_drive": int(statistics.median(c["byte_drive"] for c in campioni)),
+                "chiamate_drive": int(statistics.median(c["chiamate_drive"] for c in campioni)),
+                "picco_rss_mb": round(max(c["rss_mb"] for c in campioni), 1),
+                "picco_memoria_mb": round(max(c["memoria_mb"] for c in campioni), 1),
+                "errori": sum(1 for c in campioni if c["codice"] != 0),
+            }
+    finally:
+        drive.ferma()
+    return risultati
+
+
+def _leggi_caricamento(path):
+    """Statistiche di caricamento per fonte (attributi degli span '*.chiusura')."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            dati = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    per_fonte = {}
+
+    def visita(nodo):
+        if nodo["nome"].endswith(".chiusura"):
+            per_fonte[nodo["nome"].split(".")[0]] = nodo.get("attributi", {})
+        for figlio in nodo["figli"]:
+            visita(figlio)
+
+    for radice in dati.get("span", []):
+        visita(radice)
+    return per_fonte
+
+
+def profilo(ripetizioni_calde):
+    """Cache fredda contro calda: una run su profili vuoti, poi N run sugli stessi profili.
+    Usa le pagine vere (la cache HTTP non funziona con il replay HAR, che intercetta le richieste)."""
+    drive = FakeDrive().avvia()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            profili = os.path.join(tmp, "profili")
+            for giro in range(1 + ripetizioni_calde):
+                drive.azzera()
+                env = {
+                    "PROFILI_DIR": profili, "DRIVE_API_ROOT": drive.url, "PREFLIGHT": "0",
+                    "AGGIORNAMENTO_COMPLETO": "1", "TRACCIA": "1",
+                    "TRACCIA_PATH": os.path.join(tmp, "traccia.json"),
+                    "MANIFEST_PATH": os.path.join(tmp, "manifest.json"),
+                }
+                secondi, _, _, codice = _esegui_run(env, tmp)
+                etichetta = "freddo" if giro == 0 else f"caldo {giro}"
+                print(f"{etichetta:<9} totale {secondi:6.1f}s" + (f"  ⚠️ uscita {codice}" if codice else ""))
+                for fonte, st in sorted(_leggi_caricamento(env["TRACCIA_PATH"]).items()):
+                    print(f"   {fonte:<12} pagina {st.get('goto_s') or 0:5.2f}s  "
+                          f"{st.get('byte_rete', 0) // 1024:>6} KB dalla rete  "
+                          f"{st.get('da_cache', 0)}/{st.get('risorse', 0)} dalla cache")
+    finally:
+        drive.ferma()
+
+
+def _primo_goto(path):
+    """Inizio (s dall'import di traccia, cioè di run.py) del primo span '*.goto'."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            dati = json.load(f)
+    except (OSError, ValueError):
+        return None
+    inizi = []
+
+    def visita(nodo):
+        if nodo["nome"].endswith(".goto"):
+            inizi.append(nodo["inizio_s"])
+        for figlio in nodo["figli"]:
+            visita(figlio)
+
+    for radice in dati.get("span", []):
+        visita(radice)
+    return min(inizi) if inizi else None
+
+
+def avvio(fixtures, ripetizioni):
+    """Tempo di `import run` in un interprete nuovo e, con le registrazioni HAR, tempo
+    dall'import alla prima navigazione (inizio del primo span '*.goto')."""
+    codice = "import time; t = time.perf_counter(); import run; print(time.perf_counter() - t)"
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_CREDENTIALS_B64"}
+    tempi = []
+    for _ in range(ripetizioni):
+        out = subprocess.run([sys.executable, "-c", codice], cwd=QUI, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        tempi.append(float(out.strip().splitlines()[-1]))
+    print(f"📦 import run: mediana {statistics.median(tempi) * 1000:.0f} ms, "
+          f"max {max(tempi) * 1000:.0f} ms ({ripetizioni} processi)")
+
+    fixtures = os.path.abspath(fixtures)
+    if not glob.glob(os.path.join(fixtures, "*.har.zip")):
+        print("ℹ️ Nessuna registrazione HAR: salto import → prima navigazione (esegui prima 'registra')")
+        return
+    drive = FakeDrive().avvia()
+    try:
+        primi = []
+        for _ in range(ripetizioni):
+            with tempfile.TemporaryDirectory() as tmp:
+                env_run = {"HAR_REPLAY_DIR": fixtures, "DRIVE_API_ROOT": drive.url, "TRACCIA": "1",
+                           "TRACCIA_PATH": os.path.join(tmp, "traccia.json"),
+                           "MANIFEST_PATH": os.path.join(tmp, "manifest.json")}
+                _esegui_run(env_run, tmp)
+                primo = _primo_goto(env_run["TRACCIA_PATH"])
+            if primo is not None:
+                primi.append(primo)
+    finally:
+        drive.ferma()
+    if primi:
+        print(f"🚀 import → prima navigazione: mediana {statistics.median(primi) * 1000:.0f} ms, "
+              f"max {max(primi) * 1000:.0f} ms")
+    else:
+        print("⚠️ Nessuna navigazione registrata nella traccia (browser non avviato?)")
+
+
+def stampa_risultati(risultati):
+    print(f"{'obiettivo':<12} {'mediana':>8} {'p95':>8} {'/partita':>9} {'partite':>7} "
+          f"{'KB img':>8} {'KB drive':>9} {'API':>4} {'RSS MB':>7} {'MEM MB':>7}")
+    for nome, r in risultati.items():
+        per_partita = f"{r['per_partita_s']:.2f}s" if r["per_partita_s"] is not None else "-"
+        print(f"{nome:<12} {r['mediana_s']:>7.2f}s {r['p95_s']:>7.2f}s {per_partita:>9} {r['partite']:>7} "
+              f"{r['byte_immagini'] // 1024:>8} {r['byte_drive'] // 1024:>9} {r['chiamate_drive']:>4} "
+              f"{r['picco_rss_mb']:>7.0f} {r.get('picco_memoria_mb', 0):>7.0f}" + (f"  ⚠️ {r['errori']} run fallite" if r["errori"] else ""))
+
+
+def confronta_baseline(risultati, baseline, tolleranza):
+    """Ritorna le regressioni (metriche peggiorate oltre la tolleranza relativa)."""
+    regressioni = []
+    for nome, r in risultati.items():
+        base = baseline.get(nome)
+        if not base:
+            continue
+        for metrica in ("mediana_s", "p95_s", "per_partita_s", "picco_rss_mb", "picco_memoria_mb", "byte_drive"):
+            nuovo, vecchio = r.get(metrica), base.get(metrica)
+            if nuovo is None or not vecchio:
+                continue
+            if nuovo > vecchio * (1 + tolleranza):
+                regressioni.append(f"{nome}.{metrica}: {vecchio} → {nuovo} (+{(nuovo / vecchio - 1) * 100:.0f}%)")
+        if r["partite"] < base.get("partite", 0):
+            regressioni.append(f"{nome}.partite: {base['partite']} → {r['partite']}")
+    return regressioni
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dello scraper probabili formazioni")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("compose", help="micro-benchmark della composizione immagini per partita")
+    p.add_argument("--cartella", help="cartella con le catture intermedie (KEEP_INTERMEDI=1)")
+    p.add_argument("--ripetizioni", type=int, default=20)
+
+    p = sub.add_parser("codifica", help="byte e tempo di codifica del file finale per formato")
+    p.add_argument("--cartella", help="cartella con le catture intermedie (KEEP_INTERMEDI=1)")
+    p.add_argument("--larghezza-max", type=int)
+    p.add_argument("--budget-kb", type=int)
+
+    p = sub.add_parser("registra", help="registra le pagine reali delle fonti in archivi HAR")
+    p.add_argument("--fixtures", default=os.path.join(QUI, "fixtures"))
+
+    p = sub.add_parser("esegui", help="benchmark end-to-end offline (replay HAR + Drive finto)")
+    p.add_argument("--fixtures", default=os.path.join(QUI, "fixtures"))
+    p.add_argument("--ripetizioni", type=int, default=5)
+    p.add_argument("--fonte", action="append", choices=FONTI_BENCH + ["tutte"],
+                   help="obiettivo da misurare (ripetibile); default: ogni fonte e 'tutte'")
+    p.add_argument("--baseline", default=os.path.join(QUI, "benchmark_baseline.json"))
+    p.add_argument("--salva-baseline", action="store_true", help="sovrascrive la baseline con questa misura")
+    p.add_argument("--tolleranza", type=float, default=0.15, help="peggioramento relativo ammesso (0.15 = 15%%)")
+
+    p = sub.add_parser("avvio", help="tempo di import di run.py e import → prima navigazione")
+    p.add_argument("--fixtures", default=os.path.join(QUI, "fixtures"))
+    p.add_argument("--ripetizioni", type=int, default=5)
+
+    p = sub.add_parser("profilo", help="caricamento pagine con profilo persistente: cache fredda e calda (rete)")
+    p.add_argument("--ripetizioni", type=int, default=1, help="run a cache calda dopo quella a freddo")
+
+    args = parser.parse_args(argv)
+    if args.comando == "compose":
+        bench_compose(args.cartella, args.ripetizioni)
+    elif args.comando == "codifica":
+        bench_codifica(args.cartella, args.larghezza_max, args.budget_kb)
+    elif args.comando == "registra":
+        registra(args.fixtures)
+    elif args.comando == "avvio":
+        avvio(args.fixtures, args.ripetizioni)
+    elif args.comando == "profilo":
+        profilo(args.ripetizioni)
+    elif args.comando == "esegui":
+        risultati = esegui(args.fixtures, args.ripetizioni, args.fonte or FONTI_BENCH + ["tutte"])
+        stampa_risultati(risultati)
+        if args.salva_baseline:
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump(risultati, f, indent=1)
+            print(f"💾 Baseline salvata in {args.baseline}")
+            return
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print("ℹ️ Nessuna baseline: usa --salva-baseline per crearla.")
+            return
+        regressioni = confronta_baseline(risultati, baseline, args.tolleranza)
+        if regressioni:
+            print("🛑 REGRESSIONI rispetto alla baseline:")
+            for r in regressioni:
+                print(f"   ❌ {r}")
+            sys.exit(1)
+        print("✅ Nessuna regressione rispetto alla baseline.")
+
+
+if __name__ == "__main__":
+    main()
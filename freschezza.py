@@ -0,0 +1,222 @@
+# ==========================================================
+#  PRE-FLIGHT HTTP: LA FONTE È CAMBIATA?
+#  Un GET condizionale (ETag / Last-Modified) o l'hash dei box
+#  partita nell'HTML del server decide, per fonte, se serve il
+#  browser. Solo libreria standard: gira prima di `pip install`.
+# ==========================================================
+import gzip, hashlib, json, os, re, sys, time, zlib
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+FONTI_URL = {
+    "SosFanta": "https://www.sosfanta.com/lista-formazioni/probabili-formazioni-serie-a/",
+    "Fantacalcio": "https://www.fantacalcio.it/probabili-formazioni-serie-a",
+    "Gazzetta": "https://www.gazzetta.it/Calcio/prob_form/",
+}
+
+# Box partita nell'HTML del server: (attributo, regex), come i selettori "partita" di run.py
+MARCATORI = {
+    "SosFanta": ("id", r"^[A-Z]{3}-[A-Z]{3}(-\d+)?$"),
+    "Fantacalcio": ("class", r"\bmatch-item\b"),
+    "Gazzetta": ("class", r"\bbck-box-match-details\b"),
+}
+
+STATO_PATH = os.environ.get("FRESCHEZZA_PATH", "freschezza.json")
+TIMEOUT_S = float(os.environ.get("FRESCHEZZA_TIMEOUT", "10"))
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+_VUOTI = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input",
+                    "link", "meta", "source", "track", "wbr"})
+_IGNORATI = frozenset({"script", "style", "noscript", "template", "svg", "iframe"})
+
+
+class _EstrattoBox(HTMLParser):
+    """Testo e immagini dei soli box partita, con gli stessi criteri dell'impronta DOM:
+    spazi normalizzati, src senza query string, niente script/style (nonce, timestamp, ads)."""
+
+    def __init__(self, attributo, regex):
+        super().__init__(convert_charrefs=True)
+        self.attributo, self.regex = attributo, re.compile(regex)
+        self.pila = []          # tag aperti
+        self.dentro = None      # profondità della pila all'apertura del box corrente
+        self.ignora = 0
+        self.parti = []
+        self.box = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.dentro is None and self.regex.search(attrs.get(self.attributo) or ""):
+            self.dentro = len(self.pila)
+            self.box += 1
+            self.parti.append("§")
+        if self.dentro is not None:
+            if tag in _IGNORATI:
+                self.ignora += 1
+            elif tag == "img" or "title" in attrs or "aria-label" in attrs:
+                src = (attrs.get("data-src") or attrs.get("src") or "").split("?")[0]
+                self.parti.append("|".join(_norm(v) for v in (
+                    tag.upper(), src, attrs.get("alt"), attrs.get("title"), attrs.get("aria-label"))))
+        if tag not in _VUOTI:
+            self.pila.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.pila:
+            return
+        while self.pila:
+            aperto = self.pila.pop()
+            if self.dentro is not None and aperto in _IGNORATI:
+                self.ignora = max(0, self.ignora - 1)
+            if aperto == tag:
+                break
+        if self.dentro is not None and len(self.pila) <= self.dentro:
+            self.dentro = None
+
+    def handle_data(self, data):
+        if self.dentro is not None and not self.ignora:
+            testo = _norm(data)
+            if testo:
+                self.parti.append(testo)
+
+
+def _norm(s):
+    return re.sub(r"\s+", " ", s or "").strip()
+
+
+def impronta_html(html, fonte):
+    """(sha256, numero di box) dell'estratto stabile della pagina di una fonte."""
+    parser = _EstrattoBox(*MARCATORI[fonte])
+    parser.feed(html)
+    parser.close()
+    return hashlib.sha256("\n".join(parser.parti).encode("utf-8")).hexdigest(), parser.box
+
+
+def _scarica(url, precedente):
+    intestazioni = {"User-Agent": USER_AGENT, "Accept": "text/html", "Accept-Encoding": "gzip, deflate",
+                    "Accept-Language": "it-IT,it;q=0.9"}
+    if precedente.get("etag"):
+        intestazioni["If-None-Match"] = precedente["etag"]
+    if precedente.get("last_modified"):
+        intestazioni["If-Modified-Since"] = precedente["last_modified"]
+    try:
+        with urlopen(Request(url, headers=intestazioni), timeout=TIMEOUT_S) as r:
+            corpo = r.read()
+            codifica = (r.headers.get("Content-Encoding") or "").lower()
+            if codifica == "gzip":
+                corpo = gzip.decompress(corpo)
+            elif codifica == "deflate":
+                corpo = zlib.decompress(corpo)
+            charset = r.headers.get_content_charset() or "utf-8"
+            return r.status, r.headers, corpo.decode(charset, errors="replace")
+    except HTTPError as e:
+        if e.code == 304:
+            return 304, e.headers, None
+        raise
+
+
+def controlla_fonte(fonte, precedente=None, forza=False, ore_max=None):
+    """Esito per una fonte: {"fonte", "esegui", "motivo", "stato", "ms"}.
+    "stato" è il nuovo stato da salvare solo dopo una cattura riuscita (vedi aggiorna_stato)."""
+    precedente = precedente or {}
+    t0 = time.perf_counter()
+
+    def esito(esegui, motivo, stato=None):
+        return {"fonte": fonte, "esegui": esegui, "motivo": motivo, "stato": stato,
+                "ms": round((time.perf_counter() - t0) * 1000)}
+
+    try:
+        codice, intestazioni, html = _scarica(FONTI_URL[fonte], precedente)
+    except Exception as e:
+        return esito(True, f"controllo HTTP fallito ({e})")
+
+    if codice == 304:
+        stato = {k: v for k, v in precedente.items() if k != "eseguito"}
+        if not precedente.get("box"):
+            # Stato salvato da una versione che teneva l'ETag anche senza box: il 304 non dice nulla
+            return esito(True, "nessun box partita nell'HTML del server (304)", stato)
+        nuovo = False
+    else:
+        hash_html, box = impronta_html(html, fonte)
+        if not box:
+            # Pagina generata lato client: l'HTML non dice nulla sulle formazioni. Niente ETag né
+            # Last-Modified nello stato, così la prossima richiesta non è condizionale (niente 304)
+            return esito(True, "nessun box partita nell'HTML del server", {"hash": hash_html, "box": 0})
+        stato = {"etag": intestazioni.get("ETag"), "last_modified": intestazioni.get("Last-Modified"),
+                 "hash": hash_html, "box": box}
+        nuovo = hash_html != precedente.get("hash")
+
+    if forza:
+        return esito(True, "aggiornamento completo forzato", stato)
+    if not precedente.get("hash"):
+        return esito(True, "nessun controllo precedente", stato)
+    if ore_max is not None and time.time() - precedente.get("eseguito", 0) > ore_max * 3600:
+        return esito(True, f"ultima cattura più vecchia di {ore_max:g} ore", stato)
+    if nuovo:
+        return esito(True, "HTML dei box partita cambiato", stato)
+    return esito(False, "304 Not Modified" if codice == 304 else f"HTML invariato ({stato['box']} box)", stato)
+
+
+def controlla(fonti, stato, forza=False, ore_max=None):
+    """Controlla le fonti in parallelo; ritorna {fonte: esito}."""
+    fonti = [f for f in fonti if f in FONTI_URL]
+    with ThreadPoolExecutor(max_workers=max(1, len(fonti))) as pool:
+        esiti = pool.map(lambda f: controlla_fonte(f, stato.get(f), forza, ore_max), fonti)
+        return {e["fonte"]: e for e in esiti}
+
+
+def stampa_esiti(esiti):
+    for e in esiti.values():
+        icona = "🌐" if e["esegui"] else "💤"
+        azione = "browser necessario" if e["esegui"] else "invariata, browser saltato"
+        print(f"{icona} Pre-flight {e['fonte']}: {azione}: {e['motivo']} ({e['ms']} ms)")
+
+
+def carica_stato(path=None):
+    path = path or STATO_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️ Stato pre-flight illeggibile ({path}), riparto da zero: {e}")
+        return {}
+
+
+def aggiorna_stato(stato, esito, path=None):
+    """Registra lo stato HTTP di una fonte catturata con successo e salva il file."""
+    if not esito.get("stato"):
+        return
+    stato[esito["fonte"]] = {**esito["stato"], "eseguito": int(time.time())}
+    path = path or STATO_PATH
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stato, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# ==========================================================
+#  USO DA WORKFLOW: `python freschezza.py`
+#  Scrive esegui=true|false in $GITHUB_OUTPUT; non salva lo stato
+#  (lo fa run.py dopo la cattura), così un fallimento non lo "consuma"
+# ==========================================================
+if __name__ == "__main__":
+    selezionate = [f.strip().lower() for f in os.environ.get("FONTI", "").split(",") if f.strip()]
+    fonti = [f for f in FONTI_URL if not selezionate or f.lower() in selezionate]
+    t0 = time.perf_counter()
+    esiti = controlla(
+        fonti, carica_stato(),
+        forza=os.environ.get("AGGIORNAMENTO_COMPLETO", "0") == "1",
+        ore_max=float(os.environ.get("AGGIORNAMENTO_COMPLETO_ORE", "12")),
+    )
+    stampa_esiti(esiti)
+    da_eseguire = [f for f, e in esiti.items() if e["esegui"]]
+    print(f"⏱️ Pre-flight completato in {time.perf_counter() - t0:.1f}s: "
+          f"{', '.join(da_eseguire) if da_eseguire else 'nessuna fonte da aggiornare'}")
+    if os.environ.get("GITHUB_OUTPUT"):
+        with open(os.environ["GITHUB_OUTPUT"], "a", encoding="utf-8") as f:
+            f.write(f"esegui={'true' if da_eseguire else 'false'}\n")
+            f.write(f"fonti={','.join(da_eseguire)}\n")
+    sys.exit(0)
@@ -0,0 +1,200 @@
+# ==========================================================
+#  PRIMITIVE IMMAGINE CONDIVISE DALLE FONTI
+#  Profili colonna vettorizzati (NumPy, con fallback PIL) e
+#  composizione a blocchi: impila / allarga / separatore / bordo
+#  e codifica del file finale (PNG, PNG a palette, WebP)
+# ==========================================================
+import io
+
+from PIL import Image, ImageOps
+
+try:
+    import numpy as np
+except ImportError:  # fallback puro PIL
+    np = None
+
+# Soglia di "pixel scuro" in luminanza: equivale a R+G+B < 690 della vecchia ricerca
+SOGLIA_SCURO = 230
+
+
+def profilo_colonne(img, soglia=SOGLIA_SCURO, x0=0, x1=None):
+    """Frazione di pixel scuri per ogni colonna in [x0, x1), come lista di float 0..1."""
+    x1 = img.width if x1 is None else x1
+    zona = img.crop((x0, 0, x1, img.height)).convert("L")
+    if np is not None:
+        return (np.asarray(zona) < soglia).mean(axis=0).tolist()
+    # PIL: maschera binaria, poi media per colonna con un solo resize BOX a 1 px di altezza
+    maschera = zona.point(lambda v: 255 if v < soglia else 0)
+    return [v / 255 for v in maschera.resize((zona.width, 1), Image.BOX).getdata()]
+
+
+def cerca_colonna_divisoria(img, finestra=0.12, soglia=SOGLIA_SCURO):
+    """Colonna più "bianca" vicino al centro, dove dividere le note in due metà.
+
+    Cerca in una finestra di ±finestra*larghezza (almeno ±7 px) su tutte le righe;
+    tra le colonne a oscurità minima sceglie il centro della corsa contigua più larga,
+    a parità quella più vicina al centro, così il taglio cade nel mezzo dello spazio bianco."""
+    w = img.width
+    centro = w // 2
+    raggio = max(7, int(w * finestra))
+    x0, x1 = max(1, centro - raggio), min(w - 1, centro + raggio + 1)
+    if x1 <= x0:
+        return centro
+
+    profilo = profilo_colonne(img, soglia, x0, x1)
+    minimo = min(profilo)
+    corse, inizio = [], None
+    for i, v in enumerate(profilo + [None]):
+        if v is not None and v <= minimo + 1e-9:
+            inizio = i if inizio is None else inizio
+        elif inizio is not None:
+            corse.append((inizio, i - 1))
+            inizio = None
+
+    def punteggio(corsa):
+        a, b = corsa
+        return (b - a, -abs(x0 + (a + b) // 2 - centro))
+
+    a, b = max(corse, key=punteggio)
+    return x0 + (a + b) // 2
+
+
+def allarga(img, larghezza, sfondo):
+    """Centra l'immagine su una tela larga `larghezza` con colore di sfondo."""
+    if img.width == larghezza:
+        return img
+    tela = Image.new("RGB", (larghezza, img.height), sfondo)
+    tela.paste(img, ((larghezza - img.width) // 2, 0))
+    return tela
+
+
+def impila(blocchi, sfondo, larghezza=None):
+    """Impila verticalmente immagini centrate; un intero nella lista è uno spazio verticale in px."""
+    larghezza = larghezza or max(b.width for b in blocchi if not isinstance(b, int))
+    altezza = sum(b if isinstance(b, int) else b.height for b in blocchi)
+    tela = Image.new("RGB", (larghezza, altezza), sfondo)
+    y = 0
+    for b in blocchi:
+        if isinstance(b, int):
+            y += b
+            continue
+        tela.paste(b, ((larghezza - b.width) // 2, y))
+        y += b.height
+    return tela
+
+
+def separatore(larghezza, sfondo, colore_linea, spessore=4, margine=10):
+    """Linea orizzontale con margine sopra e sotto."""
+    sep = Image.new("RGB", (larghezza, spessore + margine * 2), sfondo)
+    sep.paste(Image.new("RGB", (larghezza, spessore), colore_linea), (0, margine))
+    return sep
+
+
+def ridimensiona_larghezza(img, larghezza, resample=Image.LANCZOS):
+    """Ridimensiona mantenendo le proporzioni."""
+    return img.resize((larghezza, int(img.height * larghezza / img.width)), resample=resample)
+
+
+def bordo(img, sinistra, sopra, destra, sotto, colore):
+    return ImageOps.expand(img, border=(sinistra, sopra, destra, sotto), fill=colore)
+
+
+# ==========================================================
+#  RICETTE DI COMPOSIZIONE PER FONTE
+# ==========================================================
+SOSFANTA_TAGLIO = 120
+FANTACALCIO_BG = (30, 34, 51)   # #1e2233
+GAZZETTA_ROSA = (253, 233, 235)
+GAZZETTA_LINEA = (210, 190, 190)
+GAZZETTA_TAGLIO = 175
+GAZZETTA_SCALA_NOTE = 0.88
+
+
+def componi_sosfanta(raw):
+    """Box partita con taglio laterale di 120 px."""
+    return raw.crop((SOSFANTA_TAGLIO, 0, raw.width - SOSFANTA_TAGLIO, raw.height))
+
+
+def componi_fantacalcio(formazioni, grafici):
+    """Formazioni sopra, grafici sotto, stessa larghezza su sfondo blu del sito."""
+    return impila([formazioni, grafici], FANTACALCIO_BG)
+
+
+def componi_gazzetta(lineup, notes=None):
+    """Formazioni tagliate ai lati + note divise in due metà impilate e ridotte, con cornice."""
+    if lineup.width > GAZZETTA_TAGLIO * 2:
+        lineup = lineup.crop((GAZZETTA_TAGLIO, 0, lineup.width - GAZZETTA_TAGLIO, lineup.height))
+    base_width = lineup.width
+    blocchi = [lineup]
+
+    if notes is not None:
+        col = cerca_colonna_divisoria(notes)
+        larghezza_note = int(base_width * GAZZETTA_SCALA_NOTE)
+        sinistra = ridimensiona_larghezza(notes.crop((0, 0, col, notes.height)), larghezza_note)
+        destra = ridimensiona_larghezza(notes.crop((col, 0, notes.width, notes.height)), larghezza_note)
+        sep = separatore(larghezza_note, GAZZETTA_ROSA, GAZZETTA_LINEA)
+        blocchi += [30, impila([sinistra, sep, destra], GAZZETTA_ROSA)]
+
+    combined = impila(blocchi, GAZZETTA_ROSA, base_width)
+    return bordo(combined, 20, 40, 20, 40, GAZZETTA_ROSA)
+
+
+# ==========================================================
+#  CODIFICA DEL FILE FINALE
+# ==========================================================
+# png: PNG senza perdita (impostazioni di default, come le versioni precedenti)
+# png8: PNG a palette adattiva; webp: WebP senza perdita; webp-q: WebP con perdita
+FORMATI = ("png", "png8", "webp", "webp-q")
+QUALITA_MIN_WEBP = 60
+LARGHEZZA_MIN_BUDGET = 0.5   # con il budget non si scende sotto metà della larghezza
+
+
+def _salva(img, formato, qualita=90):
+    buf = io.BytesIO()
+    if formato == "png":
+        img.save(buf, format="PNG")
+    elif formato == "png8":
+        # Render a tinte piatte: palette senza dithering, che sporcherebbe gli sfondi uniti
+        img.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE).save(
+            buf, format="PNG", optimize=True)
+    elif formato == "webp":
+        img.save(buf, format="WEBP", lossless=True, quality=80, method=4)
+    elif formato == "webp-q":
+        img.save(buf, format="WEBP", quality=qualita, method=4)
+    else:
+        raise ValueError(f"formato immagine sconosciuto: {formato}")
+    return buf.getvalue()
+
+
+def codifica(img, formato="png", larghezza_max=None, budget=None, qualita=90):
+    """Codifica l'immagine finale; ritorna (byte, dettagli) con dettagli = larghezza, altezza,
+    qualità usata (webp-q) ed "entro_budget".
+
+    larghezza_max riduce le immagini più larghe. Con budget (byte) si scende per gradi:
+    prima la qualità (webp-q, fino a QUALITA_MIN_WEBP), poi, a quella qualità, una riduzione di larghezza stimata
+    dal rapporto budget/byte, fino a metà della larghezza; se non basta resta il file più piccolo.
+    In png8 non si riducono i colori: sulle catture di prova il file non cala in modo apprezzabile."""
+    if larghezza_max and img.width > larghezza_max:
+        img = ridimensiona_larghezza(img, larghezza_max)
+    tentativi = [{}]
+    if formato == "webp-q":
+        # Almeno la qualità richiesta, anche se già sotto QUALITA_MIN_WEBP
+        passi = range(qualita, QUALITA_MIN_WEBP - 1, -15) if budget else ()
+        tentativi = [{"qualita": q} for q in passi] or [{"qualita": qualita}]
+
+    larghezza_min = int(img.width * LARGHEZZA_MIN_BUDGET)
+    migliore = None
+    while True:
+        for t in tentativi:
+            dati = _salva(img, formato, **t)
+            dettagli = {"larghezza": img.width, "altezza": img.height, **t}
+            if not budget or len(dati) <= budget:
+                return dati, {**dettagli, "entro_budget": True}
+            if migliore is None or len(dati) < len(migliore[0]):
+                migliore = (dati, {**dettagli, "entro_budget": False})
+        if img.width <= larghezza_min:
+            return migliore
+        # I byte crescono circa con l'area: scala sqrt(budget/byte), con un 5% di margine
+        fattore = min(0.9, (budget / len(migliore[0])) ** 0.5 * 0.95)
+        img = ridimensiona_larghezza(img, max(larghezza_min, int(img.width * fattore)))
+        tentativi = tentativi[-1:]   # ridotta la larghezza, resta la qualità più bassa già provata
@@ -4,553 +4,2720 @@
 # ==========================================================
 
 # --- LIBRERIE ---
-import asyncio, re, os, glob, json, base64
-import nest_asyncio
-from playwright.async_api import async_playwright
-from PIL import Image, ImageOps 
-
-# Importazioni per Google Drive
-# Verranno risolte dopo aver corretto requirements.txt
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+import asyncio, re, os, glob, json, base64, time, hashlib, zlib, random, threading, io, resource, contextvars, statistics
+import argparse, functools, signal, sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, parse_qs
+import traccia
+from traccia import span, misurato
+import freschezza
+from freschezza import FONTI_URL
+
+# Import pesanti rinviati al primo uso, così `import run` resta rapido e senza rete:
+# Playwright (avvio browser, attese), PIL/NumPy (immagini.py, decodifica e impronte),
+# client Google (init_google_drive, al primo upload)
 
 # ==========================================================
 #  CONFIG
 # ==========================================================
-DRIVE_FOLDER_ID = "1Oy6nEebc7hE0OOyD3DKnqb3PaGSLk2eO" 
-MAX_MATCH = 10
+def _per_fonte(testo, tipo=int):
+    """"900" vale per tutte le fonti ({"*": 900}), "SosFanta=900,Gazzetta=760" per singola fonte."""
+    valori = {}
+    for voce in filter(None, (v.strip() for v in testo.split(","))):
+        fonte, _, valore = voce.rpartition("=")
+        valori[fonte.strip().lower() or "*"] = tipo(valore.strip())
+    return valori
+
+def _di_fonte(valori, fonte, predefinito=0):
+    return valori.get(fonte.lower(), valori.get("*", predefinito))
+
+def _dimensioni(testo):
+    """"1600x1200" → {"width": 1600, "height": 1200}."""
+    larghezza, _, altezza = testo.lower().partition("x")
+    return {"width": int(larghezza), "height": int(altezza)}
+
+def _intervalli(testo):
+    """"3-5,8" → {3, 4, 5, 8}; vuoto = None (tutte le partite). Un intervallo rovesciato o una
+    selezione che non contiene partite sono un errore, non "tutte le partite"."""
+    if not testo.strip():
+        return None
+    indici = set()
+    for voce in filter(None, (v.strip() for v in testo.split(","))):
+        da, trattino, a = voce.partition("-")
+        try:
+            da, a = int(da), int(a if trattino else da)
+        except ValueError:
+            raise ValueError(f"partite non valide: {voce} (atteso es. 3-5,8)") from None
+        if not 1 <= da <= a:
+            raise ValueError(f"intervallo di partite non valido: {voce} (atteso da-a con 1 <= da <= a)")
+        indici.update(range(da, a + 1))
+    if not indici:
+        raise ValueError(f"nessuna partita in: {testo!r}")
+    return indici
+
+def _shard(testo):
+    """"2/3" → (2, 3), seconda parte di tre; vuoto = (1, 1), tutto in un solo processo."""
+    if not testo.strip():
+        return 1, 1
+    k, _, n = testo.partition("/")
+    k, n = int(k), int(n)
+    if not 1 <= k <= n:
+        raise ValueError(f"shard non valido: {testo} (atteso K/N con 1 <= K <= N)")
+    return k, n
+
+# Cartella Drive di destinazione e partite considerate per fonte (le prime MAX_MATCH della pagina)
+DRIVE_FOLDER_ID = os.environ.get("DRIVE_FOLDER_ID", "1Oy6nEebc7hE0OOyD3DKnqb3PaGSLk2eO")
+MAX_MATCH = int(os.environ.get("MAX_MATCH", "10"))
+# Partite da eseguire per posizione nella pagina (es. "3-5,8"); None = tutte. Impostate da configura
+# con --partite o la variabile PARTITE, così un valore non valido è un errore della riga di comando
+PARTITE_SELEZIONATE = None
+# Parte "K/N" del lavoro (--shard): solo le partite con (idx - 1) % N == K - 1. Con N > 1 manifest,
+# checkpoint, JSON e traccia vanno in file per parte, riuniti da `run.py --unisci N`
+SHARD = _shard(os.environ.get("SHARD", ""))
+# NO_UPLOAD=1 (--no-upload): cattura, compone e salva su disco, senza Drive
+CARICA = os.environ.get("NO_UPLOAD", "0") != "1"
+# Numero massimo di fonti elaborate in parallelo sullo stesso browser
+MAX_CONCORRENZA = int(os.environ.get("MAX_CONCORRENZA", "3"))
+# Pagine per fonte su cui distribuire le partite (1 = tutte in sequenza sulla pagina principale)
+POOL_PAGINE = int(os.environ.get("POOL_PAGINE", "1"))
+# Memoria limitata (MEMORIA_LIMITATA=1), per i runner piccoli: viewport basso e pagina riciclata ogni
+# RICICLA_PAGINA_DOPO partite o oltre HEAP_MAX_MB di heap JS. I singoli valori si possono anche impostare a sé
+MEMORIA_LIMITATA = os.environ.get("MEMORIA_LIMITATA", "0") == "1"
+# Viewport "LxA" e device_scale_factor per fonte (vedi _per_fonte), es. VIEWPORT="SosFanta=1600x1400".
+# Le catture sono sempre in pixel CSS: uno scale factor < 1 riduce la memoria di rendering, non le misure
+VIEWPORT = _per_fonte(os.environ.get("VIEWPORT", ""), _dimensioni)
+VIEWPORT_PREDEFINITO = {"width": 1600, "height": 1200 if MEMORIA_LIMITATA else 4000}
+SCALA_DISPOSITIVO = _per_fonte(os.environ.get("DEVICE_SCALE_FACTOR", ""), float)
+# 0 = mai
+RICICLA_PAGINA_DOPO = int(os.environ.get("RICICLA_PAGINA_DOPO", "4" if MEMORIA_LIMITATA else "0"))
+HEAP_MAX_MB = int(os.environ.get("HEAP_MAX_MB", "150" if MEMORIA_LIMITATA else "0"))
+# Ogni quanti secondi campionare la memoria di browser, renderer e pagine (0 = mai, il predefinito
+# fuori da MEMORIA_LIMITATA: ogni campione è una chiamata CDP per pagina più una scansione di /proc)
+CAMPIONE_MEMORIA_S = float(os.environ.get("CAMPIONE_MEMORIA_S", "1" if MEMORIA_LIMITATA else "0"))
+# Modalità demone (--demone): trigger HTTP locale e intervallo minimo tra due controlli di una fonte
+DEMONE_HOST = os.environ.get("DEMONE_HOST", "127.0.0.1")
+DEMONE_PORTA = int(os.environ.get("DEMONE_PORTA", "8787"))
+DEMONE_MIN_S = int(os.environ.get("DEMONE_MIN_S", "120"))
+BROWSER_ARGS = ["--no-sandbox", "--disable-dev-shm-usage", "--headless=new"]
+# Manifest delle impronte delle immagini caricate (ripristinato dalla cache del workflow)
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", "manifest_upload.json")
+# Impronta percettiva: lato del blocco in px e differenza massima tollerata (livelli 0-15).
+# Di default un upload si salta solo a pixel identici: l'impronta è troppo grossolana per il testo
+# (un "60%" diventato "80%" resta nella tolleranza) e serve solo a segnalare nel log le differenze
+# da rumore di rendering. PHASH_TOLLERANTE=1 salta anche gli upload con impronta percettiva simile
+PHASH_BLOCCO = int(os.environ.get("PHASH_BLOCCO", "16"))
+PHASH_TOLLERANZA = int(os.environ.get("PHASH_TOLLERANZA", "1"))
+PHASH_TOLLERANTE = os.environ.get("PHASH_TOLLERANTE", "0") == "1"
+# Partite con DOM invariato: niente screenshot né composizione, resta il link precedente.
+# AGGIORNAMENTO_COMPLETO=1 forza la cattura di tutto; comunque ogni N ore si ricattura
+# (rete di sicurezza per modifiche solo di stile, invisibili nell'impronta del DOM)
+AGGIORNAMENTO_COMPLETO = os.environ.get("AGGIORNAMENTO_COMPLETO", "0") == "1"
+AGGIORNAMENTO_COMPLETO_ORE = float(os.environ.get("AGGIORNAMENTO_COMPLETO_ORE", "12"))
+# Endpoint alternativo delle API Drive, es. "http://127.0.0.1:8765/" (server Drive finto del benchmark)
+DRIVE_API_ROOT = os.environ.get("DRIVE_API_ROOT")
+# Fonti da eseguire (es. "gazzetta,sosfanta"); vuoto = tutte
+FONTI_SELEZIONATE = [f.strip().lower() for f in os.environ.get("FONTI", "").split(",") if f.strip()]
+# Pagine registrate (HAR) per il benchmark offline: registrazione o replay, una per fonte
+HAR_REGISTRA_DIR = os.environ.get("HAR_REGISTRA_DIR")
+HAR_REPLAY_DIR = os.environ.get("HAR_REPLAY_DIR")
+# Pre-flight HTTP (freschezza.py): le fonti con HTML invariato non aprono il browser.
+# Disattivato con le pagine registrate, che vanno sempre riprodotte per intero
+PREFLIGHT = os.environ.get("PREFLIGHT", "1") == "1" and not (HAR_REGISTRA_DIR or HAR_REPLAY_DIR)
+# Profilo Chromium persistente per fonte (cache HTTP su disco, cookie di consenso), in una cartella
+# portabile che il workflow ripristina dalla cache; vuoto = contesti usa e getta. Non con i file HAR
+PROFILI_DIR = None if (HAR_REGISTRA_DIR or HAR_REPLAY_DIR) else os.environ.get("PROFILI_DIR")
+PROFILI_MAX_MB = int(os.environ.get("PROFILI_MAX_MB", "150"))
+# Thread dedicati agli upload e tentativi (con backoff esponenziale) su errori 429/5xx
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "4"))
+UPLOAD_TENTATIVI = int(os.environ.get("UPLOAD_TENTATIVI", "5"))
+# Checkpoint della run (fasi per fonte e per partita) letto da `run.py --resume`
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "checkpoint.json")
+# Tentativi nella stessa run: per partita (dal secondo su una pagina nuova) e per fonte (contesto nuovo)
+TENTATIVI_PARTITA = int(os.environ.get("TENTATIVI_PARTITA", "3"))
+TENTATIVI_FONTE = int(os.environ.get("TENTATIVI_FONTE", "2"))
+# Debug: salva anche gli screenshot intermedi (raw_*, tmp_*, *_lineup, *_notes)
+KEEP_INTERMEDI = os.environ.get("KEEP_INTERMEDI", "0") == "1"
+# Timeout (ms) di ciascun segnale di prontezza della pagina (visibile, stabile, immagini, font)
+ATTESA_MAX_MS = int(os.environ.get("ATTESA_MAX_MS", "5000"))
+# Blocco richieste inutili per gli screenshot (ads, tracker, video): 0 per disattivarlo
+BLOCCO_RICHIESTE = os.environ.get("BLOCCO_RICHIESTE", "1") == "1"
+# Output: "screenshot" (default), "json" (solo dati strutturati) o "entrambi"
+MODALITA_OUTPUT = os.environ.get("MODALITA_OUTPUT", "screenshot").lower()
+SALVA_SCREENSHOT = MODALITA_OUTPUT in ("screenshot", "entrambi")
+SALVA_JSON = MODALITA_OUTPUT in ("json", "entrambi")
+JSON_PATH = os.environ.get("JSON_PATH", "formazioni.json")
+# Codifica del file finale: png (default, senza perdita), png8 (palette, per i render a tinte
+# piatte), webp (senza perdita) o webp-q (con perdita, qualità WEBP_QUALITA); vedi immagini.codifica
+FORMATO_IMMAGINE = os.environ.get("FORMATO_IMMAGINE", "png").lower()
+if FORMATO_IMMAGINE not in ("png", "png8", "webp", "webp-q"):
+    print(f"⚠️ FORMATO_IMMAGINE sconosciuto ({FORMATO_IMMAGINE}), uso png")
+    FORMATO_IMMAGINE = "png"
+ESTENSIONE_IMMAGINE = "webp" if FORMATO_IMMAGINE.startswith("webp") else "png"
+MIMETYPE_IMMAGINE = f"image/{ESTENSIONE_IMMAGINE}"
+WEBP_QUALITA = int(os.environ.get("WEBP_QUALITA", "90"))
+if not 1 <= WEBP_QUALITA <= 100:
+    print(f"⚠️ WEBP_QUALITA fuori da 1-100 ({WEBP_QUALITA}), uso 90")
+    WEBP_QUALITA = 90
+# Larghezza massima (px) e budget (KB) del file finale, per fonte (vedi _per_fonte); 0 = nessun limite
+LARGHEZZA_MAX = _per_fonte(os.environ.get("LARGHEZZA_MAX", ""))
+BUDGET_KB = _per_fonte(os.environ.get("BUDGET_KB", ""))
+# Rapporto di compressione per partita; il confronto con il PNG di default costa una codifica in più
+RAPPORTO_CODIFICA = os.environ.get("RAPPORTO_CODIFICA", "0") == "1"
+# Traccia prestazioni (TRACCIA=1): report JSON e, con TRACCIA_CHROME=1, file per chrome://tracing
+TRACCIA_PATH = os.environ.get("TRACCIA_PATH", "traccia.json")
+TRACCIA_CHROME_PATH = "traccia.chrome.json" if os.environ.get("TRACCIA_CHROME", "0") == "1" else None
 # Rimosso GIORNATA, START_ROW_GAZZETTA e uso Sheets
 # Rimosso: SHEETS_ID, ecc.
 
+# ==========================================================
+#  SELEZIONE DEL LAVORO (partite e parti della run)
+# ==========================================================
+def partita_selezionata(idx, shard=None):
+    """True se la partita idx (da 1) tocca a questa esecuzione: tra PARTITE_SELEZIONATE e nella
+    parte SHARD. La divisione è per posizione, a turno (1, N+1, 2N+1... alla prima parte): ogni
+    parte ha le stesse partite in ogni run e fa circa la stessa quota di ogni fonte."""
+    k, n = shard or SHARD
+    return (PARTITE_SELEZIONATE is None or idx in PARTITE_SELEZIONATE) and (idx - 1) % n == k - 1
+
+def percorso_shard(path, shard=None):
+    """File propri della parte: "checkpoint.json" → "checkpoint.shard2-3.json" (invariato con N = 1)."""
+    k, n = shard or SHARD
+    if n == 1:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard{k}-{n}{ext}"
+
 # ==========================================================
 #  AUTENTICAZIONE E SERVIZI (ADATTATA PER SECRET B64)
 # ==========================================================
 
 SCOPES = ["https://www.googleapis.com/auth/drive"] 
 drive_svc = None
+drive_creds = None
+
+def _opzioni_client_drive():
+    return {"api_endpoint": f"{DRIVE_API_ROOT.rstrip('/')}/drive/v3/"} if DRIVE_API_ROOT else None
+
+def _nuovo_http():
+    import httplib2
+
+    if DRIVE_API_ROOT and DRIVE_API_ROOT.startswith("http://"):
+        class _HttpEndpointInChiaro(httplib2.Http):
+            """googleapiclient forza https sugli URL di upload anche con api_endpoint http://:
+            per un DRIVE_API_ROOT locale in chiaro riporta lo schema a http."""
+            def request(self, uri, *args, **kwargs):
+                if uri.startswith("https://") and urlsplit(uri).netloc == urlsplit(DRIVE_API_ROOT).netloc:
+                    uri = "http://" + uri[len("https://"):]
+                return super().request(uri, *args, **kwargs)
+
+        return _HttpEndpointInChiaro(timeout=60)
+    return httplib2.Http(timeout=60)
+
+def _costruisci_servizio(**kwargs):
+    """Client Drive v3 dal documento di discovery incluso nel pacchetto (nessuna richiesta di rete)."""
+    from googleapiclient.discovery import build
+    return build("drive", "v3", static_discovery=True, cache_discovery=False, **kwargs)
 
 def init_google_drive():
     """Autentica con la chiave JSON del Service Account decodificata dal Secret."""
-    global drive_svc
+    global drive_svc, drive_creds
     
     b64_key = os.environ.get("GOOGLE_CREDENTIALS_B64")
-    if not b64_key:
+    if not b64_key and not DRIVE_API_ROOT:
         print("🛑 ERRORE: La variabile d'ambiente GOOGLE_CREDENTIALS_B64 non è impostata.")
         return None
 
     try:
-        json_key = base64.b64decode(b64_key).decode('utf-8')
-        creds_info = json.loads(json_key)
-        
-        creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-        
-        drive_svc = build("drive", "v3", credentials=creds)
+        from google_auth_httplib2 import AuthorizedHttp
+        if b64_key:
+            from google.oauth2.service_account import Credentials
+            json_key = base64.b64decode(b64_key).decode('utf-8')
+            creds_info = json.loads(json_key)
+            creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+        else:
+            # Server Drive finto: nessuna autenticazione reale
+            from google.auth.credentials import AnonymousCredentials
+            creds = AnonymousCredentials()
+
+        if DRIVE_API_ROOT:
+            drive_svc = _costruisci_servizio(http=AuthorizedHttp(creds, http=_nuovo_http()),
+                                             client_options=_opzioni_client_drive())
+        else:
+            drive_svc = _costruisci_servizio(credentials=creds)
+        drive_creds = creds
         print("✅ Autenticazione Google Drive (Service Account) riuscita.")
         return drive_svc
     except Exception as e:
         print(f"🛑 ERRORE di Autenticazione Drive: {e}")
         return None
 
-init_google_drive()
-nest_asyncio.apply()
+_drive_init_lock = threading.Lock()
+_drive_init_fatto = False
+
+def servizio_drive():
+    """Client Drive inizializzato al primo uso reale (primo upload o permessi), poi riusato;
+    una run senza nulla da caricare non autentica e non importa il client Google."""
+    global _drive_init_fatto
+    with _drive_init_lock:
+        if not _drive_init_fatto:
+            _drive_init_fatto = True
+            with span("drive.init"):
+                init_google_drive()
+    return drive_svc
 
 
 # ==========================================================
 #  FUNZIONE DRIVE
 # ==========================================================
-def drive_upload_or_replace(local_path, name):
-    """Carica o sostituisce un file su Google Drive."""
-    global drive_svc
-    if not drive_svc:
+# Contatore delle richieste HTTP verso le API Drive in questa esecuzione
+drive_chiamate = {"list": 0, "update": 0, "create": 0, "batch": 0}
+# Indice nome → file id della cartella, caricato una volta per esecuzione
+indice_cartella = None
+
+_drive_lock = threading.Lock()
+_drive_locale = threading.local()
+
+def _esegui_drive(richiesta, tipo):
+    with _drive_lock:
+        drive_chiamate[tipo] += 1
+    return richiesta.execute()
+
+def _drive_del_thread():
+    """Servizio Drive con connessione HTTP propria del thread (httplib2 non è thread-safe)."""
+    svc = getattr(_drive_locale, "svc", None)
+    if svc is None:
+        from google_auth_httplib2 import AuthorizedHttp
+        http = AuthorizedHttp(drive_creds, http=_nuovo_http())
+        svc = _costruisci_servizio(http=http, client_options=_opzioni_client_drive())
+        _drive_locale.svc = svc
+    return svc
+
+def _errore_transitorio(e):
+    import httplib2
+    from googleapiclient.errors import HttpError
+    if isinstance(e, HttpError):
+        return e.resp.status == 429 or e.resp.status >= 500
+    return isinstance(e, (ConnectionError, TimeoutError, httplib2.HttpLib2Error))
+
+_indice_lock = threading.Lock()
+
+@misurato("drive.indice")
+def carica_indice_cartella():
+    """Elenca DRIVE_FOLDER_ID una sola volta (con paginazione) in un indice nome → id."""
+    global indice_cartella
+    with _indice_lock:
+        if indice_cartella is None:
+            indice_cartella = _elenca_cartella()
+    return indice_cartella
+
+def _elenca_cartella():
+    indice = {}
+    page_token = None
+    while True:
+        res = _esegui_drive(drive_svc.files().list(
+            q=f"'{DRIVE_FOLDER_ID}' in parents and trashed=false",
+            fields="nextPageToken, files(id, name)", pageSize=1000, pageToken=page_token,
+            supportsAllDrives=True, includeItemsFromAllDrives=True
+        ), "list")
+        for f in res.get("files", []):
+            indice.setdefault(f["name"], f["id"])
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+    print(f"🗂️ Indice cartella Drive: {len(indice)} file")
+    return indice
+
+@misurato("drive.permessi_batch")
+def concedi_permessi_in_attesa():
+    """Rende pubblici con richieste batch (max 100 per batch) i file creati nell'esecuzione e quelli
+    rimasti in attesa nel checkpoint da una run precedente (interrotta o con il batch fallito)."""
+    in_attesa = list(checkpoint.dati.get("permessi", []))
+    if not in_attesa or not servizio_drive():
+        return
+    from googleapiclient.http import BatchHttpRequest
+    concessi = []
+
+    def _esito(request_id, response, exception):
+        # 404: file cancellato nel frattempo, non resta niente da rendere pubblico
+        if exception is None or getattr(getattr(exception, "resp", None), "status", None) == 404:
+            concessi.append(request_id)
+        else:
+            print(f"🛑 ERRORE permesso pubblico per {request_id}: {exception}")
+
+    for i in range(0, len(in_attesa), 100):
+        blocco = in_attesa[i:i + 100]
+        if DRIVE_API_ROOT:
+            batch = BatchHttpRequest(callback=_esito, batch_uri=f"{DRIVE_API_ROOT.rstrip('/')}/batch/drive/v3")
+        else:
+            batch = drive_svc.new_batch_http_request(callback=_esito)
+        for file_id in blocco:
+            batch.add(drive_svc.permissions().create(
+                fileId=file_id, body={"role": "reader", "type": "anyone"}, fields="id"
+            ), request_id=file_id)
+        try:
+            _esegui_drive(batch, "batch")
+        except Exception as e:
+            print(f"🛑 ERRORE batch permessi Drive: {e}")
+    checkpoint.permessi_concessi(concessi)
+    if len(concessi) < len(in_attesa):
+        print(f"⚠️ {len(in_attesa) - len(concessi)} file ancora privati: permesso pubblico ritentato alla prossima esecuzione")
+
+def _drive_upload(svc, dati, name, mimetype):
+    from googleapiclient.http import MediaIoBaseUpload
+    media = MediaIoBaseUpload(io.BytesIO(dati), mimetype=mimetype, resumable=False)
+    with _drive_lock:
+        file_id = indice_cartella.get(name)
+
+    if file_id:
+        _esegui_drive(svc.files().update(
+            fileId=file_id, media_body=media,
+            keepRevisionForever=False, supportsAllDrives=True
+        ), "update")
+    else:
+        meta = {"name": name, "parents": [DRIVE_FOLDER_ID], "mimeType": mimetype}
+        file = _esegui_drive(svc.files().create(
+            body=meta, media_body=media, fields="id, webViewLink", supportsAllDrives=True
+        ), "create")
+        file_id = file["id"]
+        with _drive_lock:
+            indice_cartella[name] = file_id
+        # Condivisione pubblica: concessa in batch a fine esecuzione, intanto il file id resta nel checkpoint
+        checkpoint.permesso_in_attesa(file_id)
+
+    return f"https://drive.google.com/uc?id={file_id}"
+
+@misurato("drive.upload")
+def drive_upload_or_replace(dati, name, mimetype=MIMETYPE_IMMAGINE):
+    """Carica o sostituisce un file su Google Drive a partire dai byte già codificati.
+    Sicura da chiamare da più thread; ritenta con backoff esponenziale su 429/5xx."""
+    if not servizio_drive():
         print("⚠️ Drive Service non disponibile. Salto l'upload.")
         return "UPLOAD_FAILED"
-        
+
+    with _drive_lock:
+        serve_indice = indice_cartella is None
+    if serve_indice:
+        try:
+            carica_indice_cartella()
+        except Exception as e:
+            print(f"🛑 ERRORE lettura cartella Drive: {e}")
+            return "UPLOAD_FAILED"
+
+    svc = _drive_del_thread() if drive_creds else drive_svc
+    for tentativo in range(UPLOAD_TENTATIVI):
+        try:
+            with span("drive.richiesta", file=name, tentativo=tentativo + 1, byte=len(dati)):
+                return _drive_upload(svc, dati, name, mimetype)
+        except Exception as e:
+            if not _errore_transitorio(e) or tentativo == UPLOAD_TENTATIVI - 1:
+                print(f"🛑 ERRORE durante l'upload di {name}: {e}")
+                return "UPLOAD_FAILED"
+            attesa = min(32, 2 ** tentativo) + random.random()
+            print(f"⏳ Upload {name}: errore transitorio ({e}), nuovo tentativo tra {attesa:.1f}s")
+            time.sleep(attesa)
+
+
+# ==========================================================
+#  ATTESE EVENT-DRIVEN (al posto delle sleep fisse)
+# ==========================================================
+JS_PRONTEZZA = """
+async ([el, opts]) => {
+    const esiti = {};
+    const entro = (p, ms) => Promise.race([
+        p.then(v => v !== false),
+        new Promise(r => setTimeout(() => r(false), ms)),
+    ]);
+    const misura = async (nome, p) => {
+        const t = performance.now();
+        const ok = await entro(p, opts.timeout);
+        esiti[nome] = {ms: Math.round(performance.now() - t), ok};
+    };
+
+    if (opts.stabile) {
+        // bounding box identico per N animation frame consecutivi
+        const fine = performance.now() + opts.timeout;
+        await misura('stabile', new Promise(resolve => {
+            let prec = null, uguali = 0;
+            const frame = () => {
+                const r = el.getBoundingClientRect();
+                const cur = [r.x, r.y, r.width, r.height].join(',');
+                uguali = (cur === prec && r.height > 0) ? uguali + 1 : 0;
+                prec = cur;
+                if (uguali >= opts.frames) resolve(true);
+                else if (performance.now() > fine) resolve(false);
+                else requestAnimationFrame(frame);
+            };
+            requestAnimationFrame(frame);
+        }));
+    }
+    if (opts.immagini) {
+        const imgs = [...el.querySelectorAll('img')];
+        imgs.forEach(img => { if (img.loading === 'lazy') img.loading = 'eager'; });
+        await misura('immagini', Promise.all(imgs.map(img =>
+            (img.complete ? Promise.resolve() : new Promise(r => {
+                img.addEventListener('load', r, {once: true});
+                img.addEventListener('error', r, {once: true});
+            })).then(() => img.decode ? img.decode().catch(() => {}) : null)
+        )));
+    }
+    if (opts.font && document.fonts) {
+        await misura('font', document.fonts.ready);
+    }
+    return esiti;
+}
+"""
+
+async def attendi_pronto(page, target, nome, stabile=True, immagini=True, font=True, timeout_ms=None):
+    """Attende che un elemento sia pronto per lo screenshot usando segnali concreti:
+    visibile, bounding box stabile tra i frame, immagini lazy decodificate, font caricati.
+    Ogni segnale ha il proprio timeout; il tempo effettivamente atteso viene loggato.
+    target può essere un selettore o un ElementHandle. Ritorna l'elemento (None se mai visibile)."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    timeout_ms = timeout_ms or ATTESA_MAX_MS
+    t0 = time.perf_counter()
     try:
-        media = MediaFileUpload(local_path, mimetype="image/png", resumable=False)
-        res = drive_svc.files().list(
-            q=f"name='{name}' and '{DRIVE_FOLDER_ID}' in parents and trashed=false",
-            fields="files(id)", supportsAllDrives=True
-        ).execute()
-        files = res.get("files", [])
-        file_id = files[0]["id"] if files else None
-        
-        if file_id:
-            drive_svc.files().update(
-                fileId=file_id, media_body=media,
-                keepRevisionForever=False, supportsAllDrives=True
-            ).execute()
-            status = "⬆️ File aggiornato"
+        if isinstance(target, str):
+            el = await page.wait_for_selector(target, state="visible", timeout=timeout_ms)
         else:
-            meta = {"name": name, "parents": [DRIVE_FOLDER_ID], "mimeType": "image/png"}
-            file = drive_svc.files().create(
-                body=meta, media_body=media, fields="id, webViewLink", supportsAllDrives=True
-            ).execute()
-            file_id = file["id"]
-            # Condivisione pubblica
-            drive_svc.permissions().create(
-                fileId=file_id, 
-                body={"role": "reader", "type": "anyone"}, fields="id"
-            ).execute()
-            status = "➕ File caricato"
-
-        link = f"https://drive.google.com/uc?id={file_id}"
-        return link
-    
-    except Exception as e:
-        print(f"🛑 ERRORE durante l'upload di {name}: {e}")
-        return "UPLOAD_FAILED"
+            el = target
+            await el.wait_for_element_state("visible", timeout=timeout_ms)
+    except PlaywrightTimeoutError:
+        print(f"⏱️ {nome}: non visibile dopo {timeout_ms} ms")
+        return None
+    esiti = {"visibile": {"ms": round((time.perf_counter() - t0) * 1000), "ok": True}}
+
+    opts = {"stabile": stabile, "immagini": immagini, "font": font, "timeout": timeout_ms, "frames": 3}
+    esiti.update(await page.evaluate(JS_PRONTEZZA, [el, opts]))
+
+    dettaglio = ", ".join(
+        f"{k} {v['ms']}ms" + ("" if v["ok"] else " (timeout)") for k, v in esiti.items()
+    )
+    print(f"⏱️ {nome}: pronto in {(time.perf_counter() - t0) * 1000:.0f} ms ({dettaglio})")
+    return el
+
+async def attendi_sparito(locator, nome, timeout_ms=None):
+    """Attende che un elemento (es. banner cookie) sparisca, loggando il tempo atteso."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    timeout_ms = timeout_ms or ATTESA_MAX_MS
+    t0 = time.perf_counter()
+    try:
+        await locator.wait_for(state="hidden", timeout=timeout_ms)
+        esito = ""
+    except PlaywrightTimeoutError:
+        esito = " (timeout)"
+    print(f"⏱️ {nome}: chiuso in {(time.perf_counter() - t0) * 1000:.0f} ms{esito}")
 
 
 # ==========================================================
-#  FONTE 1: SosFanta 
+#  BLOCCO RICHIESTE (ads, tracker, media, iframe di terze parti)
 # ==========================================================
-async def estrai_screenshots_sosfanta():
-    FONTE = "Sos Fanta"
-    URL = "https://www.sosfanta.com/lista-formazioni/probabili-formazioni-serie-a/"
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True, 
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--headless=new"]
-        )
-        context = await browser.new_context(viewport={"width":1600,"height":4000})
-        page = await context.new_page()
-        await page.goto(URL, wait_until="domcontentloaded", timeout=60000)
-
-        # COOKIE
-        for sel in [
-            "button:has-text('Accetta e continua')", "button:has-text('Accetta')", "text='ACCETTA E CONTINUA'"
-        ]:
+# Domini bloccati per tutte le fonti (vale anche per i sottodomini)
+HOST_BLOCCATI_DEFAULT = frozenset({
+    # advertising
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "googletagservices.com",
+    "adservice.google.com", "amazon-adsystem.com", "adnxs.com", "criteo.com", "criteo.net",
+    "rubiconproject.com", "pubmatic.com", "openx.net", "casalemedia.com", "smartadserver.com",
+    "teads.tv", "taboola.com", "outbrain.com", "seedtag.com", "adform.net", "yieldlove.com",
+    "360yield.com", "3lift.com", "sharethrough.com", "onetag-sys.com", "rlcdn.com",
+    # analytics / tracker
+    "google-analytics.com", "googletagmanager.com", "scorecardresearch.com", "quantserve.com",
+    "chartbeat.com", "chartbeat.net", "hotjar.com", "nr-data.net", "newrelic.com",
+    "facebook.net", "connect.facebook.net", "clarity.ms", "bing.com", "webtrekk.net",
+    "permutive.com", "permutive.app", "cxense.com", "krxd.net", "tiktok.com",
+    # video player
+    "youtube.com", "ytimg.com", "jwplayer.com", "jwpcdn.com", "jwpsrv.com",
+    "brightcove.net", "dailymotion.com", "dmcdn.net", "vimeo.com",
+})
+# Tipi di risorsa bloccati per tutte le fonti (i font restano ammessi: cambiano il rendering)
+TIPI_BLOCCATI_DEFAULT = frozenset({"media", "websocket", "eventsource", "manifest", "texttrack"})
+# Dimensione media stimata (byte) delle risorse bloccate, per tipo, se non osservata nella run
+BYTE_STIMATI_PER_TIPO = {"script": 60000, "image": 25000, "media": 500000, "document": 40000,
+                         "font": 40000, "xhr": 5000, "fetch": 5000, "stylesheet": 20000}
+
+def _host_in(host, insieme):
+    """Match su insieme di domini: controlla l'host e tutti i suoi domini padre (O(etichette))."""
+    parti = host.split(".")
+    return any(".".join(parti[i:]) in insieme for i in range(len(parti) - 1))
+
+class FiltroRichieste:
+    """Route handler condiviso con regole per fonte.
+
+    Ordine di valutazione: host consentiti → host bloccati (default + fonte) →
+    tipi di risorsa bloccati → iframe di terze parti. Tiene le statistiche di
+    richieste bloccate/consentite e una stima dei byte risparmiati."""
+
+    def __init__(self, fonte, consenti_host=(), blocca_host=(), blocca_tipi=(),
+                 consenti_tipi=(), blocca_iframe_terzi=True):
+        self.fonte = fonte
+        self.host_consentiti = frozenset(consenti_host)
+        self.host_bloccati = HOST_BLOCCATI_DEFAULT | frozenset(blocca_host)
+        self.tipi_bloccati = (TIPI_BLOCCATI_DEFAULT | frozenset(blocca_tipi)) - frozenset(consenti_tipi)
+        self.blocca_iframe_terzi = blocca_iframe_terzi
+        self.sito = None
+        self.stat = {"consentite": 0, "bloccate": 0, "byte_ricevuti": 0}
+        self.bloccate_per_tipo = {}
+        self._byte_per_tipo = {}
+        self.instradato = True
+
+    def decidi(self, url, tipo, sottoframe=False):
+        """True se la richiesta va bloccata."""
+        host = (urlsplit(url).hostname or "").lower()
+        if not host:
+            return False
+        if _host_in(host, self.host_consentiti):
+            return False
+        if _host_in(host, self.host_bloccati):
+            return True
+        if tipo in self.tipi_bloccati:
+            return True
+        if self.blocca_iframe_terzi and sottoframe and tipo == "document" and self.sito:
+            return not _host_in(host, {self.sito})
+        return False
+
+    async def gestisci(self, route):
+        request = route.request
+        tipo = request.resource_type
+        sottoframe = False
+        if tipo == "document":
             try:
-                await page.locator(sel).first.click(timeout=3000, force=True)
-                await page.wait_for_timeout(700)
-                break
-            except:
+                sottoframe = request.frame.parent_frame is not None
+            except Exception:
                 pass
+            if not sottoframe and self.sito is None:
+                # Il primo documento principale definisce il sito (eTLD+1 approssimato)
+                self.sito = ".".join((urlsplit(request.url).hostname or "").split(".")[-2:])
+
+        if self.decidi(request.url, tipo, sottoframe):
+            self.stat["bloccate"] += 1
+            self.bloccate_per_tipo[tipo] = self.bloccate_per_tipo.get(tipo, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            self.stat["consentite"] += 1
+            # fallback (non continue_): lascia agire eventuali altri handler, es. il replay HAR
+            await route.fallback()
 
-        # Mostra tutte le partite (FIX CRITICO per 0 partite)
+    def registra_risposta(self, response):
+        """Listener 'response': somma i byte dichiarati (content-length) per tipo di risorsa."""
         try:
-            selector_all = ".scheduled-matches__list .match-cell[match='ALL']"
-            
-            btn = await page.wait_for_selector(selector_all, timeout=15000)
+            n = int(response.headers.get("content-length", 0))
+        except ValueError:
+            return
+        tipo = response.request.resource_type
+        self.stat["byte_ricevuti"] += n
+        tot, cnt = self._byte_per_tipo.get(tipo, (0, 0))
+        self._byte_per_tipo[tipo] = (tot + n, cnt + 1)
+
+    def byte_risparmiati_stimati(self):
+        stima = 0
+        for tipo, n in self.bloccate_per_tipo.items():
+            tot, cnt = self._byte_per_tipo.get(tipo, (0, 0))
+            media = tot / cnt if cnt else BYTE_STIMATI_PER_TIPO.get(tipo, 10000)
+            stima += n * media
+        return int(stima)
+
+    def regole_host(self):
+        """Blocco per host come regole --host-resolver-rules di Chromium. Serve con il profilo
+        persistente: in Chromium l'intercettazione (context.route) disattiva la cache HTTP."""
+        regole = [f"EXCLUDE {h}, EXCLUDE *.{h}" for h in sorted(self.host_consentiti)]
+        regole += [f"MAP {h} ~NOTFOUND, MAP *.{h} ~NOTFOUND" for h in sorted(self.host_bloccati)]
+        return ", ".join(regole)
+
+    async def installa(self, context, instrada=True):
+        """instrada=False: le regole per host sono già nel browser (regole_host), qui solo statistiche."""
+        if not BLOCCO_RICHIESTE:
+            return
+        self.instradato = instrada
+        if instrada:
+            await context.route("**/*", self.gestisci)
+        context.on("response", self.registra_risposta)
+        statistiche_rete[self.fonte] = self
+
+    def riepilogo(self):
+        if not self.instradato:
+            return f"blocco per host nel resolver di Chromium, {self.stat['byte_ricevuti'] // 1024} KB ricevuti"
+        return (f"{self.stat['bloccate']} bloccate / {self.stat['consentite']} consentite, "
+                f"{self.stat['byte_ricevuti'] // 1024} KB ricevuti, "
+                f"~{self.byte_risparmiati_stimati() // 1024} KB risparmiati (stima)")
+
+statistiche_rete = {}
 
-            if btn:
-                await page.evaluate("el => el.scrollIntoView({block:'center'})", btn)
-                await btn.click(force=True)
-                print("✅ SosFanta: Cliccato su 'Mostra tutte le partite'.")
 
-                await page.wait_for_selector("div[id*='-0']", timeout=15000) 
-                await asyncio.sleep(1.5)
+# ==========================================================
+#  IMMAGINI IN MEMORIA
+# ==========================================================
+statistiche_io = {"byte_scritti": 0, "file_scritti": 0}
+
+def decodifica_immagine(dati):
+    """Decodifica i byte di uno screenshot direttamente dal buffer (nessun file su disco)."""
+    from PIL import Image
+    with Image.open(io.BytesIO(dati)) as img:
+        img.load()
+        return img.convert("RGB") if img.mode != "RGB" else img.copy()
+
+def firma_codifica(fonte):
+    """Impostazioni di codifica della fonte, salvate nel manifest: se cambiano si ricarica
+    anche un'immagine con gli stessi pixel."""
+    parti = [FORMATO_IMMAGINE]
+    if FORMATO_IMMAGINE == "webp-q":
+        parti.append(f"q{WEBP_QUALITA}")
+    larghezza, budget = _di_fonte(LARGHEZZA_MAX, fonte), _di_fonte(BUDGET_KB, fonte)
+    if larghezza:
+        parti.append(f"w{larghezza}")
+    if budget:
+        parti.append(f"b{budget}")
+    return "/".join(parti)
+
+rapporto_codifica = []
+
+def codifica_immagine(img, fonte, name):
+    """Codifica il file finale secondo FORMATO_IMMAGINE, LARGHEZZA_MAX e BUDGET_KB della fonte
+    e lo registra nel rapporto di compressione (byte prima/dopo, tempo)."""
+    from immagini import codifica
+    budget = _di_fonte(BUDGET_KB, fonte)
+    t0 = time.perf_counter()
+    dati, dettagli = codifica(img, FORMATO_IMMAGINE, larghezza_max=_di_fonte(LARGHEZZA_MAX, fonte),
+                              budget=budget * 1024, qualita=WEBP_QUALITA)
+    voce = {"fonte": fonte, "file": name, "byte": len(dati),
+            "ms": round((time.perf_counter() - t0) * 1000, 1), **dettagli}
+    if RAPPORTO_CODIFICA:
+        voce["byte_png"] = len(codifica(img, "png")[0])
+    rapporto_codifica.append(voce)
+    if not dettagli["entro_budget"]:
+        print(f"⚠️ {name}: {len(dati) // 1024} KB oltre il budget di {budget} KB anche a {dettagli['larghezza']} px")
+    return dati
+
+def stampa_rapporto_codifica():
+    """Totale per fonte e, con RAPPORTO_CODIFICA=1, una riga per partita."""
+    if RAPPORTO_CODIFICA:
+        for v in rapporto_codifica:
+            print(f"   🗜️ {v['file']}: {v['byte_png'] // 1024} → {v['byte'] // 1024} KB "
+                  f"({v['larghezza']}x{v['altezza']}, {v['ms']:.0f} ms)")
+    for fonte in dict.fromkeys(v["fonte"] for v in rapporto_codifica):
+        voci = [v for v in rapporto_codifica if v["fonte"] == fonte]
+        byte = sum(v["byte"] for v in voci)
+        confronto = ""
+        if RAPPORTO_CODIFICA:
+            prima = sum(v["byte_png"] for v in voci)
+            confronto = f" (PNG di default {prima // 1024} KB, {100 * (byte - prima) / max(1, prima):+.0f}%)"
+        print(f"🗜️ Codifica {fonte} [{firma_codifica(fonte)}]: {len(voci)} file, {byte // 1024} KB{confronto}, "
+              f"{statistics.fmean(v['ms'] for v in voci):.0f} ms/file")
+
+def scrivi_file(path, dati):
+    """Scrive byte già codificati su disco e ritorna quanti ne ha scritti."""
+    with open(path, "wb") as f:
+        f.write(dati)
+    statistiche_io["byte_scritti"] += len(dati)
+    statistiche_io["file_scritti"] += 1
+    return len(dati)
+
+def salva_intermedio(path, dati):
+    """Salva uno screenshot intermedio solo in modalità debug (KEEP_INTERMEDI=1)."""
+    return scrivi_file(path, dati) if KEEP_INTERMEDI else 0
+
+def picco_rss_mb():
+    # ru_maxrss è in KB su Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-        except Exception as e:
-            print(f"⚠️ SosFanta errore nel cliccare 'Mostra tutte le partite': {e}")
-            pass
 
-        # Scroll per caricare
-        for box in await page.query_selector_all("div[id]"):
-            _id = await box.get_attribute("id")
-            if not _id or not re.match(r"^[A-Z]{3}-[A-Z]{3}(-\d+)?$", _id):
-                continue
-            await page.evaluate("el => el.scrollIntoView({block:'center'})", box)
-            await asyncio.sleep(1.2)
-
-        # Legge ID partite
-        ids = []
-        for el in await page.query_selector_all("div[id]"):
-            _id = (await el.get_attribute("id")) or ""
-            if re.match(r"^[A-Z]{3}-[A-Z]{3}(-\d+)?$", _id):
-                ids.append(_id)
-
-        ids = ids[:MAX_MATCH]
-        print(f"🔎 SosFanta: trovate {len(ids)} partite") # Log modificato
-
-        # LOOP PARTITE
-        for idx, dom_id in enumerate(ids, start=1):
-            a, b, _ = dom_id.split("-")
-            if a == "HEL": a = "VER"
-            if b == "HEL": b = "VER"
-            match_txt = f"{a} - {b}"
-
-            filename = f"sosfanta_{idx}.png"
-            raw_path = f"raw_{filename}"    
-            final_path = f"{filename}"      
+# ==========================================================
+#  MANIFEST IMPRONTE (salta upload se l'immagine non cambia)
+# ==========================================================
+def carica_manifest(path=None):
+    """Legge il manifest {nome_file: impronte} salvato dall'esecuzione precedente."""
+    path = path or MANIFEST_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️ Manifest illeggibile ({path}), riparto da zero: {e}")
+        return {}
+
+def salva_manifest(manifest, path=None):
+    path = path or MANIFEST_PATH
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def unisci_manifest(manifest, altro):
+    """Porta in manifest le voci di altro confermate più di recente (caricate o verificate dopo).
+    Le parti di una run divisa partono dallo stesso manifest e toccano file diversi."""
+    recente = lambda voce: max(voce.get("aggiornato", 0), voce.get("verificato", 0))
+    for name, voce in altro.items():
+        if name not in manifest or recente(voce) > recente(manifest[name]):
+            manifest[name] = voce
+    return manifest
+
+def impronte_immagine(img):
+    """Hash esatto dei pixel + impronta percettiva a blocchi.
+
+    L'impronta percettiva è la media di luminanza di ogni blocco PHASH_BLOCCO x PHASH_BLOCCO,
+    quantizzata a 16 livelli: l'antialiasing del rendering resta entro la tolleranza, ma anche
+    una cifra o un nome cambiati possono restarci (vedi simile_percettiva)."""
+    from PIL import Image
+    rgb = img if img.mode == "RGB" else img.convert("RGB")
+    sha = hashlib.sha256(rgb.tobytes()).hexdigest()
+    cols = max(1, rgb.width // PHASH_BLOCCO)
+    rows = max(1, rgb.height // PHASH_BLOCCO)
+    blocchi = rgb.convert("L").resize((cols, rows), Image.BOX).point(lambda v: v >> 4)
+    phash = base64.b64encode(zlib.compress(blocchi.tobytes(), 9)).decode("ascii")
+    return {"sha256": sha, "size": [rgb.width, rgb.height],
+            "phash": phash, "phash_blocco": PHASH_BLOCCO}
+
+def immagine_invariata(nuove, vecchie):
+    """True se le due impronte descrivono gli stessi pixel (hash esatto)."""
+    return bool(vecchie) and nuove["sha256"] == vecchie.get("sha256")
+
+def simile_percettiva(nuove, vecchie, tolleranza=None):
+    """True se le impronte percettive coincidono entro la tolleranza: rumore di rendering, ma
+    anche piccole modifiche al testo. Diagnostica, o criterio di salto con PHASH_TOLLERANTE=1."""
+    if not vecchie or "phash" not in nuove or "phash" not in vecchie:
+        return False
+    if nuove["size"] != vecchie.get("size") or nuove["phash_blocco"] != vecchie.get("phash_blocco"):
+        return False
+    tolleranza = PHASH_TOLLERANZA if tolleranza is None else tolleranza
+    a = zlib.decompress(base64.b64decode(nuove["phash"]))
+    b = zlib.decompress(base64.b64decode(vecchie["phash"]))
+    return len(a) == len(b) and all(abs(x - y) <= tolleranza for x, y in zip(a, b))
+
+manifest_upload = carica_manifest()
+conteggio_upload = {"caricati": 0, "saltati": 0, "falliti": 0, "dom_invariati": 0}
+
+def stessa_codifica(voce, codifica):
+    """Le voci senza "codifica" vengono dalle versioni che salvavano solo PNG di default."""
+    return codifica is None or voce.get("codifica", "png") == codifica
+
+def _con_impronta_dom(voce, dom):
+    """Registra l'impronta DOM della cattura appena confermata (caricata o invariata)."""
+    voce = {k: v for k, v in voce.items() if k not in ("dom", "verificato")}
+    if dom:
+        voce.update(dom=dom, verificato=int(time.time()))
+    return voce
+
+def carica_se_cambiato(dati, name, img=None, mimetype=MIMETYPE_IMMAGINE, dom=None, codifica=None):
+    """Carica su Drive solo se l'immagine è cambiata rispetto al manifest.
+    img è l'immagine già in memoria (evita di decodificare di nuovo i byte);
+    per i file non immagine si confronta solo l'hash esatto dei byte.
+    dom è l'impronta del box partita da cui viene l'immagine: si salva solo a esito
+    riuscito, così un upload fallito non fa saltare la partita alla run successiva.
+    codifica è la firma_codifica del file: se cambia si ricarica anche a pixel invariati.
+    Ritorna (link, caricato)."""
+    try:
+        with span("drive.impronta", file=name):
+            if mimetype.startswith("image/"):
+                nuove = impronte_immagine(img if img is not None else decodifica_immagine(dati))
+                if codifica:
+                    nuove["codifica"] = codifica
+            else:
+                nuove = {"sha256": hashlib.sha256(dati).hexdigest()}
+    except Exception as e:
+        print(f"⚠️ Impronta non calcolabile per {name}: {e}")
+        nuove = None
+
+    vecchie = manifest_upload.get(name)
+    invariata = False
+    if nuove and vecchie and vecchie.get("link") and stessa_codifica(vecchie, codifica):
+        invariata = immagine_invariata(nuove, vecchie)
+        if not invariata and simile_percettiva(nuove, vecchie):
+            if PHASH_TOLLERANTE:
+                invariata = True
+            else:
+                print(f"🔍 {name}: pixel cambiati ma impronta percettiva simile, carico comunque")
+    if invariata:
+        with _drive_lock:
+            conteggio_upload["saltati"] += 1
+            manifest_upload[name] = _con_impronta_dom(vecchie, dom)
+        return vecchie["link"], False
+
+    link = drive_upload_or_replace(dati, name, mimetype)
+    with _drive_lock:
+        if link == "UPLOAD_FAILED":
+            conteggio_upload["falliti"] += 1
+            return link, False
+        conteggio_upload["caricati"] += 1
+        if nuove:
+            manifest_upload[name] = _con_impronta_dom({**nuove, "link": link, "aggiornato": int(time.time())}, dom)
+    return link, True
 
+
+# ==========================================================
+#  PIPELINE DI UPLOAD (cattura e upload si sovrappongono)
+# ==========================================================
+class CodaUpload:
+    """Stadio di upload asincrono: le fonti accodano i file e proseguono con la cattura,
+    un gruppo limitato di worker li carica su Drive in thread dedicati."""
+
+    def __init__(self, workers=None, pool=None):
+        """pool: thread di upload esterni e già avviati (demone), che restano aperti a fine run
+        insieme alle connessioni Drive di ciascun thread."""
+        self.workers = max(1, workers or UPLOAD_WORKERS)
+        self.coda = asyncio.Queue()
+        self._pool_esterno = pool is not None
+        self.pool = pool or ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        self.risultati = []
+        self.accodati = set()
+        self._task = []
+
+    def avvia(self):
+        self._task = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def accoda(self, dati, name, etichetta, img=None, mimetype=MIMETYPE_IMMAGINE, dom=None, codifica=None):
+        """dati: file finale già codificato; etichetta: testo del log a upload terminato;
+        dom: impronta DOM della partita, da registrare nel manifest a upload riuscito;
+        codifica: firma_codifica del file (vedi carica_se_cambiato)."""
+        self.accodati.add(name)
+        # Il contesto del chiamante porta lo span padre (la partita) fin dentro il thread di upload
+        await self.coda.put((dati, name, etichetta, img, mimetype, dom, codifica, contextvars.copy_context()))
+
+    def invariato(self, name, link, etichetta):
+        """Partita con DOM invariato: nessuna cattura né upload, resta il link precedente.
+        Nel checkpoint conta come arrivata alla fase finale della run, qualunque sia."""
+        self.risultati.append({"name": name, "link": link, "caricato": False})
+        checkpoint.segna(name, "caricata", link=link, **{checkpoint.dati.get("fase_finale", "caricata"): True})
+        with _drive_lock:
+            conteggio_upload["dom_invariati"] += 1
+        print(f"⏭️ {etichetta} (DOM invariato, cattura saltata) → {link}")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            dati, name, etichetta, img, mimetype, dom, codifica, ctx = await self.coda.get()
+            if not CARICA:
+                # --no-upload: il file resta solo su disco, manifest e Drive non si toccano
+                self.risultati.append({"name": name, "link": None, "caricato": False})
+                print(f"💾 {etichetta} (upload disattivato)")
+                self.coda.task_done()
+                continue
             try:
-                # Esecuzione logica JS (rimozione header, reset layout note) - (Mantenuto)
-                await page.evaluate(f"""
-                    dom_id => {{
-                        const box = document.getElementById(dom_id);
-                        if (!box) return;
-                        box.classList.remove('is-hidden');
-                        box.style.display='block';
-                        box.style.opacity=1;
-                        const heads = box.querySelectorAll('.bck-gn-match-formation-teams');
-                        heads.forEach(h => h.remove());
-
-                        const notes = box.querySelector('.bck-gn-match-formation-teams-notes');
-                        if (notes) {{
-                            const labels = [...notes.querySelectorAll('.note-label')];
-                            const indis = labels.find(el => el.textContent.trim().toLowerCase() === "indisponibili");
-                            if (indis) {{
-                                const container = indis.parentElement;
-                                const columns = container.querySelector(".columns");
-                                if (columns) {{
-                                    container.style.cssText = "display: flex; flex-direction: column; align-items: center; width: 100%; text-align: center;";
-                                    columns.className = "";
-                                    columns.style.cssText = "display: flex; flex-direction: column; align-items: center; justify-content: center; width: 100%; max-width: 600px; margin: 0 auto; gap: 10px;";
-                                    columns.querySelectorAll('.note-team').forEach(t => {{
-                                        t.style.cssText = "text-align: center; margin: 0 auto; float: none; width: 100%; display: block;";
-                                        t.classList.remove("has-text-right", "is-pulled-right", "has-text-left");
-                                    }});
-                                    columns.querySelectorAll('[class*="column"]').forEach(col => {{
-                                        col.className = "";
-                                        col.style.cssText = "margin: 0 auto; padding: 0; text-align: center; display: block; width: 100%;";
-                                    }});
-                                }}
-                            }}
-                        }}
-                    }}
-                """, dom_id)
-
-                # Scroll su box
-                await page.evaluate(
-                    "dom_id => document.getElementById(dom_id).scrollIntoView({block:'center'})",
-                    dom_id
+                link, caricato = await loop.run_in_executor(
+                    self.pool, ctx.run, carica_se_cambiato, dati, name, img, mimetype, dom, codifica
                 )
-                await page.wait_for_timeout(800)
-
-                # ---- SCREENSHOT RAW e CROP LATERALE 120px ----
-                container = await page.query_selector(f"div#{dom_id}")
-                await container.screenshot(path=raw_path)
+            except Exception as e:
+                print(f"🛑 ERRORE upload {name}: {e}")
+                link, caricato = "UPLOAD_FAILED", False
+
+            self.risultati.append({"name": name, "link": link, "caricato": caricato})
+            if link == "UPLOAD_FAILED":
+                print(f"⚠️ {etichetta} (upload fallito)")
+            else:
+                checkpoint.segna(name, "caricata", link=link)
+                stato = "Salvato su Drive" if caricato else "Invariato, upload saltato"
+                print(f"✅ {etichetta} ({stato}) → {link}")
+            self.coda.task_done()
+
+    async def chiudi(self):
+        """Attende la fine di tutti gli upload accodati e riporta quelli falliti."""
+        await self.coda.join()
+        for t in self._task:
+            t.cancel()
+        await asyncio.gather(*self._task, return_exceptions=True)
+        if not self._pool_esterno:
+            self.pool.shutdown(wait=True)
+
+        falliti = [r["name"] for r in self.risultati if r["link"] == "UPLOAD_FAILED"]
+        if falliti:
+            print(f"🛑 Upload falliti ({len(falliti)}): {', '.join(falliti)}")
+        return self.risultati
 
-                from PIL import Image
-                img = Image.open(raw_path)
-                w, h = img.size
-                cropped = img.crop((120, 0, w - 120, h))
-                cropped.save(final_path)
 
-                # --- Upload su Drive ---
-                link = drive_upload_or_replace(final_path, filename)
-                print(f"✅ SosFanta | {match_txt} → {filename} (Salvato su Drive) → {link}") # Log unificato
+# ==========================================================
+#  CHECKPOINT DELLA RUN (tentativi e ripresa con --resume)
+# ==========================================================
+class Checkpoint:
+    """Stato della run su disco, riscritto a ogni passo: per fonte esito, tentativi, partite
+    fallite ed esito del pre-flight; per file finale le fasi completate (catturata, composta,
+    caricata). Con `--resume` si rieseguono solo le fonti incomplete e, al loro interno, solo
+    le partite non caricate: quelle già composte si ricaricano dal file su disco.
+    Con --no-upload una partita è completa già da composta (fase_finale).
+    I file creati su Drive ancora senza permesso pubblico ("permessi") passano da una run alla
+    successiva finché il permesso non va a buon fine."""
+
+    def __init__(self, path=None):
+        self.path = path or CHECKPOINT_PATH
+        self._lock = threading.Lock()
+        self.dati = {"avviato": int(time.time()), "fonti": {}, "partite": {}}
+
+    def nuova_run(self):
+        """Checkpoint vuoto, salvato subito: un --resume successivo non riprende una run vecchia."""
+        permessi = self.permessi_salvati()
+        with self._lock:
+            self.dati = {"avviato": int(time.time()), "fase_finale": "caricata" if CARICA else "composta",
+                         "fonti": {}, "partite": {}, "permessi": permessi}
+            self._salva()
+
+    def permessi_salvati(self):
+        """File id ancora senza permesso pubblico, in memoria o nel checkpoint su disco."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                su_disco = json.load(f).get("permessi", [])
+        except (OSError, ValueError):
+            su_disco = []
+        return list(dict.fromkeys(self.dati.get("permessi", []) + su_disco))
+
+    def riprendi(self):
+        """Rilegge il checkpoint della run precedente; False se manca o è illeggibile."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                dati = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Checkpoint illeggibile ({self.path}): {e}")
+            return False
+        with self._lock:
+            self.dati = dati
+        return True
+
+    def _salva(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.dati, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def fonte(self, nome):
+        return self.dati["fonti"].get(nome.lower(), {})
+
+    def voce(self, name):
+        return self.dati["partite"].get(name, {})
+
+    def segna(self, name, fase, **dati):
+        """Fase completata per un file finale ("catturata", "composta", "caricata")."""
+        with self._lock:
+            self.dati["partite"].setdefault(name, {}).update(dati, **{fase: True})
+            self._salva()
+
+    def segna_fonte(self, nome, **dati):
+        with self._lock:
+            self.dati["fonti"].setdefault(nome.lower(), {}).update(dati)
+            self._salva()
+
+    def permesso_in_attesa(self, file_id):
+        with self._lock:
+            self.dati.setdefault("permessi", []).append(file_id)
+            self._salva()
+
+    def permessi_concessi(self, file_ids):
+        with self._lock:
+            concessi = set(file_ids)
+            self.dati["permessi"] = [i for i in self.dati.get("permessi", []) if i not in concessi]
+            self._salva()
+
+    def esito_partita(self, fonte, idx, errore=None):
+        """Registra (o cancella, se riuscita) l'errore finale di una partita."""
+        with self._lock:
+            errori = self.dati["fonti"].setdefault(fonte.lower(), {}).setdefault("errori", {})
+            if errore:
+                errori[str(idx)] = errore
+            elif errori.pop(str(idx), None) is None:
+                return
+            self._salva()
+
+    def completa(self, nome):
+        """Fonte terminata senza errori, con tutti i file finali caricati (o composti, con --no-upload)."""
+        fonte = self.fonte(nome)
+        if fonte.get("esito") != "ok" or fonte.get("errori"):
+            return False
+        prefisso = f"{nome.lower()}_"
+        fase = self.dati.get("fase_finale", "caricata")
+        return all(v.get(fase) for n, v in self.dati["partite"].items() if n.startswith(prefisso))
+
+    def incomplete(self):
+        return [nome for nome in self.dati["fonti"] if not self.completa(nome)]
+
+    def unisci(self, dati):
+        """Aggiunge il checkpoint di un'altra parte della stessa run (`run.py --unisci`): una fonte
+        è ok solo se lo è in tutte le parti, errori e partite si sommano."""
+        with self._lock:
+            self.dati["avviato"] = min(self.dati["avviato"], dati.get("avviato", self.dati["avviato"]))
+            self.dati["fase_finale"] = dati.get("fase_finale", self.dati.get("fase_finale", "caricata"))
+            for nome, altra in dati.get("fonti", {}).items():
+                fonte = self.dati["fonti"].setdefault(nome, {})
+                esito = fonte.get("esito", "ok")
+                fonte.update({k: v for k, v in altra.items() if k not in ("errori", "tentativi")})
+                if esito != "ok":
+                    fonte["esito"] = esito
+                fonte["tentativi"] = max(fonte.get("tentativi", 0), altra.get("tentativi", 0))
+                fonte["errori"] = {**fonte.get("errori", {}), **altra.get("errori", {})}
+            self.dati["partite"].update(dati.get("partite", {}))
+            self.dati["permessi"] = list(dict.fromkeys(self.dati.get("permessi", []) + dati.get("permessi", [])))
+            self._salva()
+
+checkpoint = Checkpoint(percorso_shard(CHECKPOINT_PATH))
+
+async def partita_da_saltare(uploader, name, dom, codifica, etichetta):
+    """True se la partita non va (ri)catturata: già caricata o accodata da un tentativo
+    precedente, DOM invariato (resta il link precedente) oppure già composta su disco con
+    lo stesso DOM e la stessa codifica (si ricarica il file, senza browser)."""
+    voce = checkpoint.voce(name)
+    if name in uploader.accodati or voce.get("caricata"):
+        if voce.get("caricata"):
+            print(f"⏭️ {etichetta} (già completata) → {voce['link']}")
+        return True
+    link = link_se_invariata(name, dom, codifica)
+    if link:
+        uploader.invariato(name, link, etichetta)
+        return True
+    if voce.get("composta") and voce.get("dom") == dom and voce.get("codifica") == codifica and os.path.exists(name):
+        with open(name, "rb") as f:
+            dati = f.read()
+        await uploader.accoda(dati, name, f"{etichetta} [ripresa dal checkpoint]", dom=dom, codifica=codifica)
+        return True
+    return False
 
-            except Exception as e:
-                print(f"⚠️ SosFanta errore su {match_txt}: {e}")
 
-        await context.close()
-        await browser.close()
-    
 # ==========================================================
-#  FONTE 2: Fantacalcio (BLOCCO FORMAZIONI + GRAFICI)
+#  DATI STRUTTURATI (formazioni in JSON)
 # ==========================================================
-from PIL import Image
-import asyncio
+# Codici squadra normalizzati: codici dei siti e nomi estesi → sigla a 3 lettere
+CODICI_SQUADRA = {
+    "HEL": "VER", "HELLAS VERONA": "VER", "VERONA": "VER", "ATALANTA": "ATA", "BOLOGNA": "BOL",
+    "CAGLIARI": "CAG", "COMO": "COM", "CREMONESE": "CRE", "EMPOLI": "EMP", "FIORENTINA": "FIO",
+    "GENOA": "GEN", "INTER": "INT", "JUVENTUS": "JUV", "LAZIO": "LAZ", "LECCE": "LEC",
+    "MILAN": "MIL", "MONZA": "MON", "NAPOLI": "NAP", "PARMA": "PAR", "PISA": "PIS",
+    "ROMA": "ROM", "SASSUOLO": "SAS", "TORINO": "TOR", "UDINESE": "UDI", "VENEZIA": "VEN",
+}
+
+SIGLE_SQUADRA = frozenset(CODICI_SQUADRA.values())
+# Nomi già segnalati come sconosciuti (un avviso per nome, non per partita)
+squadre_sconosciute = set()
+
+def codice_squadra(nome):
+    """Sigla a 3 lettere per un codice o nome squadra del sito (es. HEL → VER); None per una
+    squadra non in CODICI_SQUADRA, segnalata nel log: una sigla inventata non corrisponde a nulla."""
+    if not nome:
+        return None
+    chiave = re.sub(r"\s+", " ", nome).strip().upper()
+    if chiave in SIGLE_SQUADRA:
+        return chiave
+    if chiave in CODICI_SQUADRA:
+        return CODICI_SQUADRA[chiave]
+    if chiave not in squadre_sconosciute:
+        squadre_sconosciute.add(chiave)
+        print(f"⚠️ Squadra sconosciuta: {nome!r}, aggiungila a CODICI_SQUADRA")
+    return None
+
+# Estrazione di tutte le partite della pagina in un solo page.evaluate.
+# La configurazione per fonte indica i selettori (liste di alternative, si usa la prima che trova elementi).
+JS_ESTRAI_FORMAZIONI = """
+(cfg) => {
+    const testo = el => (el ? el.textContent : '').replace(/\\s+/g, ' ').trim();
+    const primo = (root, sels) => {
+        for (const s of sels || []) { const e = root.querySelector(s); if (e) return e; }
+        return null;
+    };
+    const tutti = (root, sels) => {
+        for (const s of sels || []) { const l = root.querySelectorAll(s); if (l.length) return [...l]; }
+        return [];
+    };
+    const RE_MODULO = /\\b\\d(?:-\\d){2,3}\\b/;
+    const RE_PERC = /(\\d{1,3})\\s*%/;
+    const giocatore = el => {
+        const t = testo(el);
+        const nomeEl = primo(el, cfg.nome_giocatore);
+        const m = t.match(RE_PERC);
+        const nome = (nomeEl ? testo(nomeEl) : t.replace(RE_PERC, '')).replace(/^\\d+\\s+/, '').trim();
+        return m ? {nome, percentuale: +m[1]} : {nome};
+    };
+    const categoria = etichetta => {
+        const e = etichetta.toLowerCase();
+        for (const [cat, parole] of Object.entries(cfg.categorie_note))
+            if (parole.some(p => e.includes(p))) return cat;
+        return null;
+    };
+    const vuota = () => ({nome: null, modulo: null, titolari: [], panchina: [], indisponibili: []});
+    const idValido = cfg.id_valido ? new RegExp(cfg.id_valido) : null;
+
+    return [...document.querySelectorAll(cfg.partita)]
+        .filter(el => !idValido || idValido.test(el.id))
+        .slice(0, cfg.max)
+        .map(el => {
+            const squadre = tutti(el, cfg.squadra).slice(0, 2).map(sq => {
+                const modulo = testo(primo(sq, cfg.modulo)).match(RE_MODULO) || testo(sq).match(RE_MODULO);
+                return {
+                    nome: testo(primo(sq, cfg.nome_squadra)) || null,
+                    modulo: modulo ? modulo[0] : null,
+                    titolari: tutti(sq, cfg.titolari).map(giocatore).filter(g => g.nome),
+                    panchina: tutti(sq, cfg.panchina).map(giocatore).filter(g => g.nome),
+                    indisponibili: [],
+                };
+            });
+            tutti(el, cfg.nomi_squadre).slice(0, 2).forEach((n, i) => {
+                squadre[i] = squadre[i] || vuota();
+                squadre[i].nome = squadre[i].nome || testo(n) || null;
+            });
+            // Note: una riga per voce (Panchina, Indisponibili, ...) con un valore per squadra
+            for (const riga of tutti(el, cfg.note_riga)) {
+                const cat = categoria(testo(primo(riga, cfg.note_etichetta)));
+                if (!cat) continue;
+                tutti(riga, cfg.note_squadra).slice(0, 2).forEach((v, i) => {
+                    squadre[i] = squadre[i] || vuota();
+                    if (cat === 'panchina' && squadre[i].panchina.length) return;
+                    testo(v).split(/[,;]/).map(x => x.trim()).filter(Boolean)
+                        .forEach(nome => squadre[i][cat].push({nome}));
+                });
+            }
+            return {id: el.id || null, squadre};
+        });
+}
+"""
+
+CATEGORIE_NOTE = {
+    "panchina": ["panchina"],
+    "indisponibili": ["indisponibil", "squalificat", "infortunat", "assenti"],
+}
+
+record_formazioni = []
+
+def normalizza_record(fonte, indice, grezzo, codici=None):
+    """Record uniforme per partita; codici = sigle già note dal DOM (es. id SosFanta AAA-BBB)."""
+    squadre = grezzo.get("squadre") or []
+    codici = codici or [None, None]
+    out = {"fonte": fonte, "partita": indice, "id": grezzo.get("id"), "squadre": []}
+    for i in range(2):
+        sq = squadre[i] if i < len(squadre) else {}
+        out["squadre"].append({
+            "codice": codice_squadra(codici[i] or sq.get("nome")),
+            "nome": sq.get("nome"),
+            "modulo": sq.get("modulo"),
+            "titolari": sq.get("titolari", []),
+            "panchina": sq.get("panchina", []),
+            "indisponibili": sq.get("indisponibili", []),
+        })
+    out["casa"], out["trasferta"] = (s["codice"] for s in out["squadre"])
+    return out
+
+async def estrai_dati_partite(page, fonte, selettori):
+    """Legge tutte le partite della pagina con un unico page.evaluate e le aggiunge ai record della run,
+    al posto di quelli della stessa fonte estratti da un tentativo precedente."""
+    t0 = time.perf_counter()
+    try:
+        with span(f"{fonte.lower()}.json"):
+            grezzi = await page.evaluate(
+                JS_ESTRAI_FORMAZIONI, {**selettori, "categorie_note": CATEGORIE_NOTE, "max": MAX_MATCH}
+            )
+    except Exception as e:
+        print(f"⚠️ {fonte}: estrazione dati fallita: {e}")
+        return []
+
+    record = []
+    for i, g in enumerate(grezzi, start=1):
+        if not partita_selezionata(i):
+            continue
+        codici = g["id"].split("-")[:2] if selettori.get("id_valido") and g.get("id") else None
+        record.append(normalizza_record(fonte, i, g, codici))
+    record_formazioni[:] = [r for r in record_formazioni if r["fonte"] != fonte] + record
+    print(f"🧾 {fonte}: {len(record)} partite estratte in JSON ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+    return record
+
+def _record_precedenti(tenere):
+    """Record del file JSON della run precedente per cui tenere(record) è vero (non ricatturati)."""
+    try:
+        with open(JSON_PATH, encoding="utf-8") as f:
+            return [r for r in json.load(f).get("partite", []) if tenere(r)]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"⚠️ {JSON_PATH} precedente illeggibile: {e}")
+        return []
+
+def _json_formazioni(record):
+    """Niente timestamp nel file: carica_se_cambiato confronta i byte, e l'ora dell'ultimo
+    aggiornamento la registra già Drive (modifiedTime)."""
+    return json.dumps(
+        {"partite": sorted(record, key=lambda r: (r["fonte"], r["partita"]))},
+        ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+async def salva_formazioni(uploader, fonti_saltate=()):
+    """Un solo file JSON compatto per run con i record di tutte le fonti, caricato su Drive.
+    Le fonti saltate dal pre-flight e le partite non selezionate (--partite, --shard)
+    mantengono i record della run precedente. Una parte di una run divisa scrive il proprio
+    file (percorso_shard) senza caricarlo: lo carica `--unisci` dopo averli riuniti."""
+    if not SALVA_JSON:
+        return
+    saltate = set(fonti_saltate)
+    record_formazioni.extend(_record_precedenti(
+        lambda r: r.get("fonte") in saltate or not partita_selezionata(r.get("partita", 0))
+    ))
+    dati = _json_formazioni(record_formazioni)
+    path = percorso_shard(JSON_PATH)
+    scrivi_file(path, dati)
+    if path != JSON_PATH:
+        print(f"🧾 Formazioni JSON di questa parte → {path} [{len(dati) // 1024} KB]")
+        return
+    await uploader.accoda(
+        dati, os.path.basename(JSON_PATH), f"Formazioni JSON → {JSON_PATH} [{len(dati) // 1024} KB]",
+        mimetype="application/json"
+    )
 
-async def estrai_screenshots_fantacalcio():
-    FONTE = "Fantacalcio"
-    URL = "https://www.fantacalcio.it/probabili-formazioni-serie-a"
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--headless=new"]
-        )
+# ==========================================================
+#  IMPRONTA DOM PER PARTITA (salta cattura e composizione)
+# ==========================================================
+# Testo normalizzato del box partita + attributi che cambiano l'immagine senza cambiare
+# il testo (loghi e foto, tooltip); i src senza query string, che spesso è un cache-buster
+JS_IMPRONTE_DOM = """
+({partita, id_valido, max}) => {
+    const re = id_valido ? new RegExp(id_valido) : null;
+    const norm = s => (s || '').replace(/\\s+/g, ' ').trim();
+    return [...document.querySelectorAll(partita)]
+        .filter(el => !re || re.test(el.id || ''))
+        .slice(0, max)
+        .map(el => {
+            const parti = [norm(el.textContent)];
+            el.querySelectorAll('img, [title], [aria-label]').forEach(n => {
+                const src = n.getAttribute('data-src') || n.getAttribute('src') || '';
+                parti.push([n.tagName, src.split('?')[0], n.getAttribute('alt'),
+                            n.getAttribute('title'), n.getAttribute('aria-label')].map(norm).join('|'));
+            });
+            return parti.join('\\n');
+        });
+}
+"""
+
+async def impronte_dom(page, fonte, selettori):
+    """Impronta sha256 di ogni box partita ({indice: hash}, da 1) con un solo page.evaluate,
+    prima di qualsiasi scroll, patch JS o screenshot. Vuoto se l'estrazione fallisce."""
+    try:
+        with span(f"{fonte.lower()}.impronte_dom"):
+            testi = await page.evaluate(JS_IMPRONTE_DOM, {
+                "partita": selettori["partita"], "id_valido": selettori.get("id_valido"), "max": MAX_MATCH
+            })
+    except Exception as e:
+        print(f"⚠️ {fonte}: impronte DOM non disponibili, catturo tutto: {e}")
+        return {}
+    return {i: hashlib.sha256(t.encode("utf-8")).hexdigest() for i, t in enumerate(testi, start=1)}
+
+def link_se_invariata(name, dom, codifica=None):
+    """Link precedente se il box ha la stessa impronta DOM dell'ultima cattura confermata,
+    codificata con le stesse impostazioni, e quella cattura non è più vecchia di
+    AGGIORNAMENTO_COMPLETO_ORE; altrimenti None. Con --no-upload sempre None: la run deve
+    lasciare su disco il file di ogni partita."""
+    if not dom or AGGIORNAMENTO_COMPLETO or not CARICA:
+        return None
+    vecchie = manifest_upload.get(name) or {}
+    if vecchie.get("dom") != dom or not vecchie.get("link") or not stessa_codifica(vecchie, codifica):
+        return None
+    if time.time() - vecchie.get("verificato", 0) > AGGIORNAMENTO_COMPLETO_ORE * 3600:
+        return None
+    return vecchie["link"]
 
-        context = await browser.new_context(viewport={"width":1600, "height":4000})
-        page = await context.new_page()
-
-        # --- Caricamento pagina ---
-        await page.goto(URL, wait_until="domcontentloaded", timeout=60000)
-        await page.wait_for_timeout(1500)
-
-        # ======================================================
-        # 🔥 CHIUSURA POPUP CMP
-        # ======================================================
-        for sel in [
-            "button:has-text('OK')",
-            "button:has-text('Ok')",
-            "button:has-text('OK, I AGREE')",
-            "button:has-text('CONTINUE')",
-            "button:has-text('Continue')",
-            "button[mode='primary']"
-        ]:
-            try:
-                await page.locator(sel).click(timeout=800)
-                await page.wait_for_timeout(400)
-                break
-            except:
-                pass
+# ==========================================================
+#  ORARI DI INIZIO PARTITA (pianificazione del demone)
+# ==========================================================
+# Per ogni box partita: attributo datetime di un <time>, altrimenti la prima data "gg/mm[/aaaa] ... hh:mm" nel testo
+JS_ORARI_PARTITE = """
+({partita, id_valido, max}) => {
+    const re = id_valido ? new RegExp(id_valido) : null;
+    const data = /(\\d{1,2})[\\/.-](\\d{1,2})(?:[\\/.-](\\d{2,4}))?\\D{0,12}?(\\d{1,2})[:.](\\d{2})/;
+    return [...document.querySelectorAll(partita)]
+        .filter(el => !re || re.test(el.id || ''))
+        .slice(0, max)
+        .map(el => {
+            const t = el.querySelector('time[datetime]');
+            if (t) return t.getAttribute('datetime');
+            const m = (el.textContent || '').replace(/\\s+/g, ' ').match(data);
+            return m ? m[0] : null;
+        });
+}
+"""
+RE_DATA_ORA = re.compile(r"(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2,4}))?\D{0,12}?(\d{1,2})[:.](\d{2})")
+
+try:
+    from zoneinfo import ZoneInfo
+    FUSO_ITALIA = ZoneInfo("Europe/Rome")
+except Exception:  # tzdata assente: ora solare italiana
+    FUSO_ITALIA = timezone(timedelta(hours=1))
+
+# Fonte → timestamp UTC dei calci d'inizio letti nell'ultima visita della pagina
+orari_partite = {}
+
+def orario_calcio_inizio(testo, ora=None):
+    """Timestamp del calcio d'inizio da un datetime ISO o da "gg/mm[/aaaa] ... hh:mm" (ora italiana)."""
+    if not testo:
+        return None
+    try:
+        dt = datetime.fromisoformat(testo.strip().replace("Z", "+00:00"))
+        return (dt if dt.tzinfo else dt.replace(tzinfo=FUSO_ITALIA)).timestamp()
+    except ValueError:
+        pass
+    m = RE_DATA_ORA.search(testo)
+    if not m:
+        return None
+    giorno, mese, anno, hh, mm = m.groups()
+    adesso = datetime.fromtimestamp(ora or time.time(), FUSO_ITALIA)
+    anno = int(anno) + (2000 if len(anno) == 2 else 0) if anno else adesso.year
+    try:
+        dt = datetime(anno, int(mese), int(giorno), int(hh), int(mm), tzinfo=FUSO_ITALIA)
+    except ValueError:
+        return None
+    if not m.group(3) and (adesso - dt).days > 180:  # a dicembre, le partite di gennaio
+        dt = dt.replace(year=anno + 1)
+    return dt.timestamp()
 
-        # Rimuovi overlay vari
-        await page.evaluate("""
-            () => {
-                document.documentElement.style.overflow='auto';
-                document.body.style.overflow='auto';
-                document.querySelectorAll('[role="dialog"], .fc-consent-root, .modal, .popup').forEach(e=>e.remove());
-            }
-        """)
+async def leggi_orari(page, fonte, selettori):
+    """Legge gli orari di inizio delle partite con un solo page.evaluate (best effort)."""
+    try:
+        testi = await page.evaluate(JS_ORARI_PARTITE, {
+            "partita": selettori["partita"], "id_valido": selettori.get("id_valido"), "max": MAX_MATCH
+        })
+    except Exception:
+        return
+    orari = [t for t in (orario_calcio_inizio(x) for x in testi) if t]
+    if orari:
+        orari_partite[fonte] = orari
 
-        # Lista match nel DOM
-        matches = await page.query_selector_all("li.match.match-item")
-        print(f"🔎 Fantacalcio: trovate {len(matches)} partite")
+# ==========================================================
+#  MEMORIA DI BROWSER E RENDERER (picchi per fonte, riciclo pagine)
+# ==========================================================
+# Pagina aperta → (sessione CDP, fonte), per heap JS e nodi DOM
+pagine_cdp = {}
+# Fonte → picchi osservati: heap JS e nodi DOM delle sue pagine, memoria dei processi del browser
+# mentre era in esecuzione (il browser è condiviso: un campione vale per tutte le fonti attive)
+statistiche_memoria = {}
+fonti_attive = set()
+memoria_run = {"browser_mb": 0.0, "renderer_mb": 0.0}
+
+def _stat_memoria(fonte):
+    return statistiche_memoria.setdefault(
+        fonte.lower(), {"heap_mb": 0.0, "nodi": 0, "browser_mb": 0.0, "renderer_mb": 0.0, "ricicli": 0}
+    )
+
+def _mb_processo(pid):
+    """PSS del processo (la memoria condivisa è ripartita tra i processi), altrimenti RSS."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            for riga in f:
+                if riga.startswith("Pss:"):
+                    return int(riga.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
+
+def memoria_browser():
+    """(MB di tutti i processi Chromium discendenti di questo processo, MB del renderer più grande),
+    letti da /proc; (0, 0) dove /proc non c'è."""
+    return memoria_albero(os.getpid())
+
+def memoria_albero(radice, solo_chromium=True):
+    """Come memoria_browser per i discendenti del processo radice; con solo_chromium=False somma
+    tutti i processi dell'albero, radice compresa (benchmark.py)."""
+    if not os.path.isdir("/proc"):
+        return 0.0, 0.0
+    figli = {}
+    for voce in os.listdir("/proc"):
+        if not voce.isdigit():
+            continue
+        try:
+            with open(f"/proc/{voce}/stat", "rb") as f:
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        figli.setdefault(ppid, []).append(voce)
+    totale = 0.0 if solo_chromium else _mb_processo(radice)
+    renderer = 0.0
+    da_visitare = [str(radice)]
+    while da_visitare:
+        for pid in figli.get(int(da_visitare.pop()), []):
+            da_visitare.append(pid)
+            try:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    comando = f.read()
+            except OSError:
+                continue
+            if solo_chromium and b"chrom" not in comando.lower():
+                continue
+            mb = _mb_processo(pid)
+            totale += mb
+            if b"--type=renderer" in comando:
+                renderer = max(renderer, mb)
+    return totale, renderer
+
+async def memoria_pagina(page):
+    """Heap JS usato (MB) e nodi DOM della pagina via CDP, registrati nei picchi della sua fonte;
+    None se la pagina non ha sessione CDP o non risponde."""
+    voce = pagine_cdp.get(page)
+    if voce is None:
+        return None
+    cdp, fonte = voce
+    try:
+        heap = await cdp.send("Runtime.getHeapUsage")
+        dom = await cdp.send("Memory.getDOMCounters")
+    except Exception:
+        return None
+    misura = {"heap_mb": heap["usedSize"] / 2**20, "nodi": dom["nodes"]}
+    stat = _stat_memoria(fonte)
+    stat["heap_mb"] = max(stat["heap_mb"], misura["heap_mb"])
+    stat["nodi"] = max(stat["nodi"], misura["nodi"])
+    return misura
+
+async def campiona_memoria(intervallo):
+    """Task di fondo della run: ogni `intervallo` secondi memoria dei processi del browser e heap JS
+    di tutte le pagine aperte. La scansione di /proc è bloccante e va in un thread, fuori dall'event loop."""
+    while True:
+        totale, renderer = await asyncio.to_thread(memoria_browser)
+        memoria_run["browser_mb"] = max(memoria_run["browser_mb"], totale)
+        memoria_run["renderer_mb"] = max(memoria_run["renderer_mb"], renderer)
+        for fonte in list(fonti_attive):
+            stat = _stat_memoria(fonte)
+            stat["browser_mb"] = max(stat["browser_mb"], totale)
+            stat["renderer_mb"] = max(stat["renderer_mb"], renderer)
+        for page in list(pagine_cdp):
+            await memoria_pagina(page)
+        await asyncio.sleep(intervallo)
+
+def stampa_memoria():
+    # Senza campionamento (CAMPIONE_MEMORIA_S=0) restano solo le misure prese per il riciclo
+    for fonte, st in statistiche_memoria.items():
+        parti = []
+        if st["heap_mb"]:
+            parti.append(f"heap JS fino a {st['heap_mb']:.0f} MB, {st['nodi']} nodi DOM")
+        if st["browser_mb"]:
+            parti.append(f"browser fino a {st['browser_mb']:.0f} MB (renderer più grande {st['renderer_mb']:.0f} MB)")
+        if st["ricicli"]:
+            parti.append(f"{st['ricicli']} pagine riciclate")
+        if parti:
+            print(f"🧠 Memoria {fonte}: " + ", ".join(parti))
+    if memoria_run["browser_mb"]:
+        print(f"🧠 Picco browser della run: {memoria_run['browser_mb']:.0f} MB, "
+              f"renderer {memoria_run['renderer_mb']:.0f} MB")
 
-        # Colore blu dello sfondo del sito (RGB)
-        BG = (30, 34, 51)   # #1e2233
 
-        def expand_to_width(img, target_width):
-            """Aggiunge sfondo blu laterale per centrare l'immagine."""
-            if img.width == target_width:
-                return img
+# ==========================================================
+#  CONTESTO BROWSER PER FONTE
+# ==========================================================
+# Cookie criptati con chiave fissa invece del portachiavi di sistema: il profilo funziona su un'altra macchina
+ARGS_PROFILO = ["--password-store=basic", "--use-mock-keychain"]
+# Lock di Chromium: se arrivano dalla cache del workflow il profilo risulterebbe "in uso"
+FILE_LOCK_PROFILO = ("SingletonLock", "SingletonCookie", "SingletonSocket")
+# Sottocartelle sacrificabili del profilo, sfoltite per prime oltre PROFILI_MAX_MB
+CARTELLE_CACHE = ("Cache", "Code Cache", "GPUCache", "DawnCache", "GrShaderCache", "ShaderCache",
+                  os.path.join("Service Worker", "CacheStorage"), os.path.join("Service Worker", "ScriptCache"))
+# Nomi dei cookie lasciati dalle piattaforme di consenso (TCF, Didomi, iubenda, OneTrust, Cookiebot...)
+RE_COOKIE_CONSENSO = re.compile(r"consent|didomi|_iub_cs|optanon|cookielaw|cookiebot|gdpr|cmp", re.I)
+
+# Fonte → tempo di caricamento della pagina e traffico (byte dalla rete, risorse servite dalla cache)
+statistiche_caricamento = {}
+
+def _cartella_profilo(fonte):
+    return os.path.join(PROFILI_DIR, fonte.lower())
+
+def dimensione_cartella(path):
+    totale = 0
+    for radice, _, files in os.walk(path):
+        for nome in files:
+            p = os.path.join(radice, nome)
+            if not os.path.islink(p):
+                try:
+                    totale += os.path.getsize(p)
+                except OSError:
+                    pass
+    return totale
+
+def limita_profilo(path, max_mb=None):
+    """Riporta il profilo sotto il limite eliminando i file di cache meno recenti (mtime);
+    cookie, storage e stato.json restano. Scende all'80% per non sfoltire a ogni run."""
+    limite = (max_mb or PROFILI_MAX_MB) * 1024 * 1024
+    totale = dimensione_cartella(path)
+    if totale <= limite:
+        return 0
+    candidati = []
+    for base in (path, os.path.join(path, "Default")):
+        for cartella in CARTELLE_CACHE:
+            for radice, _, files in os.walk(os.path.join(base, cartella)):
+                for nome in files:
+                    p = os.path.join(radice, nome)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    candidati.append((st.st_mtime, st.st_size, p))
+    liberati = 0
+    for _, dim, p in sorted(candidati):
+        if totale - liberati <= limite * 0.8:
+            break
+        try:
+            os.remove(p)
+            liberati += dim
+        except OSError:
+            pass
+    return liberati
 
-            new_img = Image.new("RGB", (target_width, img.height), BG)
-            offset = (target_width - img.width) // 2
-            new_img.paste(img, (offset, 0))
-            return new_img
+def consenso_salvato(fonte):
+    """True se il profilo della fonte conserva un cookie di consenso non scaduto:
+    in quel caso il banner non compare e la gestione del consenso si salta."""
+    if not PROFILI_DIR:
+        return False
+    try:
+        with open(os.path.join(_cartella_profilo(fonte), "stato.json"), encoding="utf-8") as f:
+            cookie = json.load(f).get("cookies", [])
+    except (OSError, ValueError):
+        return False
+    ora = time.time()
+    return any(RE_COOKIE_CONSENSO.search(c.get("name", "")) and c.get("expires", -1) > ora for c in cookie)
+
+async def nuovo_contesto(browser, fonte, filtro=None, **opzioni):
+    """Crea il contesto isolato di una fonte e vi installa il filtro richieste.
+
+    Con HAR_REGISTRA_DIR / HAR_REPLAY_DIR registra o riproduce la pagina da un archivio HAR
+    (benchmark offline). Con PROFILI_DIR il contesto è persistente, su un Chromium dedicato
+    alla fonte: cache su disco e cookie sopravvivono alla run, e i domini bloccati passano
+    dal resolver (regole_host) invece che dal route handler, che disattiverebbe la cache."""
+    stat = statistiche_caricamento[fonte.lower()] = {
+        "profilo": "nessuno", "goto_s": None, "byte_rete": 0, "risorse": 0, "da_cache": 0
+    }
+    if PROFILI_DIR:
+        cartella = _cartella_profilo(fonte)
+        stat["profilo"] = "caldo" if os.path.isdir(os.path.join(cartella, "Default")) else "freddo"
+        os.makedirs(cartella, exist_ok=True)
+        for nome in FILE_LOCK_PROFILO:
+            if os.path.lexists(os.path.join(cartella, nome)):
+                os.remove(os.path.join(cartella, nome))
+        args = BROWSER_ARGS + ARGS_PROFILO + [f"--disk-cache-size={int(PROFILI_MAX_MB * 0.8) * 1024 * 1024}"]
+        if filtro and BLOCCO_RICHIESTE:
+            args.append(f"--host-resolver-rules={filtro.regole_host()}")
+        # browser è il Chromium condiviso (demone) oppure direttamente p.chromium
+        tipo = getattr(browser, "browser_type", browser)
+        context = await tipo.launch_persistent_context(cartella, headless=True, args=args, **opzioni)
+        if filtro:
+            await filtro.installa(context, instrada=False)
+        return context
+
+    har = os.path.join(HAR_REGISTRA_DIR or HAR_REPLAY_DIR or "", f"{fonte.lower()}.har.zip")
+    if HAR_REGISTRA_DIR:
+        os.makedirs(HAR_REGISTRA_DIR, exist_ok=True)
+        opzioni.update(record_har_path=har, record_har_content="attach")
+    context = await browser.new_context(**opzioni)
+    if HAR_REPLAY_DIR:
+        await context.route_from_har(har, not_found="abort")
+    if filtro:
+        await filtro.installa(context)
+    return context
+
+async def nuova_pagina(context, fonte):
+    """Nuova pagina con il conteggio del traffico via CDP: byte realmente scaricati
+    (encodedDataLength) e risposte servite dalla cache del browser."""
+    page = await context.new_page()
+    stat = statistiche_caricamento.setdefault(
+        fonte.lower(), {"profilo": "nessuno", "goto_s": None, "byte_rete": 0, "risorse": 0, "da_cache": 0}
+    )
+
+    def fine_caricamento(evento):
+        stat["byte_rete"] += int(evento.get("encodedDataLength", 0))
+
+    def risposta(evento):
+        stat["risorse"] += 1
+        if evento.get("response", {}).get("fromDiskCache"):
+            stat["da_cache"] += 1
+
+    def da_memoria(_):
+        stat["da_cache"] += 1
 
-        # Elaborazione match
-        for idx, match in enumerate(matches[:MAX_MATCH], start=1):
+    try:
+        cdp = await context.new_cdp_session(page)
+        cdp.on("Network.loadingFinished", fine_caricamento)
+        cdp.on("Network.responseReceived", risposta)
+        cdp.on("Network.requestServedFromCache", da_memoria)
+        await cdp.send("Network.enable")
+        # La stessa sessione misura heap JS e nodi DOM (memoria_pagina)
+        pagine_cdp[page] = (cdp, fonte)
+        page.on("close", lambda _: pagine_cdp.pop(page, None))
+    except Exception as e:
+        print(f"⚠️ {fonte}: statistiche di rete non disponibili: {e}")
+    return page
+
+async def carica_pagina(page, fonte, url):
+    """page.goto della lista partite; il tempo del primo caricamento va nelle statistiche."""
+    t0 = time.perf_counter()
+    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    stat = statistiche_caricamento.get(fonte.lower())
+    if stat is not None and stat["goto_s"] is None:
+        stat["goto_s"] = round(time.perf_counter() - t0, 3)
+
+async def chiudi_contesto(context, fonte):
+    """Chiude il contesto; con il profilo persistente salva lo storage_state (cookie di consenso)
+    accanto al profilo e lo riporta sotto PROFILI_MAX_MB."""
+    with span(f"{fonte.lower()}.chiusura") as sp:
+        if PROFILI_DIR:
+            cartella = _cartella_profilo(fonte)
             try:
-                await match.scroll_into_view_if_needed()
-                await page.wait_for_timeout(600)
-
-                # ============================
-                # 🎯 SELETTORE 1: FORMAZIONI
-                # ============================
-                block_form = await match.query_selector("div.row.col-sm")
-                if not block_form:
-                    print(f"⚠️ Formazioni NON trovate per match {idx}")
-                    continue
+                await context.storage_state(path=os.path.join(cartella, "stato.json"))
+            except Exception as e:
+                print(f"⚠️ {fonte}: storage_state non salvato: {e}")
+        await context.close()
+        if PROFILI_DIR:
+            liberati = limita_profilo(cartella)
+            if liberati:
+                print(f"🧹 Profilo {fonte}: {liberati // 1024} KB di cache eliminati (limite {PROFILI_MAX_MB} MB)")
+        sp.imposta(**statistiche_caricamento.get(fonte.lower(), {}))
+
+async def cattura_partite(context, page, partite, cattura, prepara, fonte, pool=None):
+    """Esegue `cattura(pagina, idx, chiave)` per ogni (idx, chiave) di `partite`.
+
+    Con pool > 1 apre altre pagine nello stesso contesto (cookie e storage condivisi: il
+    banner non ricompare), le prepara con `prepara(pagina)` e le partite vengono prese da
+    una coda comune: la pagina principale inizia subito, le altre appena pronte. I nomi file
+    dipendono solo da idx, quindi l'output non cambia con l'ordine di completamento.
+
+    Una partita che solleva un'eccezione viene ritentata fino a TENTATIVI_PARTITA volte con
+    backoff; dal secondo nuovo tentativo (o se la pagina è chiusa) su una pagina nuova,
+    che poi resta al worker per le partite successive.
+
+    Per limitare la memoria del renderer (annunci e DOM accumulati) un worker passa a una
+    pagina nuova dopo RICICLA_PAGINA_DOPO partite o quando l'heap JS supera HEAP_MAX_MB."""
+    coda = asyncio.Queue()
+    for partita in partite:
+        coda.put_nowait(partita)
+    n = max(1, min(pool or POOL_PAGINE, len(partite)))
+    aggiuntive = []
+
+    async def pagina_nuova(pagina):
+        nuova = await nuova_pagina(context, fonte)
+        aggiuntive.append(nuova)
+        try:
+            with span(f"{fonte}.pagina_nuova"):
+                await prepara(nuova)
+        except Exception as e:
+            print(f"⚠️ {fonte}: pagina nuova non pronta, resto sulla precedente: {e}")
+            await nuova.close()
+            return pagina
+        await pagina.close()
+        return nuova
+
+    async def da_riciclare(pagina, fatte):
+        """Motivo per passare a una pagina nuova, None se non serve."""
+        if RICICLA_PAGINA_DOPO and fatte >= RICICLA_PAGINA_DOPO:
+            return f"dopo {fatte} partite"
+        if HEAP_MAX_MB:
+            misura = await memoria_pagina(pagina)
+            if misura and misura["heap_mb"] >= HEAP_MAX_MB:
+                return f"heap JS {misura['heap_mb']:.0f} MB"
+        return None
 
-                tmp1 = f"tmp_fanta_form_{idx}.png"
-                await block_form.screenshot(path=tmp1)
+    async def esegui(pagina, idx, chiave):
+        """Ritorna la pagina da usare per le partite successive."""
+        for tentativo in range(1, TENTATIVI_PARTITA + 1):
+            try:
+                await cattura(pagina, idx, chiave)
+                checkpoint.esito_partita(fonte, idx)
+                return pagina
+            except Exception as e:
+                if tentativo == TENTATIVI_PARTITA:
+                    print(f"🛑 {fonte}: partita {idx} fallita dopo {tentativo} tentativi: {e}")
+                    checkpoint.esito_partita(fonte, idx, str(e))
+                    return pagina
+                attesa = min(8, 2 ** tentativo) * (0.5 + random.random() / 2)
+                print(f"⏳ {fonte}: errore sulla partita {idx} ({e}), tentativo {tentativo + 1} tra {attesa:.1f}s")
+                await asyncio.sleep(attesa)
+                if tentativo >= 2 or pagina.is_closed():
+                    pagina = await pagina_nuova(pagina)
+
+    async def lavora(pagina):
+        fatte = 0  # partite sulla pagina corrente
+        while not coda.empty():
+            idx, chiave = coda.get_nowait()
+            usata = await esegui(pagina, idx, chiave)
+            fatte = fatte + 1 if usata is pagina else 1
+            pagina = usata
+            motivo = not coda.empty() and await da_riciclare(pagina, fatte)
+            if motivo:
+                with span(f"{fonte}.riciclo", motivo=motivo):
+                    nuova = await pagina_nuova(pagina)
+                if nuova is not pagina:
+                    _stat_memoria(fonte)["ricicli"] += 1
+                    print(f"♻️ {fonte}: pagina riciclata ({motivo})")
+                    pagina, fatte = nuova, 0
+
+    async def apri_e_lavora(n_pagina):
+        pagina = await nuova_pagina(context, fonte)
+        aggiuntive.append(pagina)
+        try:
+            with span(f"{fonte}.pagina_pool", pagina=n_pagina):
+                await prepara(pagina)
+        except Exception as e:
+            print(f"⚠️ {fonte}: pagina {n_pagina} del pool non pronta, la escludo: {e}")
+            return
+        await lavora(pagina)
 
-                # ============================
-                # 🎯 SELETTORE 2: GRAFICI
-                # ============================
-                block_graphs = await match.query_selector("section.mt-4.match-graphs.burn")
-                if not block_graphs:
-                    print(f"⚠️ Grafici NON trovati per match {idx}")
-                    continue
+    try:
+        await asyncio.gather(lavora(page), *[apri_e_lavora(i) for i in range(2, n + 1)])
+    finally:
+        for pagina in aggiuntive:
+            await pagina.close()
 
-                tmp2 = f"tmp_fanta_graph_{idx}.png"
-                await block_graphs.screenshot(path=tmp2)
 
-                # ============================
-                # 🖼️ UNIONE IMMAGINI
-                # ============================
-                img1 = Image.open(tmp1)
-                img2 = Image.open(tmp2)
+# ==========================================================
+#  MOTORE DI CATTURA (comune a tutte le fonti)
+#  Ogni fonte è una specifica dichiarativa (vedi FONTE_SOSFANTA):
+#  apertura, consenso, overlay, box partita, blocchi, patch JS e
+#  ricetta di composizione; attese, pool, tentativi, checkpoint e
+#  traccia valgono allo stesso modo per tutte
+# ==========================================================
+JS_SCROLL_CENTRO = "el => el.scrollIntoView({block:'center'})"
+# Box più alto del viewport: lo si percorre a passi (caricamento lazy dei contenuti gestito dal
+# sito, che aspetta di entrare nel viewport) e si torna al suo inizio; altrimenti al centro
+JS_SCORRI_BOX = """
+async el => {
+    const frame = () => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)));
+    const r = el.getBoundingClientRect();
+    if (r.height <= innerHeight) { el.scrollIntoView({block: 'center'}); return; }
+    const inizio = scrollY + r.top;
+    for (let y = inizio; y < inizio + r.height; y += innerHeight * 0.8) { scrollTo(0, y); await frame(); }
+    el.scrollIntoView({block: 'start'});
+}
+"""
+JS_ID_BOX = "els => els.map(el => el.id || '')"
+
+def opzioni_contesto(fonte):
+    """Viewport e device_scale_factor della fonte (VIEWPORT, DEVICE_SCALE_FACTOR, MEMORIA_LIMITATA)."""
+    return {"viewport": _di_fonte(VIEWPORT, fonte, VIEWPORT_PREDEFINITO),
+            "device_scale_factor": _di_fonte(SCALA_DISPOSITIVO, fonte, 1.0)}
+
+def patch_una_volta(patch_js):
+    """La patch JS della fonte applicata al più una volta per box (attributo data-patchato): un
+    nuovo tentativo sulla stessa pagina non la riesegue, e una patch che rimuove nodi (le prime
+    righe delle note su Gazzetta) non toglie contenuto vero."""
+    return f"box => {{ if (box.dataset.patchato) return; box.dataset.patchato = '1'; ({patch_js.strip()})(box); }}"
+
+def selettori_dati(spec):
+    """Selettori per JSON, impronte DOM e orari: quelli della fonte più box partita e ID."""
+    return {**spec.get("dati", {}), "partita": spec["partita"], "id_valido": spec.get("id_valido")}
+
+async def apri_fonte(page, spec, consenso=True):
+    """Carica la lista partite: goto, banner di consenso (se non già salvato nel profilo e mai
+    sulle pagine aggiuntive del pool), clic iniziale, attesa della lista e pulizia overlay."""
+    nome = spec["nome"]
+    chiave = nome.lower()
+    with span(f"{chiave}.goto"):
+        await carica_pagina(page, nome, spec["url"])
+
+    if consenso and spec.get("consenso"):
+        regole = spec["consenso"]
+        with span(f"{chiave}.cookie"):
+            for sel in regole["selettori"]:
+                bottone = page.locator(sel).first
+                try:
+                    await bottone.click(timeout=regole["timeout_ms"], force=regole.get("forza", False))
+                except Exception:
+                    continue
+                print(f"✅ {nome}: banner cookie chiuso")
+                await attendi_sparito(bottone, f"{nome} cookie")
+                break
+            else:
+                print(f"ℹ️ {nome}: nessun banner cookie rilevato (o già bloccato)")
 
-                # larghezza finale uniforme
-                target_width = max(img1.width, img2.width)
+    clic = spec.get("clic_iniziale")
+    if clic:
+        try:
+            with span(f"{chiave}.clic_iniziale"):
+                bottone = await page.wait_for_selector(clic["selettore"], timeout=clic["timeout_ms"])
+                await page.evaluate(JS_SCROLL_CENTRO, bottone)
+                await bottone.click(force=True)
+                if consenso:
+                    print(f"✅ {nome}: cliccato su '{clic['descrizione']}'")
+        except Exception as e:
+            print(f"⚠️ {nome}: clic su '{clic['descrizione']}' non riuscito: {e}")
 
-                img1_fixed = expand_to_width(img1, target_width)
-                img2_fixed = expand_to_width(img2, target_width)
+    lista = spec["lista"]
+    with span(f"{chiave}.lista"):
+        await attendi_pronto(page, lista["selettore"], f"{nome} lista partite",
+                             stabile=False, immagini=False, timeout_ms=lista["timeout_ms"])
 
-                final_height = img1_fixed.height + img2_fixed.height
-                final = Image.new("RGB", (target_width, final_height), BG)
+    # Overlay e blocchi dello scroll: dopo che la lista è presente, non a rete ferma
+    if spec.get("js_overlay"):
+        with span(f"{chiave}.overlay"):
+            try:
+                await page.evaluate(spec["js_overlay"])
+            except Exception as e:
+                print(f"⚠️ {nome}: overlay non rimossi: {e}")
+
+async def elenco_partite(page, spec):
+    """[(idx da 1, id del box)] delle prime MAX_MATCH partite, con un solo round-trip.
+    Con id_valido si tengono solo i box il cui id corrisponde (SosFanta: "ATA-BOL")."""
+    ids = await page.eval_on_selector_all(spec["partita"], JS_ID_BOX)
+    if spec.get("id_valido"):
+        ids = [i for i in ids if re.match(spec["id_valido"], i)]
+    return list(enumerate(ids[:MAX_MATCH], start=1))
+
+async def box_partita(page, spec, idx, dom_id):
+    """Box della partita su una pagina qualsiasi del pool: per id se la fonte ha ID validi,
+    altrimenti per posizione (lo stesso ordine di elenco_partite)."""
+    if spec.get("id_valido"):
+        return await page.query_selector(f"[id='{dom_id}']")
+    boxes = await page.query_selector_all(spec["partita"])
+    return boxes[idx - 1] if idx <= len(boxes) else None
+
+def titolo_partita(spec, idx, dom_id):
+    """Etichetta per i log; con squadre_da_id le sigle vengono dall'id del box (HEL-INT → VER - INT)."""
+    if spec.get("squadre_da_id"):
+        a, b = dom_id.split("-")[:2]
+        return f"{codice_squadra(a) or a} - {codice_squadra(b) or b}"
+    return f"Partita {idx}"
+
+async def estrai_fonte(spec, browser, uploader):
+    """Esegue una fonte dalla sua specifica: contesto, apertura, elenco partite, orari e dati
+    strutturati, poi per ogni partita patch, attesa, screenshot dei blocchi, composizione,
+    codifica e upload (sul pool di pagine, con i tentativi di cattura_partite)."""
+    import immagini
+    nome = spec["nome"]
+    chiave = nome.lower()
+    selettori = selettori_dati(spec)
+    componi = getattr(immagini, spec["componi"])
+
+    # Contesto isolato (cookie/storage propri) sul browser condiviso
+    with span(f"{chiave}.contesto"):
+        context = await nuovo_contesto(browser, nome, FiltroRichieste(nome, **spec.get("filtro", {})),
+                                       **opzioni_contesto(nome))
+    try:
+        page = await nuova_pagina(context, nome)
+        await apri_fonte(page, spec, consenso=not consenso_salvato(nome))
+
+        with span(f"{chiave}.elenco_partite") as sp:
+            partite = await elenco_partite(page, spec)
+            sp.imposta(partite=len(partite))
+        if not partite:
+            # Pagina non caricata o struttura cambiata: la fonte va ritentata, non data per fatta
+            raise RuntimeError("nessuna partita trovata")
+        trovate = len(partite)
+        partite = [(idx, dom_id) for idx, dom_id in partite if partita_selezionata(idx)]
+        print(f"🔎 {nome}: trovate {trovate} partite"
+              + (f", {len(partite)} in questa esecuzione" if len(partite) < trovate else ""))
+
+        # Scroll su ogni box per far partire il caricamento lazy (immagini, note)
+        if spec.get("precarica"):
+            with span(f"{chiave}.preload"):
+                for idx, dom_id in partite:
+                    box = await box_partita(page, spec, idx, dom_id)
+                    if box:
+                        await page.evaluate(JS_SCORRI_BOX, box)
+                        await attendi_pronto(page, box, f"{nome} preload {dom_id or idx}", font=False)
+
+        await leggi_orari(page, nome, selettori)
+        # Dati strutturati: prima delle patch JS, che possono rimuovere parti del box
+        if SALVA_JSON:
+            await estrai_dati_partite(page, nome, selettori)
+        if not SALVA_SCREENSHOT:
+            return
+        impronte = await impronte_dom(page, nome, selettori)
+        codifica = firma_codifica(nome)
+
+        # Una partita (su una qualsiasi pagina del pool; gli errori li ritenta cattura_partite)
+        async def cattura(page, idx, dom_id):
+            titolo = titolo_partita(spec, idx, dom_id)
+            filename = f"{chiave}_{idx}.{ESTENSIONE_IMMAGINE}"
+            etichetta = f"{nome} | {titolo} → {filename}"
+
+            with span(f"{chiave}.partita", partita=idx, id=dom_id):
+                if await partita_da_saltare(uploader, filename, impronte.get(idx), codifica, etichetta):
+                    return
+
+                box = await box_partita(page, spec, idx, dom_id)
+                if box is None:
+                    raise RuntimeError(f"box della partita {idx} non trovato")
+                if spec.get("patch_js"):
+                    with span(f"{chiave}.patch_dom"):
+                        await box.evaluate(patch_una_volta(spec["patch_js"]))
+
+                with span(f"{chiave}.attesa"):
+                    await page.evaluate(JS_SCORRI_BOX, box)
+                    pronto = await attendi_pronto(page, box, f"{nome} {titolo}")
+
+                # Screenshot dei blocchi (in memoria), ritagliati sull'elemento anche oltre il viewport e in
+                # pixel CSS qualunque sia lo scale factor; un blocco opzionale mancante passa None alla ricetta.
+                # Uno obbligatorio mancante in un box pronto non c'è ancora sul sito (es. Fantacalcio senza
+                # grafici): partita saltata senza errore. Se il box non è mai stato pronto è un errore,
+                # ritentato da cattura_partite e registrato come fallito
+                raw, scritti = [], 0
+                for blocco in spec["blocchi"]:
+                    el = await box.query_selector(blocco["selettore"]) if blocco.get("selettore") else box
+                    if el is None:
+                        if blocco.get("opzionale"):
+                            raw.append(None)
+                            continue
+                        if pronto is None:
+                            raise RuntimeError(f"box non pronto, blocco {blocco['nome']} non trovato")
+                        print(f"⚠️ {nome} {titolo}: blocco {blocco['nome']} assente, partita saltata")
+                        return
+                    with span(f"{chiave}.screenshot", blocco=blocco["nome"]):
+                        raw.append(await el.screenshot(scale="css"))
+                        scritti += salva_intermedio(blocco["intermedio"].format(idx=idx), raw[-1])
+                checkpoint.segna(filename, "catturata")
+
+                with span(f"{chiave}.compose") as sp:
+                    img = componi(*(decodifica_immagine(r) if r is not None else None for r in raw))
+                    dati = codifica_immagine(img, nome, filename)
+                    scritti += scrivi_file(filename, dati)
+                    checkpoint.segna(filename, "composta", dom=impronte.get(idx), codifica=codifica)
+                    sp.imposta(byte=len(dati))
+
+                await uploader.accoda(
+                    dati, filename, f"{etichetta} [{scritti // 1024} KB su disco]",
+                    img=img, dom=impronte.get(idx), codifica=codifica
+                )
 
-                final.paste(img1_fixed, (0, 0))
-                final.paste(img2_fixed, (0, img1_fixed.height))
+        await cattura_partite(context, page, partite, cattura,
+                              lambda p: apri_fonte(p, spec, consenso=False), chiave)
+    finally:
+        await chiudi_contesto(context, nome)
 
-                filename = f"fantacalcio_{idx}.png"
-                final.save(filename)
 
-                # upload su Drive
-                link = drive_upload_or_replace(filename, filename)
-                print(f"✅ Fantacalcio | Partita {idx} → {filename} → {link}")
+# ==========================================================
+#  FONTE 1: SosFanta
+# ==========================================================
+SELETTORI_DATI_SOSFANTA = {
+    "squadra": [".bck-gn-match-formation-team", "[class*='formation-team']:not([class*='teams'])"],
+    "nome_squadra": [".team-name", "[class*='team-name']"],
+    "nomi_squadre": [".bck-gn-match-formation-teams [class*='team-name']", ".bck-gn-match-formation-teams [class*='name']"],
+    "modulo": ["[class*='module']", "[class*='formation-scheme']"],
+    "titolari": ["[class*='player-name']", "[class*='player']:not([class*='players'])"],
+    "nome_giocatore": ["[class*='name']"],
+    "panchina": [],
+    "note_riga": [".bck-gn-match-formation-teams-notes :has(> .note-label)"],
+    "note_etichetta": [".note-label"],
+    "note_squadra": [".note-team"],
+}
+
+# Rimozione intestazione e layout centrato delle note "Indisponibili" prima dello screenshot
+JS_PATCH_SOSFANTA = """
+box => {
+    box.classList.remove('is-hidden');
+    box.style.display='block';
+    box.style.opacity=1;
+    const heads = box.querySelectorAll('.bck-gn-match-formation-teams');
+    heads.forEach(h => h.remove());
+
+    const notes = box.querySelector('.bck-gn-match-formation-teams-notes');
+    if (notes) {
+        const labels = [...notes.querySelectorAll('.note-label')];
+        const indis = labels.find(el => el.textContent.trim().toLowerCase() === "indisponibili");
+        if (indis) {
+            const container = indis.parentElement;
+            const columns = container.querySelector(".columns");
+            if (columns) {
+                container.style.cssText = "display: flex; flex-direction: column; align-items: center; width: 100%; text-align: center;";
+                columns.className = "";
+                columns.style.cssText = "display: flex; flex-direction: column; align-items: center; justify-content: center; width: 100%; max-width: 600px; margin: 0 auto; gap: 10px;";
+                columns.querySelectorAll('.note-team').forEach(t => {
+                    t.style.cssText = "text-align: center; margin: 0 auto; float: none; width: 100%; display: block;";
+                    t.classList.remove("has-text-right", "is-pulled-right", "has-text-left");
+                });
+                columns.querySelectorAll('[class*="column"]').forEach(col => {
+                    col.className = "";
+                    col.style.cssText = "margin: 0 auto; padding: 0; text-align: center; display: block; width: 100%;";
+                });
+            }
+        }
+    }
+}
+"""
+
+FONTE_SOSFANTA = {
+    "nome": "SosFanta",
+    "url": FONTI_URL["SosFanta"],
+    "consenso": {"selettori": ["button:has-text('Accetta e continua')", "button:has-text('Accetta')",
+                               "text='ACCETTA E CONTINUA'"], "timeout_ms": 3000, "forza": True},
+    # Senza questo clic la lista mostra 0 partite
+    "clic_iniziale": {"selettore": ".scheduled-matches__list .match-cell[match='ALL']", "timeout_ms": 15000,
+                      "descrizione": "Mostra tutte le partite"},
+    "lista": {"selettore": "div[id*='-0']", "timeout_ms": 15000},
+    "precarica": True,
+    "partita": "div[id]",
+    "id_valido": r"^[A-Z]{3}-[A-Z]{3}(-\d+)?$",
+    "squadre_da_id": True,
+    "patch_js": JS_PATCH_SOSFANTA,
+    "blocchi": [{"nome": "box", "intermedio": "raw_sosfanta_{idx}.png"}],
+    "componi": "componi_sosfanta",   # taglio laterale di 120 px
+    "dati": SELETTORI_DATI_SOSFANTA,
+}
 
-            except Exception as e:
-                print(f"⚠️ Errore su match {idx}: {e}")
+# ==========================================================
+#  FONTE 2: Fantacalcio (BLOCCO FORMAZIONI + GRAFICI)
+# ==========================================================
+SELETTORI_DATI_FANTACALCIO = {
+    "squadra": [".team-formation", "[class*='team-formation']", ".match-team"],
+    "nome_squadra": [".team-name", "[class*='team-name']"],
+    "nomi_squadre": [".team-name", "[class*='team-name']"],
+    "modulo": [".module", "[class*='module']"],
+    "titolari": [".player-list:not(.bench) .player-item", "li.player-item:not(.reserve)", "[class*='player-name']"],
+    "nome_giocatore": [".player-name", "[class*='player-name']"],
+    "panchina": [".bench .player-item", "[class*='reserve'] .player-item", "[class*='bench'] li"],
+    "note_riga": [".match-notes li", "[class*='notes'] li"],
+    "note_etichetta": ["strong", "[class*='label']", "dt"],
+    "note_squadra": ["[class*='team']", "dd"],
+}
+
+JS_OVERLAY_FANTACALCIO = """
+() => {
+    document.documentElement.style.overflow='auto';
+    document.body.style.overflow='auto';
+    document.querySelectorAll('[role="dialog"], .fc-consent-root, .modal, .popup').forEach(e=>e.remove());
+}
+"""
+
+FONTE_FANTACALCIO = {
+    "nome": "Fantacalcio",
+    "url": FONTI_URL["Fantacalcio"],
+    # CMP: il primo bottone che risponde entro 800 ms
+    "consenso": {"selettori": ["button:has-text('OK')", "button:has-text('Ok')", "button:has-text('OK, I AGREE')",
+                               "button:has-text('CONTINUE')", "button:has-text('Continue')", "button[mode='primary']"],
+                 "timeout_ms": 800},
+    "lista": {"selettore": "li.match.match-item", "timeout_ms": 15000},
+    "js_overlay": JS_OVERLAY_FANTACALCIO,
+    "partita": "li.match.match-item",
+    "blocchi": [
+        {"nome": "formazioni", "selettore": "div.row.col-sm", "intermedio": "tmp_fanta_form_{idx}.png"},
+        {"nome": "grafici", "selettore": "section.mt-4.match-graphs.burn", "intermedio": "tmp_fanta_graph_{idx}.png"},
+    ],
+    "componi": "componi_fantacalcio",   # formazioni sopra, grafici sotto
+    "dati": SELETTORI_DATI_FANTACALCIO,
+}
 
-        await context.close()
-        await browser.close()
+# ==========================================================
+#  FONTE 3: Gazzetta.it
+# ==========================================================
+SELETTORI_DATI_GAZZETTA = {
+    "squadra": [".match-details__lineup .match-details__team", ".match-details__lineup [class*='team']:not([class*='teams'])"],
+    "nome_squadra": [".match-details__team-name", "[class*='team-name']"],
+    "nomi_squadre": [".match-details__team-name", "[class*='team-name']"],
+    "modulo": [".match-details__module", "[class*='module']"],
+    "titolari": [".match-details__player", "[class*='player-name']", "[class*='player']"],
+    "nome_giocatore": [".match-details__player-name", "[class*='name']"],
+    "panchina": [],
+    "note_riga": [".match-details__notes .match-details__note-row", ".match-details__notes .match-details_note-row"],
+    "note_etichetta": [".match-details__note-label", "[class*='label']", "dt", "strong"],
+    "note_squadra": [".match-details__note-team", "[class*='note-value']", "[class*='team']", "dd"],
+}
+
+JS_OVERLAY_GAZZETTA = """
+() => {
+    const patterns = ['sp_message','qc-cmp','cmp','consent','privacy'];
+    document.querySelectorAll('iframe,[role="dialog"],div').forEach(el=>{
+        const html=(el.outerHTML||'').toLowerCase();
+        if (patterns.some(k=>html.includes(k))) el.remove();
+    });
+    if (document.body) document.body.style.overflow='auto';
+    if (document.documentElement) document.documentElement.style.overflow='auto';
+}
+"""
+
+# Note: via le prime due righe (intestazioni) e larghezza piena
+JS_PATCH_GAZZETTA = """
+box => {
+    const el = box.querySelector('.match-details__notes');
+    if (!el) return;
+    el.querySelectorAll('.match-details__note-row, .match-details_note-row').forEach((r, i) => { if (i < 2) r.remove(); });
+    el.style.cssText = 'width: 100%; max-width: 100%; margin: 0; padding: 0;';
+}
+"""
+
+FONTE_GAZZETTA = {
+    "nome": "Gazzetta",
+    "url": FONTI_URL["Gazzetta"],
+    # Oltre alla lista di default, su Gazzetta si bloccano le piattaforme di consenso
+    "filtro": {"blocca_host": ["privacy.rcs.it", "sp-prod.net", "consent.cookiebot.com", "cdn.privacy-mgmt.com"]},
+    "consenso": {"selettori": ["button:has-text('ACCETTA E CONTINUA')"], "timeout_ms": 6000, "forza": True},
+    "lista": {"selettore": ".bck-box-match-details", "timeout_ms": 25000},
+    "js_overlay": JS_OVERLAY_GAZZETTA,
+    "partita": ".bck-box-match-details",
+    "patch_js": JS_PATCH_GAZZETTA,
+    "blocchi": [
+        {"nome": "formazioni", "selettore": ".match-details__lineup", "intermedio": "gazzetta_{idx}_lineup.png"},
+        {"nome": "note", "selettore": ".match-details__notes", "intermedio": "gazzetta_{idx}_notes.png",
+         "opzionale": True},
+    ],
+    "componi": "componi_gazzetta",   # formazioni + note divise in due metà, con cornice
+    "dati": SELETTORI_DATI_GAZZETTA,
+}
 
 
 # ==========================================================
-#  FONTE 3: Gazzetta.it 
+#  MANAGER
 # ==========================================================
-async def block_privacy_requests(route):
-    url = route.request.url
-    if any(x in url for x in [
-        "privacy.rcs.it", "sp-prod.net", "consent.cookiebot.com", "cdn.privacy-mgmt.com"
-    ]):
-        await route.abort()
+# Registro delle fonti, nell'ordine di esecuzione: una fonte nuova è solo una specifica in più
+REGISTRO_FONTI = [FONTE_SOSFANTA, FONTE_FANTACALCIO, FONTE_GAZZETTA]
+FONTI = [(spec["nome"], functools.partial(estrai_fonte, spec)) for spec in REGISTRO_FONTI]
+
+async def _esegui_fonte(nome, estrai, browser, uploader, semaforo, t_avvio):
+    """Esegue una fonte rispettando il limite di concorrenza e ne misura i tempi.
+    Gli errori vengono catturati qui, così una fonte fallita non cancella le altre; una fonte
+    interrotta riparte (fino a TENTATIVI_FONTE volte) in un contesto nuovo, e le partite già
+    completate o accodate non si rifanno (vedi partita_da_saltare)."""
+    async with semaforo:
+        inizio = time.perf_counter()
+        fonti_attive.add(nome)
+        try:
+            for tentativo in range(1, TENTATIVI_FONTE + 1):
+                checkpoint.segna_fonte(nome, esito="in_corso", tentativi=tentativo)
+                try:
+                    with span("fonte", fonte=nome, tentativo=tentativo):
+                        await estrai(browser, uploader)
+                    esito = "ok"
+                    break
+                except Exception as e:
+                    esito = "errore"
+                    if tentativo == TENTATIVI_FONTE:
+                        print(f"🛑 {nome}: fonte interrotta: {e}")
+                        break
+                    attesa = min(30, 5 * 2 ** (tentativo - 1)) * (0.5 + random.random() / 2)
+                    print(f"⏳ {nome}: fonte interrotta ({e}), nuovo tentativo tra {attesa:.0f}s")
+                    await asyncio.sleep(attesa)
+        finally:
+            fonti_attive.discard(nome)
+        checkpoint.segna_fonte(nome, esito=esito)
+        fine = time.perf_counter()
+    return {
+        "fonte": nome,
+        "esito": esito,
+        "attesa": inizio - t_avvio,
+        "durata": fine - inizio,
+        "fine": fine - t_avvio,
+    }
+
+def salva_traccia():
+    """Traccia della run (o della parte, con --shard) nei file configurati."""
+    path, path_chrome = percorso_shard(TRACCIA_PATH), TRACCIA_CHROME_PATH and percorso_shard(TRACCIA_CHROME_PATH)
+    if traccia.salva(path, path_chrome):
+        print(f"🧭 Traccia prestazioni salvata in {path}" + (f" e {path_chrome}" if path_chrome else ""))
+
+def stampa_riepilogo_tempi(risultati, t_browser, t_totale):
+    """Tempi per fonte e percorso critico (la fonte che termina per ultima)."""
+    print("⏱️ Tempi per fonte:")
+    for r in risultati:
+        icona = "✅" if r["esito"] == "ok" else "🛑"
+        print(f"   {icona} {r['fonte']}: {r['durata']:.1f}s (in coda {r['attesa']:.1f}s)")
+    if risultati:
+        critica = max(risultati, key=lambda r: r["fine"])
+        print(
+            f"⏱️ Percorso critico: avvio browser {t_browser:.1f}s + "
+            f"{critica['fonte']} (coda {critica['attesa']:.1f}s + esecuzione {critica['durata']:.1f}s) "
+            f"= {t_totale:.1f}s totali"
+        )
+
+def preflight(fonti, forzate=()):
+    """Controllo HTTP senza browser; ritorna (fonti da eseguire, esiti per fonte, stato salvato).
+    Le fonti in `forzate` (aggiornamento richiesto dal demone) passano comunque dal browser."""
+    stato = freschezza.carica_stato()
+    with span("preflight"):
+        esiti = freschezza.controlla([nome for nome, _ in fonti], stato,
+                                     forza=AGGIORNAMENTO_COMPLETO, ore_max=AGGIORNAMENTO_COMPLETO_ORE)
+    for nome in forzate:
+        if nome in esiti and not esiti[nome]["esegui"]:
+            esiti[nome].update(esegui=True, motivo="aggiornamento richiesto")
+    freschezza.stampa_esiti(esiti)
+    return [f for f in fonti if f[0] not in esiti or esiti[f[0]]["esegui"]], esiti, stato
+
+def aggiorna_stato_preflight(risultati, esiti, stato):
+    """Segna come aggiornate le fonti complete nel checkpoint (nessuna partita fallita, tutti i file
+    caricati) e senza upload falliti: altrimenti la run successiva deve ripassare dal browser."""
+    if conteggio_upload["falliti"]:
+        return
+    for r in risultati:
+        if r["fonte"] in esiti and checkpoint.completa(r["fonte"]):
+            freschezza.aggiorna_stato(stato, esiti[r["fonte"]])
+
+async def _esegui_fonti(browser, fonti, semaforo, saltate, pool_upload=None, chiudi_browser=False):
+    """Esegue le fonti sul browser dato; a fine run svuota la coda upload e salva JSON e manifest.
+    Ritorna (risultati per fonte, risultati degli upload)."""
+    uploader = CodaUpload(pool=pool_upload).avvia()
+    campionatore = asyncio.create_task(campiona_memoria(CAMPIONE_MEMORIA_S)) if CAMPIONE_MEMORIA_S > 0 else None
+    try:
+        t_avvio = time.perf_counter()
+        risultati = await asyncio.gather(*[
+            _esegui_fonte(nome, estrai, browser, uploader, semaforo, t_avvio)
+            for nome, estrai in fonti
+        ])
+    finally:
+        if campionatore:
+            campionatore.cancel()
+        if chiudi_browser:
+            await browser.close()
+        await salva_formazioni(uploader, saltate)
+        upload = await uploader.chiudi()
+        concedi_permessi_in_attesa()
+        salva_manifest(manifest_upload, percorso_shard(MANIFEST_PATH))
+    return risultati, upload
+
+async def aggiorna_tutte_le_fonti(fonti=None, concorrenza=None, browser=None, pool_upload=None, forzate=(),
+                                  riprendi=False):
+    """Avvia un solo Chromium e vi esegue le fonti in parallelo, ognuna nel proprio contesto.
+    In modalità demone riceve il browser già aperto e il pool dei thread di upload.
+    Con riprendi (--resume) esegue solo le fonti incomplete del checkpoint precedente."""
+    fonti = fonti or [f for f in FONTI if not FONTI_SELEZIONATE or f[0].lower() in FONTI_SELEZIONATE]
+    semaforo = asyncio.Semaphore(max(1, concorrenza or MAX_CONCORRENZA))
+    t0 = time.perf_counter()
+
+    esiti_preflight, stato_preflight = {}, {}
+    ripresa = riprendi and checkpoint.riprendi()
+    if ripresa:
+        incomplete = checkpoint.incomplete()
+        fonti = [f for f in fonti if f[0].lower() in incomplete]
+        avviato = datetime.fromtimestamp(checkpoint.dati["avviato"]).strftime("%H:%M:%S")
+        if not fonti:
+            print(f"✅ Checkpoint delle {avviato}: nessuna fonte incompleta, niente da riprendere")
+            return []
+        print(f"🔁 Ripresa del checkpoint delle {avviato}: {', '.join(nome for nome, _ in fonti)}")
+        if percorso_shard(MANIFEST_PATH) != MANIFEST_PATH:
+            # Gli upload del primo tentativo di questa parte sono solo nel suo manifest
+            unisci_manifest(manifest_upload, carica_manifest(percorso_shard(MANIFEST_PATH)))
+        # Lo stato del pre-flight si aggiorna con l'esito salvato dalla run interrotta
+        esiti_preflight = {nome: checkpoint.fonte(nome)["preflight"] for nome, _ in fonti
+                           if checkpoint.fonte(nome).get("preflight")}
+        stato_preflight = freschezza.carica_stato() if PREFLIGHT else {}
+    else:
+        if riprendi:
+            print("ℹ️ Nessun checkpoint da riprendere: eseguo una run completa")
+        checkpoint.nuova_run()
+    if PREFLIGHT and not ripresa:
+        fonti, esiti_preflight, stato_preflight = preflight(fonti, forzate)
+        for nome, _ in fonti:
+            if nome in esiti_preflight:
+                checkpoint.segna_fonte(nome, preflight=esiti_preflight[nome])
+        if not fonti:
+            print(f"💤 Nessuna fonte cambiata: browser non avviato ({time.perf_counter() - t0:.1f}s)")
+            salva_traccia()
+            return []
+    # Le fonti non eseguite in questa run mantengono i record JSON della precedente
+    saltate = [nome for nome, _ in FONTI if nome not in dict(fonti)]
+
+    if browser is None:
+        from playwright.async_api import async_playwright
+        async with async_playwright() as p:
+            if PROFILI_DIR:
+                # Ogni fonte avvia il proprio Chromium sul suo profilo (nuovo_contesto)
+                browser, condiviso = p.chromium, False
+            else:
+                with span("browser.avvio"):
+                    browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+                condiviso = True
+            t_browser = time.perf_counter() - t0
+            risultati, upload = await _esegui_fonti(browser, fonti, semaforo, saltate, pool_upload,
+                                                    chiudi_browser=condiviso)
     else:
-        await route.continue_()
+        t_browser = 0.0
+        risultati, upload = await _esegui_fonti(browser, fonti, semaforo, saltate, pool_upload)
+
+    for r in risultati:
+        prefisso = f"{r['fonte'].lower()}_"
+        r["caricati"] = sum(1 for u in upload if u["caricato"] and u["name"].startswith(prefisso))
+
+    # Senza upload Drive resta indietro; una run divisa aggiorna lo stato solo a parti riunite (--unisci)
+    if PREFLIGHT and CARICA and SHARD[1] == 1:
+        aggiorna_stato_preflight(risultati, esiti_preflight, stato_preflight)
+    stampa_riepilogo_tempi(risultati, t_browser, time.perf_counter() - t0)
+    print(
+        f"📦 Upload: {conteggio_upload['caricati']} caricati, "
+        f"{conteggio_upload['saltati']} saltati (invariati), {conteggio_upload['falliti']} falliti, "
+        f"{conteggio_upload['dom_invariati']} partite con DOM invariato (cattura saltata)"
+    )
+    print(f"📡 Chiamate API Drive: {sum(drive_chiamate.values())} {drive_chiamate}")
+    for fonte, filtro in statistiche_rete.items():
+        print(f"🚫 Rete {fonte}: {filtro.riepilogo()}")
+    stampa_rapporto_codifica()
+    stampa_memoria()
+    for fonte, st in statistiche_caricamento.items():
+        print(f"🌍 Caricamento {fonte}: pagina in {st['goto_s'] or 0:.1f}s, {st['byte_rete'] // 1024} KB dalla rete, "
+              f"{st['da_cache']}/{st['risorse']} risposte dalla cache (profilo {st['profilo']})")
+    salva_traccia()
+    print(
+        f"💾 Disco: {statistiche_io['file_scritti']} file, {statistiche_io['byte_scritti'] // 1024} KB scritti"
+        f" | Picco RSS processo: {picco_rss_mb():.0f} MB"
+    )
+    return risultati
 
-async def estrai_screenshots_gazzetta():
-    FONTE = "Gazzetta"
-    URL = "https://www.gazzetta.it/Calcio/prob_form/"
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True, 
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--headless=new"]
+
+# ==========================================================
+#  ESECUZIONE SELETTIVA E DIVISA IN PARTI
+#  --fonti / --partite scelgono il lavoro, --shard K/N ne fa una parte,
+#  --processi N lancia le N parti in locale, --unisci N riunisce i file
+#  delle parti (anche da job diversi di una matrice del workflow)
+# ==========================================================
+def configura(fonti=None, partite=None, shard=None, carica=None):
+    """Opzioni della riga di comando, con precedenza sulle variabili d'ambiente equivalenti
+    (FONTI, PARTITE, SHARD, NO_UPLOAD)."""
+    global FONTI_SELEZIONATE, PARTITE_SELEZIONATE, SHARD, CARICA
+    if fonti is not None:
+        FONTI_SELEZIONATE = [f.strip().lower() for f in fonti.split(",") if f.strip()]
+    if partite is not None:
+        PARTITE_SELEZIONATE = _intervalli(partite)
+    if shard is not None:
+        SHARD = _shard(shard)
+        checkpoint.path = percorso_shard(CHECKPOINT_PATH)
+    if carica is not None:
+        CARICA = carica
+
+def _elenco_indici(indici):
+    """[1, 2, 3, 5] → "1-3, 5"."""
+    gruppi = []
+    for i in indici:
+        if gruppi and gruppi[-1][1] == i - 1:
+            gruppi[-1][1] = i
+        else:
+            gruppi.append([i, i])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in gruppi) or "nessuna"
+
+def stampa_piano(n_parti=None):
+    """--dry-run: cosa farebbe la run (per parte, con --processi) senza browser, file né upload.
+    Il pre-flight HTTP si esegue in sola lettura per dire quali fonti aprirebbero il browser."""
+    fonti = [nome for nome, _ in FONTI if not FONTI_SELEZIONATE or nome.lower() in FONTI_SELEZIONATE]
+    esiti = {}
+    if PREFLIGHT:
+        esiti = freschezza.controlla(fonti, freschezza.carica_stato(),
+                                     forza=AGGIORNAMENTO_COMPLETO, ore_max=AGGIORNAMENTO_COMPLETO_ORE)
+        freschezza.stampa_esiti(esiti)
+    selezione = f"partite {_elenco_indici(sorted(PARTITE_SELEZIONATE))} tra le " if PARTITE_SELEZIONATE else ""
+    print(f"📋 Piano: {', '.join(fonti)}; {selezione}prime {MAX_MATCH} partite per fonte; output {MODALITA_OUTPUT}; "
+          f"upload {'su Drive ' + DRIVE_FOLDER_ID if CARICA else 'disattivato'}")
+    parti = [(k, n_parti) for k in range(1, n_parti + 1)] if n_parti else [SHARD]
+    for parte in parti:
+        if parte[1] > 1:
+            print(f"🧩 Parte {parte[0]}/{parte[1]} → {percorso_shard(CHECKPOINT_PATH, parte)}, "
+                  f"{percorso_shard(MANIFEST_PATH, parte)}")
+        indici = [i for i in range(1, MAX_MATCH + 1) if partita_selezionata(i, parte)]
+        for nome in fonti:
+            if nome in esiti and not esiti[nome]["esegui"]:
+                print(f"   💤 {nome}: invariata, browser saltato")
+                continue
+            file = ", ".join(f"{nome.lower()}_{i}.{ESTENSIONE_IMMAGINE}" for i in indici) if SALVA_SCREENSHOT else "solo JSON"
+            print(f"   🌐 {nome}: partite {_elenco_indici(indici)} (se presenti nella pagina) → {file or 'nessun file'}")
+
+def unisci_shard(n):
+    """Riunisce i file delle N parti (percorso_shard) in quelli di una run normale: checkpoint,
+    manifest, JSON delle formazioni (caricato su Drive) e traccia; poi aggiorna lo stato del
+    pre-flight per le fonti completate in tutte le parti. Ritorna le parti senza checkpoint
+    (processo o job che non è arrivato in fondo): in quel caso lo stato non si aggiorna."""
+    parti = [(k, n) for k in range(1, n + 1)]
+    checkpoint.path = CHECKPOINT_PATH
+    checkpoint.dati = {"avviato": int(time.time()), "fonti": {}, "partite": {}}
+    checkpoint.dati["permessi"] = checkpoint.permessi_salvati()
+    mancanti = []
+    for parte in parti:
+        dalla_parte = Checkpoint(percorso_shard(CHECKPOINT_PATH, parte))
+        if dalla_parte.riprendi():
+            checkpoint.unisci(dalla_parte.dati)
+        else:
+            mancanti.append(f"{parte[0]}/{n}")
+    if mancanti:
+        print(f"⚠️ Parti senza checkpoint: {', '.join(mancanti)}")
+
+    # Manifest: le voci confermate più di recente, da qualsiasi parte
+    for parte in parti:
+        unisci_manifest(manifest_upload, carica_manifest(percorso_shard(MANIFEST_PATH, parte)))
+
+    if SALVA_JSON:
+        # Ogni partita dal file della parte a cui tocca (quelle di una parte mancante dal JSON precedente)
+        record = []
+        for k, _ in parti:
+            tocca = lambda r: (r.get("partita", 0) - 1) % n == k - 1
+            try:
+                with open(percorso_shard(JSON_PATH, (k, n)), encoding="utf-8") as f:
+                    record += [r for r in json.load(f).get("partite", []) if tocca(r)]
+            except (OSError, ValueError):
+                record += _record_precedenti(tocca)
+        dati = _json_formazioni(record)
+        scrivi_file(JSON_PATH, dati)
+        if CARICA:
+            link, _ = carica_se_cambiato(dati, os.path.basename(JSON_PATH), mimetype="application/json")
+            print(f"✅ Formazioni JSON riunite → {JSON_PATH} [{len(dati) // 1024} KB] → {link}")
+    if CARICA:
+        # Il JSON appena creato e i permessi rimasti in attesa nelle parti
+        concedi_permessi_in_attesa()
+    salva_manifest(manifest_upload)
+
+    if traccia.unisci({f"{k}/{n}": (percorso_shard(TRACCIA_PATH, (k, n)),
+                                    TRACCIA_CHROME_PATH and percorso_shard(TRACCIA_CHROME_PATH, (k, n)))
+                       for k, _ in parti}, TRACCIA_PATH, TRACCIA_CHROME_PATH):
+        print(f"🧭 Tracce delle parti riunite in {TRACCIA_PATH}")
+
+    if PREFLIGHT and CARICA and not mancanti:
+        stato = freschezza.carica_stato()
+        for nome in checkpoint.dati["fonti"]:
+            esito = checkpoint.fonte(nome).get("preflight")
+            if esito and checkpoint.completa(nome):
+                freschezza.aggiorna_stato(stato, esito)
+
+    file = [name for name, v in checkpoint.dati["partite"].items() if v.get(checkpoint.dati.get("fase_finale", "caricata"))]
+    incomplete = checkpoint.incomplete()
+    print(f"🧩 {n} parti riunite: {len(file)} file completati"
+          + (f", fonti incomplete: {', '.join(incomplete)}" if incomplete else ""))
+    return mancanti
+
+async def lancia_shard(n, argomenti):
+    """Esegue la run in N processi paralleli (`run.py --shard K/N` con gli stessi argomenti),
+    con l'output di ciascuno preceduto dalla sua parte. Con PROFILI_DIR ogni parte ha la propria
+    sottocartella: lo stesso profilo Chromium non si apre da due processi. Ritorna i codici di uscita."""
+    from asyncio.subprocess import PIPE, STDOUT
+
+    async def parte(k):
+        env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+        if PROFILI_DIR:
+            env["PROFILI_DIR"] = os.path.join(PROFILI_DIR, f"shard{k}-{n}")
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), *argomenti, "--shard", f"{k}/{n}",
+            stdout=PIPE, stderr=STDOUT, env=env
         )
-        context = await browser.new_context(viewport={"width": 1600, "height": 4000})
-        await context.route("**/*", block_privacy_requests)
-        page = await context.new_page()
+        async for riga in proc.stdout:
+            print(f"[{k}/{n}] {riga.decode('utf-8', 'replace').rstrip()}")
+        return await proc.wait()
 
-        # --- Caricamento pagina e cookie ---
-        await page.goto(URL, wait_until="domcontentloaded", timeout=60000)
-        print("🌐 Pagina Gazzetta caricata.")
+    t0 = time.perf_counter()
+    codici = await asyncio.gather(*[parte(k) for k in range(1, n + 1)])
+    print(f"⏱️ {n} parti terminate in {time.perf_counter() - t0:.1f}s (codici di uscita {codici})")
+    return codici
 
+
+# ==========================================================
+#  MODALITÀ DEMONE (browser e client Drive sempre aperti)
+# ==========================================================
+# Minuti tra due controlli secondo la griglia cron del workflow (lun=0 ... dom=6, ore 4-23 UTC)
+GRIGLIA_CRON_MIN = {0: 60, 1: 60, 2: 60, 3: 30, 4: 10, 5: 10, 6: 30}
+
+def intervallo_cron(ora):
+    """Politica di ripiego: la stessa cadenza della griglia cron di .github/workflows/run.yml."""
+    dt = datetime.fromtimestamp(ora, timezone.utc)
+    if dt.hour < 4:
+        return (dt.replace(hour=4, minute=0, second=0, microsecond=0) - dt).total_seconds(), "notte (griglia cron)"
+    minuti = GRIGLIA_CRON_MIN[dt.weekday()]
+    return minuti * 60, f"griglia cron ({minuti} min)"
+
+def prossimo_intervallo(nome, ora, ultimo_cambio=None):
+    """(secondi, motivo) fino al prossimo controllo di una fonte.
+
+    Vicino al calcio d'inizio (letto dalle pagine) si controlla spesso, un contenuto cambiato
+    da poco fa stringere l'intervallo, una giornata lontana lo allarga; senza orari noti
+    vale la griglia cron. Non si salta mai oltre l'ora che precede la prossima partita."""
+    base, motivo = intervallo_cron(ora)
+    futuri = [t for t in orari_partite.get(nome, []) if t > ora]
+    manca = min(futuri) - ora if futuri else None
+
+    if manca is not None and manca <= 3600:
+        return DEMONE_MIN_S, f"calcio d'inizio tra {manca / 60:.0f} min"
+    if manca is not None and manca <= 3 * 3600:
+        intervallo, motivo = min(base, 5 * 60), f"calcio d'inizio tra {manca / 3600:.1f} h"
+    elif ultimo_cambio and ora - ultimo_cambio < 2 * 3600:
+        intervallo, motivo = min(base, 10 * 60), f"cambiata {(ora - ultimo_cambio) / 60:.0f} min fa"
+    elif manca is not None and manca > 36 * 3600:
+        intervallo, motivo = max(base, 2 * 3600), f"prossima partita tra {manca / 3600:.0f} h"
+    else:
+        intervallo = base
+    if manca is not None:
+        intervallo = min(intervallo, max(DEMONE_MIN_S, manca - 3600))
+    return max(DEMONE_MIN_S, intervallo), motivo
+
+def azzera_statistiche():
+    """Contatori, indice Drive, record JSON e traccia ripartono da zero a ogni ciclo del demone."""
+    global indice_cartella
+    for contatori in (conteggio_upload, drive_chiamate, statistiche_io):
+        for k in contatori:
+            contatori[k] = 0
+    with _indice_lock:
+        indice_cartella = None
+    record_formazioni.clear()
+    rapporto_codifica.clear()
+    statistiche_rete.clear()
+    statistiche_caricamento.clear()
+    statistiche_memoria.clear()
+    memoria_run.update(browser_mb=0.0, renderer_mb=0.0)
+    traccia.azzera()
+
+async def avvia_trigger(host, porta, stato, richieste, sveglia):
+    """Endpoint HTTP locale: `POST /aggiorna[?fonte=gazzetta,sosfanta][&completo=1]` forza un
+    ciclo subito (completo=1 ricattura anche le partite invariate), `GET /stato` mostra la pianificazione."""
+    nomi = {nome.lower(): nome for nome in stato}
+
+    async def gestisci(reader, writer):
         try:
-            await page.wait_for_selector("button:has-text('ACCETTA E CONTINUA')", timeout=6000)
-            await page.locator("button:has-text('ACCETTA E CONTINUA')").click(force=True)
-            print("✅ Banner cookie chiuso correttamente.")
-            await page.wait_for_load_state("networkidle")
-            await page.wait_for_timeout(1200)
-        except:
-            print("ℹ️ Nessun banner cookie rilevato (o già bloccato).")
-
-        # --- Pulizia overlay ---
-        try:
-            await page.wait_for_load_state("networkidle")
-            await page.evaluate("""
-                () => {
-                    const patterns = ['sp_message','qc-cmp','cmp','consent','privacy'];
-                    document.querySelectorAll('iframe,[role="dialog"],div').forEach(el=>{
-                        const html=(el.outerHTML||'').toLowerCase();
-                        if (patterns.some(k=>html.includes(k))) el.remove();
-                    });
-                    if (document.body) document.body.style.overflow='auto';
-                    if (document.documentElement) document.documentElement.style.overflow='auto';
+            riga = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            metodo, percorso = (riga + ["", ""])[:2]
+            url = urlsplit(percorso)
+            parametri = parse_qs(url.query)
+            if url.path == "/aggiorna" and metodo in ("POST", "GET"):
+                scelte = [f.strip().lower() for v in parametri.get("fonte", []) for f in v.split(",") if f.strip()]
+                fonti = [nomi[f] for f in scelte if f in nomi] if scelte else list(stato)
+                completo = parametri.get("completo", ["0"])[0] == "1"
+                for nome in fonti:
+                    richieste[nome] = richieste.get(nome, False) or completo
+                sveglia.set()
+                print(f"🔔 Trigger HTTP: aggiornamento di {', '.join(fonti) or 'nessuna fonte'}"
+                      + (" (completo)" if completo else ""))
+                codice, corpo = 202, {"accodate": fonti, "completo": completo}
+            elif url.path == "/stato" and metodo == "GET":
+                codice, corpo = 200, {
+                    nome: {**s, "prossimo": datetime.fromtimestamp(s["prossimo"], timezone.utc).isoformat(timespec="seconds")}
+                    for nome, s in stato.items()
                 }
-            """)
+            else:
+                codice, corpo = 404, {"errore": "usa POST /aggiorna o GET /stato"}
+            dati = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            writer.write(f"HTTP/1.1 {codice} {'OK' if codice < 400 else 'Not Found'}\r\n"
+                         f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(dati)}\r\n"
+                         "Connection: close\r\n\r\n".encode("latin-1") + dati)
+            await writer.drain()
         except Exception as e:
-            pass # Non stampiamo l'errore per pulizia log
+            print(f"⚠️ Trigger HTTP: richiesta non valida: {e}")
+        finally:
+            writer.close()
 
-        # --- Selezione dei box partita ---
-        await page.wait_for_selector(".bck-box-match-details", timeout=25000)
-        matches = await page.query_selector_all(".bck-box-match-details")
-        print(f"🔎 Gazzetta: trovate {len(matches)} partite.") 
+    server = await asyncio.start_server(gestisci, host, porta)
+    print(f"🔔 Trigger HTTP in ascolto su http://{host}:{porta} (POST /aggiorna, GET /stato)")
+    return server
 
-        # --- Loop sulle partite ---
-        for idx, match_box in enumerate(matches[:MAX_MATCH], start=1):
-            try:
-                dom_id = await match_box.get_attribute("id") or f"match_{idx}"
-
-                await match_box.scroll_into_view_if_needed()
-                await page.wait_for_timeout(1500)
-
-                lineup = await page.query_selector(f"#{dom_id} .match-details__lineup")
-                notes = await page.query_selector(f"#{dom_id} .match-details__notes")
-
-                if not lineup and not notes: continue
-
-                # Rimuove prime due righe e allarga notes (JS)
-                if notes:
-                    await page.evaluate(f"(sel) => {{ const el = document.querySelector(sel); if (!el) return; el.querySelectorAll('.match-details__note-row, .match-details_note-row').forEach((r, i) => {{ if (i < 2) r.remove(); }}); }}", f"#{dom_id} .match-details__notes")
-                    await page.evaluate(f"(sel) => {{ const el = document.querySelector(sel); if (el) {{ el.style.cssText = 'width: 100%; max-width: 100%; margin: 0; padding: 0;'; }} }}", f"#{dom_id} .match-details__notes")
-
-                # --- Screenshot RAW ---
-                lineup_path = None
-                if lineup:
-                    lineup_path = f"gazzetta_{idx}_lineup.png"
-                    await lineup.screenshot(path=lineup_path)
-
-                notes_path = None
-                if notes:
-                    notes_path = f"gazzetta_{idx}_notes.png"
-                    await notes.screenshot(path=notes_path)
-
-                # --- Unione Immagini (PIL) ---
-                images = [Image.open(p) for p in [lineup_path, notes_path] if p and os.path.exists(p)]
-                if not images: continue
-
-                lineup_img = images[0]
-                notes_img  = images[1] if len(images) == 2 else None
-                rosa = (253, 233, 235)
-
-                # Logica di taglio, ridimensionamento e unione (mantenuta)
-                cut_left, cut_right = 175, 175
-                if lineup_img.width > cut_left + cut_right:
-                    lineup_img = lineup_img.crop((cut_left, 0, lineup_img.width - cut_right, lineup_img.height))
-                base_width = lineup_img.width
-                
-                if notes_img:
-                    # Logica PIL per trovare colonna bianca (omessa per brevità)
-                    w, h = notes_img.width, notes_img.height
-                    notes_pixels = notes_img.load()
-                    best_col = w // 2
-                    min_dark = 999999
-                    for offset in range(-7, 8):
-                        x = w // 2 + offset
-                        dark = sum(1 for y in range(0, h, 6) if sum(notes_pixels[x, y]) < 690)
-                        if dark < min_dark: min_dark, best_col = dark, x
-                            
-                    notes_left = notes_img.crop((0, 0, best_col, h))
-                    notes_right = notes_img.crop((best_col, 0, w, h))
-
-                    scale_notes = 0.88
-                    new_width = int(base_width * scale_notes)
-                    def resize_ratio(im, target_w):
-                        ratio = target_w / im.width
-                        new_h = int(im.height * ratio)
-                        return im.resize((target_w, new_h), resample=Image.LANCZOS)
-                    notes_left, notes_right = resize_ratio(notes_left, new_width), resize_ratio(notes_right, new_width)
-
-                    sep_height, sep_margin = 4, 10
-                    separator_full = Image.new("RGB", (new_width, sep_height + sep_margin * 2), rosa)
-                    separator_line = Image.new("RGB", (new_width, sep_height), (210, 190, 190))
-                    separator_full.paste(separator_line, (0, sep_margin))
-                    
-                    notes_column_height = notes_left.height + separator_full.height + notes_right.height
-                    notes_column = Image.new("RGB", (new_width, notes_column_height), rosa)
-                    y = 0
-                    notes_column.paste(notes_left, (0, y)); y += notes_left.height
-                    notes_column.paste(separator_full, (0, y)); y += separator_full.height
-                    notes_column.paste(notes_right, (0, y))
-                    
-                    delta = (base_width - new_width) // 2
-                    notes_img = ImageOps.expand(notes_column, border=(delta, 0, base_width - new_width - delta, 0), fill=rosa)
-                else:
-                    notes_img = None
-                    
-                gap = 30
-                gap_block = Image.new("RGB", (base_width, gap), rosa)
-                total_height = lineup_img.height + (gap + notes_img.height if notes_img else 0)
-                combined = Image.new("RGB", (base_width, total_height), rosa)
-
-                y = 0
-                combined.paste(lineup_img, (0, y))
-                if notes_img:
-                    y += lineup_img.height
-                    combined.paste(gap_block, (0, y)); y += gap
-                    combined.paste(notes_img, (0, y))
-
-                combined = ImageOps.expand(combined, border=(20, 40, 20, 40), fill=rosa)
-
-                combined_path = f"gazzetta_{idx}.png"
-                combined.save(combined_path)
-
-                # --- Upload su Drive (Log pulito) ---
-                link = drive_upload_or_replace(combined_path, f"gazzetta_{idx}.png")
-                print(f"✅ Gazzetta | Partita {idx} → gazzetta_{idx}.png (Salvato su Drive) → {link}") # Log unificato
-
-            except Exception as e:
-                print(f"⚠️ Errore su match {idx}: {e}")
-
-        await context.close()
-        await browser.close()
-        print("🟢 Operazione completata.")
+async def _attendi(eventi, timeout):
+    attese = [asyncio.ensure_future(e.wait()) for e in eventi]
+    try:
+        await asyncio.wait(attese, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for a in attese:
+            a.cancel()
+
+async def demone(fonti=None, host=None, porta=None):
+    """Processo di lunga durata: Playwright, Chromium e client Drive restano aperti tra i cicli,
+    ogni fonte ha la propria prossima scadenza (prossimo_intervallo). SIGINT/SIGTERM chiudono
+    in modo ordinato alla fine del ciclo in corso, senza interrompere upload a metà."""
+    global AGGIORNAMENTO_COMPLETO
+    fonti = fonti or [f for f in FONTI if not FONTI_SELEZIONATE or f[0].lower() in FONTI_SELEZIONATE]
+    stato = {nome: {"prossimo": 0, "motivo": "avvio", "ultimo_controllo": None, "ultimo_cambio": None}
+             for nome, _ in fonti}
+    richieste = {}  # nome fonte → completo, dal trigger HTTP
+    sveglia, stop = asyncio.Event(), asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for segnale in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(segnale, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
 
+    server = await avvia_trigger(host or DEMONE_HOST, porta or DEMONE_PORTA, stato, richieste, sveglia)
+    pool_upload = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+    completo_config = AGGIORNAMENTO_COMPLETO
+    browser = None
+    from playwright.async_api import async_playwright
+    try:
+        async with async_playwright() as p:
+            try:
+                while not stop.is_set():
+                    ora = time.time()
+                    dovute = [f for f in fonti if f[0] in richieste or stato[f[0]]["prossimo"] <= ora]
+                    if dovute:
+                        if PROFILI_DIR:
+                            # Con i profili persistenti ogni fonte ha il proprio Chromium (nuovo_contesto)
+                            browser = p.chromium
+                        elif browser is None or not browser.is_connected():
+                            with span("browser.avvio"):
+                                browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+                        forzate = {nome: richieste.pop(nome) for nome, _ in dovute if nome in richieste}
+                        AGGIORNAMENTO_COMPLETO = completo_config or any(forzate.values())
+                        print(f"🔁 Ciclo demone: {', '.join(nome for nome, _ in dovute)}")
+                        azzera_statistiche()
+                        try:
+                            risultati = await aggiorna_tutte_le_fonti(dovute, browser=browser,
+                                                                      pool_upload=pool_upload, forzate=forzate)
+                        except Exception as e:
+                            print(f"🛑 Ciclo demone fallito: {e}")
+                            risultati = [{"fonte": nome, "esito": "errore"} for nome, _ in dovute]
+                        finally:
+                            AGGIORNAMENTO_COMPLETO = completo_config
+
+                        ora = time.time()
+                        esiti = {r["fonte"]: r for r in risultati}
+                        for nome, _ in dovute:
+                            s, r = stato[nome], esiti.get(nome, {})
+                            s["ultimo_controllo"] = int(ora)
+                            if r.get("caricati"):
+                                s["ultimo_cambio"] = int(ora)
+                            intervallo, s["motivo"] = prossimo_intervallo(nome, ora, s["ultimo_cambio"])
+                            if r.get("esito") == "errore":
+                                intervallo, s["motivo"] = min(intervallo, 5 * 60), "errore, nuovo tentativo"
+                            s["prossimo"] = ora + intervallo
+                            print(f"🗓️ {nome}: prossimo controllo tra {intervallo / 60:.0f} min ({s['motivo']})")
+
+                    if richieste:
+                        continue
+                    attesa = max(1.0, min(s["prossimo"] for s in stato.values()) - time.time())
+                    sveglia.clear()
+                    await _attendi([stop, sveglia], attesa)
+            finally:
+                if hasattr(browser, "is_connected") and browser.is_connected():
+                    await browser.close()
+    finally:
+        print("🛑 Demone: chiusura in corso...")
+        server.close()
+        await server.wait_closed()
+        pool_upload.shutdown(wait=True)
+    print("✅ Demone terminato.")
 
-# ==========================================================
-#  MANAGER
-# ==========================================================
-async def aggiorna_tutte_le_fonti():
-    await estrai_screenshots_sosfanta()
-    await estrai_screenshots_fantacalcio()  
-    await estrai_screenshots_gazzetta()
-    
 
 # ==========================================================
 #  ESECUZIONE PRINCIPALE
 # ==========================================================
 if __name__ == "__main__":
-    print("=== AVVIO SCRAPER ===")
-    asyncio.run(aggiorna_tutte_le_fonti()) 
-    print("=== SCRAPER COMPLETATO ===")
+    parser = argparse.ArgumentParser(description="Screenshot delle probabili formazioni di Serie A su Google Drive")
+    parser.add_argument("--demone", action="store_true",
+                        help="resta attivo con il browser aperto e pianifica i controlli per fonte")
+    parser.add_argument("--host", default=DEMONE_HOST, help="indirizzo del trigger HTTP del demone")
+    parser.add_argument("--porta", type=int, default=DEMONE_PORTA, help="porta del trigger HTTP del demone")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"rifà solo fonti e partite incomplete della run precedente ({CHECKPOINT_PATH})")
+    parser.add_argument("--fonti", help="fonti da eseguire, es. gazzetta,sosfanta (default: tutte, o FONTI)")
+    parser.add_argument("--partite", help="partite per posizione nella pagina, es. 3-5,8 (default: tutte)")
+    parser.add_argument("--shard", metavar="K/N", help="esegue solo la parte K di N (partite idx con (idx-1) %% N == K-1)")
+    parser.add_argument("--processi", type=int, metavar="N", help="divide la run in N parti, in processi paralleli")
+    parser.add_argument("--unisci", type=int, metavar="N", help="riunisce i file delle N parti di una run divisa")
+    parser.add_argument("--dry-run", action="store_true", help="mostra il piano della run senza browser né upload")
+    parser.add_argument("--no-upload", action="store_true", help="cattura e salva su disco, senza Google Drive")
+    args = parser.parse_args()
+
+    try:
+        configura(args.fonti, args.partite if args.partite is not None else os.environ.get("PARTITE", ""),
+                  args.shard, False if args.no_upload else None)
+    except ValueError as e:
+        parser.error(str(e))
+    sconosciute = set(FONTI_SELEZIONATE) - {nome.lower() for nome, _ in FONTI}
+    if sconosciute:
+        parser.error(f"fonti sconosciute: {', '.join(sorted(sconosciute))} (disponibili: {', '.join(n for n, _ in FONTI)})")
+    if args.processi is not None and (args.processi < 1 or args.shard):
+        parser.error("--processi vuole N >= 1 e non si combina con --shard")
+
+    if args.dry_run:
+        stampa_piano(args.processi)
+    elif args.unisci:
+        print(f"=== UNIONE DI {args.unisci} PARTI ===")
+        mancanti = unisci_shard(args.unisci)
+        sys.exit(1 if mancanti else 2 if checkpoint.incomplete() else 0)
+    elif args.demone:
+        print("=== AVVIO SCRAPER (DEMONE) ===")
+        asyncio.run(demone(host=args.host, porta=args.porta))
+    elif args.processi and args.processi > 1:
+        print(f"=== AVVIO SCRAPER IN {args.processi} PROCESSI ===")
+        # Ogni parte riceve la stessa selezione; --shard lo aggiunge lancia_shard
+        inoltrati = [*(["--fonti", args.fonti] if args.fonti else []),
+                     *(["--partite", args.partite] if args.partite else []),
+                     *(["--resume"] if args.resume else []), *(["--no-upload"] if args.no_upload else [])]
+        codici = asyncio.run(lancia_shard(args.processi, inoltrati))
+        mancanti = unisci_shard(args.processi)
+        if mancanti or any(c not in (0, 2) for c in codici):
+            print("=== SCRAPER FALLITO IN ALMENO UNA PARTE ===")
+            sys.exit(1)
+        if checkpoint.incomplete():
+            print(f"=== SCRAPER INCOMPLETO: {', '.join(checkpoint.incomplete())} (riprendi con --resume) ===")
+            sys.exit(2)
+        print("=== SCRAPER COMPLETATO ===")
+    else:
+        print("=== AVVIO SCRAPER ===" if not args.resume else "=== RIPRESA SCRAPER ===")
+        asyncio.run(aggiorna_tutte_le_fonti(riprendi=args.resume))
+        incomplete = checkpoint.incomplete()
+        if incomplete:
+            # Codice d'uscita 2: il workflow rilancia con --resume
+            print(f"=== SCRAPER INCOMPLETO: {', '.join(incomplete)} (riprendi con --resume) ===")
+            sys.exit(2)
+        print("=== SCRAPER COMPLETATO ===")
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
+
+
+def test_dom_invariato_completa_la_fonte_senza_upload(monkeypatch, tmp_path):
+    monkeypatch.setattr(run, "CARICA", True)
+    monkeypatch.setattr(run, "checkpoint", run.Checkpoint(str(tmp_path / "checkpoint.json")))
+    run.configura(carica=False)
+
+    run.checkpoint.nuova_run()
+    run.checkpoint.segna_fonte("SosFanta", esito="ok")
+    run.CodaUpload().invariato("sosfanta_1.png", "https://drive/vecchio", "SosFanta | partita 1")
+    assert run.checkpoint.completa("SosFanta")
+
+
+def test_dom_invariato_ignorato_senza_upload(monkeypatch):
+    monkeypatch.setattr(run, "AGGIORNAMENTO_COMPLETO", False)
+    monkeypatch.setattr(run, "manifest_upload",
+                        {"sosfanta_1.png": {"dom": "abc", "link": "https://drive/vecchio", "verificato": 2e9}})
+    monkeypatch.setattr(run, "CARICA", True)
+    assert run.link_se_invariata("sosfanta_1.png", "abc") == "https://drive/vecchio"
+    run.configura(carica=False)
+    assert run.link_se_invariata("sosfanta_1.png", "abc") is None
+
+
+def test_preflight_non_aggiornato_con_partite_fallite(monkeypatch, tmp_path):
+    monkeypatch.setattr(run, "checkpoint", run.Checkpoint(str(tmp_path / "checkpoint.json")))
+    monkeypatch.setattr(run, "conteggio_upload", {**run.conteggio_upload, "falliti": 0})
+    aggiornate = []
+    monkeypatch.setattr(run.freschezza, "aggiorna_stato", lambda stato, esito: aggiornate.append(esito["fonte"]))
+
+    run.checkpoint.nuova_run()
+    for nome in ("SosFanta", "Gazzetta"):
+        run.checkpoint.segna_fonte(nome, esito="ok")
+    run.checkpoint.esito_partita("Gazzetta", 3, "box della partita 3 non trovato")
+    esiti = {nome: {"fonte": nome} for nome in ("SosFanta", "Gazzetta")}
+    run.aggiorna_stato_preflight([{"fonte": "SosFanta", "esito": "ok"}, {"fonte": "Gazzetta", "esito": "ok"}],
+                                 esiti, {})
+    assert aggiornate == ["SosFanta"]
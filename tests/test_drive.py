@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
+from benchmark import FakeDrive
+
+
+@pytest.fixture
+def drive(monkeypatch, tmp_path):
+    """Drive finto locale (pagine da 10 file) e stato Drive di run.py azzerato."""
+    finto = FakeDrive(pagina=10).avvia()
+    monkeypatch.delenv("GOOGLE_CREDENTIALS_B64", raising=False)
+    monkeypatch.setattr(run, "DRIVE_API_ROOT", finto.url)
+    monkeypatch.setattr(run, "DRIVE_FOLDER_ID", "cartella")
+    monkeypatch.setattr(run, "UPLOAD_TENTATIVI", 1)
+    monkeypatch.setattr(run, "_drive_init_fatto", False)
+    monkeypatch.setattr(run, "drive_svc", None)
+    monkeypatch.setattr(run, "drive_creds", None)
+    monkeypatch.setattr(run, "_drive_locale", threading.local())
+    monkeypatch.setattr(run, "indice_cartella", None)
+    monkeypatch.setattr(run, "drive_chiamate", dict.fromkeys(run.drive_chiamate, 0))
+    monkeypatch.setattr(run, "checkpoint", run.Checkpoint(str(tmp_path / "checkpoint.json")))
+    run.checkpoint.nuova_run()
+    yield finto
+    finto.ferma()
+
+
+def test_una_lista_paginata_e_permessi_in_batch(drive):
+    drive.file.update({f"id{i}": f"vecchio_{i}.png" for i in range(25)})
+
+    nomi = ["vecchio_1.png", "vecchio_2.png", "nuovo_1.png", "nuovo_2.png", "nuovo_3.png"]
+    link = [run.drive_upload_or_replace(b"dati", nome, "image/png") for nome in nomi]
+    assert "UPLOAD_FAILED" not in link
+
+    # Un solo elenco della cartella (3 pagine da 10) per tutti gli upload
+    assert drive.chiamate["list"] == 3
+    assert len(run.indice_cartella) == 28
+    assert drive.chiamate["update"] == 2 and drive.chiamate["create"] == 3
+    nuovi = [run.indice_cartella[n] for n in nomi[2:]]
+    assert link[2:] == [f"https://drive.google.com/uc?id={i}" for i in nuovi]
+    assert run.checkpoint.dati["permessi"] == nuovi
+
+    # Il file creato è nell'indice: un secondo upload lo aggiorna senza rielencare la cartella
+    run.drive_upload_or_replace(b"dati 2", "nuovo_1.png", "image/png")
+    assert drive.chiamate["list"] == 3 and drive.chiamate["create"] == 3 and drive.chiamate["update"] == 3
+
+    run.concedi_permessi_in_attesa()
+    assert drive.chiamate["batch"] == 1 and "permissions" not in drive.chiamate
+    assert run.checkpoint.dati["permessi"] == []
+
+
+def test_permessi_di_una_run_interrotta_concessi_alla_successiva(drive):
+    run.drive_upload_or_replace(b"dati", "nuovo.png", "image/png")
+    file_id = run.indice_cartella["nuovo.png"]
+
+    # Run interrotta prima del batch: la successiva ritrova il file id nel checkpoint su disco
+    run.checkpoint = run.Checkpoint(run.checkpoint.path)
+    run.checkpoint.nuova_run()
+    assert run.checkpoint.dati["permessi"] == [file_id]
+
+    run.concedi_permessi_in_attesa()
+    assert drive.chiamate["batch"] == 1
+    assert run.Checkpoint(run.checkpoint.path).permessi_salvati() == []
+
+
+def test_batch_fallito_lascia_i_permessi_in_attesa(drive, monkeypatch):
+    run.drive_upload_or_replace(b"dati", "nuovo.png", "image/png")
+
+    def fallisce(richiesta, tipo):
+        raise ConnectionError("batch non raggiungibile")
+
+    monkeypatch.setattr(run, "_esegui_drive", fallisce)
+    run.concedi_permessi_in_attesa()
+    assert run.Checkpoint(run.checkpoint.path).permessi_salvati() == [run.indice_cartella["nuovo.png"]]
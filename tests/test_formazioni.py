@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
+
+
+def test_nuovo_tentativo_della_fonte_non_duplica_i_record(monkeypatch):
+    class Pagina:
+        async def evaluate(self, js, arg):
+            return [{"id": "INT-MIL", "squadre": []}, {"id": "JUV-NAP", "squadre": []}]
+
+    monkeypatch.setattr(run, "record_formazioni", [run.normalizza_record("Gazzetta", 1, {})])
+    monkeypatch.setattr(run, "PARTITE_SELEZIONATE", None)
+    for _ in range(2):
+        run.asyncio.run(run.estrai_dati_partite(Pagina(), "SosFanta", {"id_valido": "-"}))
+    chiavi = [(r["fonte"], r["partita"]) for r in run.record_formazioni]
+    assert chiavi == [("Gazzetta", 1), ("SosFanta", 1), ("SosFanta", 2)]
@@ -0,0 +1,43 @@
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
+
+
+def scheda(righe):
+    """Scheda formazione di prova: testo scuro su sfondo chiaro, come le catture reali."""
+    img = Image.new("RGB", (400, 30 + 20 * len(righe)), (250, 250, 250))
+    disegno = ImageDraw.Draw(img)
+    for i, riga in enumerate(righe):
+        disegno.text((20, 15 + 20 * i), riga, fill=(20, 20, 20))
+    return img
+
+
+RIGHE = ["Rossi 60%", "Bianchi 75%", "Neri 90%"]
+
+
+def test_una_cifra_cambiata_non_e_invariata():
+    prima = run.impronte_immagine(scheda(RIGHE))
+    dopo = run.impronte_immagine(scheda(["Rossi 80%"] + RIGHE[1:]))
+    assert not run.immagine_invariata(dopo, prima)
+    assert run.immagine_invariata(run.impronte_immagine(scheda(RIGHE)), prima)
+
+
+def test_una_cifra_cambiata_viene_caricata(monkeypatch):
+    caricati = []
+    monkeypatch.setattr(run, "drive_upload_or_replace",
+                        lambda dati, name, mimetype: caricati.append(name) or "https://drive/nuovo")
+    monkeypatch.setattr(run, "manifest_upload", {})
+    monkeypatch.setattr(run, "PHASH_TOLLERANTE", False)
+
+    img = scheda(RIGHE)
+    run.manifest_upload["scheda.png"] = {**run.impronte_immagine(img), "link": "https://drive/vecchio"}
+    assert run.carica_se_cambiato(b"", "scheda.png", img=img) == ("https://drive/vecchio", False)
+
+    for righe in (["Rossi 80%"] + RIGHE[1:], ["Rossi 60%", "Verdi 75%", "Neri 90%"]):
+        link, caricato = run.carica_se_cambiato(b"", "scheda.png", img=scheda(righe))
+        assert caricato and link == "https://drive/nuovo"
+    assert caricati == ["scheda.png", "scheda.png"]
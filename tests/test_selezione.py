@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run
+
+
+def test_intervalli():
+    assert run._intervalli("3-5, 8,") == {3, 4, 5, 8}
+    assert run._intervalli(" ") is None
+
+
+@pytest.mark.parametrize("testo", ["5-3", "0-2", ",", "x", "3-"])
+def test_intervalli_non_validi(testo):
+    with pytest.raises(ValueError):
+        run._intervalli(testo)
@@ -0,0 +1,218 @@
+# ==========================================================
+#  TRACCIA PRESTAZIONI
+#  Span annidati (context manager / decoratore) con report JSON
+#  e, opzionale, file in formato Chrome trace (chrome://tracing)
+# ==========================================================
+import contextvars, functools, inspect, itertools, json, os, threading, time
+
+# Attiva con TRACCIA=1; da disattivata ogni span costa un controllo booleano
+attiva = os.environ.get("TRACCIA", "0") == "1"
+
+_t0 = time.perf_counter()
+_span = []
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_padre = contextvars.ContextVar("span_padre", default=None)
+
+
+class _SpanNullo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def imposta(self, **attributi):
+        pass
+
+
+_NULLO = _SpanNullo()
+
+
+class Span:
+    __slots__ = ("id", "nome", "padre", "attributi", "inizio", "durata", "errore", "corsia", "_token")
+
+    def __init__(self, nome, attributi):
+        self.id = next(_ids)
+        self.nome = nome
+        self.attributi = attributi
+        self.padre = None
+        self.errore = None
+        self.durata = None
+
+    def __enter__(self):
+        genitore = _padre.get()
+        self.padre = genitore.id if genitore else None
+        # Corsia della timeline: i thread di lavoro (upload) hanno la propria,
+        # altrimenti la fonte se indicata (anche ereditata dal padre)
+        thread = threading.current_thread()
+        if thread is not threading.main_thread():
+            self.corsia = thread.name
+        else:
+            self.corsia = self.attributi.get("fonte") or (genitore.corsia if genitore else "run")
+        self._token = _padre.set(self)
+        self.inizio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, exc, tb):
+        self.durata = time.perf_counter() - self.inizio
+        if exc is not None:
+            self.errore = f"{tipo.__name__}: {exc}"
+        _padre.reset(self._token)
+        with _lock:
+            _span.append(self)
+        return False
+
+    def imposta(self, **attributi):
+        """Aggiunge attributi allo span in corso (es. byte, numero partite)."""
+        self.attributi.update(attributi)
+
+
+def span(nome, **attributi):
+    """Context manager che misura un passo: `with span("sosfanta.goto", fonte="SosFanta"):`.
+    Nel codice async si usa lo stesso `with`: il padre è tracciato per task via contextvars."""
+    if not attiva:
+        return _NULLO
+    return Span(nome, attributi)
+
+
+def misurato(nome, **attributi):
+    """Decoratore per funzioni sync e async; il controllo `attiva` avviene alla chiamata."""
+    def decora(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if not attiva:
+                    return await fn(*args, **kwargs)
+                with Span(nome, dict(attributi)):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not attiva:
+                    return fn(*args, **kwargs)
+                with Span(nome, dict(attributi)):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decora
+
+
+def _albero(spans):
+    nodi = {
+        s.id: {
+            "nome": s.nome, "inizio_s": round(s.inizio - _t0, 4), "durata_s": round(s.durata, 4),
+            **({"attributi": s.attributi} if s.attributi else {}),
+            **({"errore": s.errore} if s.errore else {}),
+            "figli": [],
+        }
+        for s in spans
+    }
+    radici = []
+    for s in sorted(spans, key=lambda s: s.inizio):
+        (nodi[s.padre]["figli"] if s.padre in nodi else radici).append(nodi[s.id])
+    return radici
+
+
+def _riepilogo(spans):
+    per_nome = {}
+    for s in spans:
+        r = per_nome.setdefault(s.nome, {"conteggio": 0, "totale_s": 0.0, "max_s": 0.0, "errori": 0})
+        r["conteggio"] += 1
+        r["totale_s"] += s.durata
+        r["max_s"] = max(r["max_s"], s.durata)
+        r["errori"] += 1 if s.errore else 0
+    for r in per_nome.values():
+        r["totale_s"], r["max_s"] = round(r["totale_s"], 4), round(r["max_s"], 4)
+    return dict(sorted(per_nome.items(), key=lambda kv: -kv[1]["totale_s"]))
+
+
+def report():
+    with _lock:
+        spans = list(_span)
+    return {
+        "durata_totale_s": round(time.perf_counter() - _t0, 4),
+        "riepilogo": _riepilogo(spans),
+        "errori": [{"nome": s.nome, "errore": s.errore} for s in spans if s.errore],
+        "span": _albero(spans),
+    }
+
+
+def azzera():
+    """Scarta gli span raccolti e riparte da zero (un ciclo del demone = una traccia)."""
+    global _t0
+    with _lock:
+        _span.clear()
+        _t0 = time.perf_counter()
+
+
+def salva(path="traccia.json", path_chrome=None):
+    """Scrive il report JSON e, se richiesto, il file Chrome trace (eventi 'X')."""
+    if not attiva:
+        return None
+    dati = report()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dati, f, ensure_ascii=False, indent=1)
+
+    if path_chrome:
+        with _lock:
+            spans = list(_span)
+        corsie = {}
+        eventi = []
+        for s in spans:
+            tid = corsie.setdefault(s.corsia, len(corsie) + 1)
+            eventi.append({
+                "name": s.nome, "ph": "X", "pid": 1, "tid": tid,
+                "ts": round((s.inizio - _t0) * 1e6), "dur": round(s.durata * 1e6),
+                "args": {**s.attributi, **({"errore": s.errore} if s.errore else {})},
+            })
+        eventi += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": str(nome)}}
+                   for nome, tid in corsie.items()]
+        with open(path_chrome, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": eventi, "displayTimeUnit": "ms"}, f, default=str)
+    return dati
+
+
+def unisci(parti, path="traccia.json", path_chrome=None):
+    """Riunisce le tracce salvate dalle parti di una run divisa ({etichetta: (json, chrome)}):
+    riepilogo sommato, un nodo radice per parte nel report e un processo per parte nel file Chrome.
+    Le parti senza traccia si saltano; ritorna None se non ce n'è nessuna."""
+    reports, eventi = {}, []
+    for pid, (etichetta, (p_json, p_chrome)) in enumerate(parti.items(), start=1):
+        try:
+            with open(p_json, encoding="utf-8") as f:
+                reports[etichetta] = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if path_chrome and p_chrome:
+            try:
+                with open(p_chrome, encoding="utf-8") as f:
+                    eventi += [{**e, "pid": pid} for e in json.load(f)["traceEvents"]]
+            except (OSError, ValueError, KeyError):
+                pass
+            eventi.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"parte {etichetta}"}})
+    if not reports:
+        return None
+
+    riepilogo = {}
+    for r in reports.values():
+        for nome, v in r["riepilogo"].items():
+            t = riepilogo.setdefault(nome, {"conteggio": 0, "totale_s": 0.0, "max_s": 0.0, "errori": 0})
+            t["conteggio"] += v["conteggio"]
+            t["totale_s"] = round(t["totale_s"] + v["totale_s"], 4)
+            t["max_s"] = max(t["max_s"], v["max_s"])
+            t["errori"] += v["errori"]
+    dati = {
+        "durata_totale_s": max(r["durata_totale_s"] for r in reports.values()),
+        "riepilogo": dict(sorted(riepilogo.items(), key=lambda kv: -kv[1]["totale_s"])),
+        "errori": [{**e, "parte": etichetta} for etichetta, r in reports.items() for e in r["errori"]],
+        "span": [{"nome": f"parte {etichetta}", "inizio_s": 0.0, "durata_s": r["durata_totale_s"], "figli": r["span"]}
+                 for etichetta, r in reports.items()],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dati, f, ensure_ascii=False, indent=1)
+    if path_chrome and eventi:
+        with open(path_chrome, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": eventi, "displayTimeUnit": "ms"}, f, default=str)
+    return dati